@@ -0,0 +1,204 @@
+"""
+Concurrent LLM readability scoring with asyncio, under requests- and tokens-per-minute limits.
+
+Scoring comments one request at a time spends almost all of its time waiting on
+the network. AsyncLLMReadabilityBackend keeps up to max_concurrency requests in
+flight, paces them with a RateLimiter so the account's RPM/TPM limits are not
+exceeded, retries rate-limit, timeout and server errors with exponential backoff
+(honouring Retry-After), and returns scores in the order of the input texts.
+score_threads scores the comments of many threads in one pass, so requests
+for small threads fill the gaps left by large ones.
+
+The limits apply per backend instance, i.e. per process: when scoring with
+several worker processes, divide the account's limits between them.
+"""
+from typing import List, Dict, Optional, Sequence
+import asyncio
+import math
+import random
+import threading
+import time
+
+if __package__:
+    from .readability_backends import (DEFAULT_LLM_MODEL, PROMPT_VERSION, ReadabilityBackend, openai_api_key, parse_score,
+                                       readability_messages)
+else:
+    from readability_backends import (DEFAULT_LLM_MODEL, PROMPT_VERSION, ReadabilityBackend, openai_api_key, parse_score,
+                                      readability_messages)
+
+# Rough tokens per character of English text, plus the prompt around it, for TPM pacing
+CHARS_PER_TOKEN = 4
+PROMPT_TOKENS = 110
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokens a readability request for text uses (prompt and one-number reply), estimated from its length
+    """
+    return PROMPT_TOKENS + len(text) // CHARS_PER_TOKEN + 1
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute
+
+    Each bucket holds up to one minute's allowance and refills continuously.
+    acquire reserves its share immediately, going into debt if needed, and then
+    sleeps until the debt is repaid, so concurrent callers are served in the order
+    they asked and the long-run rate never exceeds the limits. A limit of None is unlimited.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 clock=time.monotonic):
+        self.limits = {'requests': requests_per_minute, 'tokens': tokens_per_minute}
+        self.levels = {name: limit for name, limit in self.limits.items() if limit}
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Take one request and tokens from the buckets; returns the seconds to wait before sending
+        """
+        with self._lock:
+            now = self._clock()
+            elapsed, self._updated = now - self._updated, now
+            wait = 0.0
+            for name, cost in (('requests', 1), ('tokens', tokens)):
+                limit = self.limits[name]
+                if not limit:
+                    continue
+                rate = limit / 60.0
+                level = min(limit, self.levels[name] + elapsed * rate) - min(cost, limit)
+                self.levels[name] = level
+                if level < 0:
+                    wait = max(wait, -level / rate)
+            return wait
+
+    async def acquire(self, tokens: int = 0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers['retry-after'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class AsyncLLMReadabilityBackend(ReadabilityBackend):
+    """
+    Readability from a chat-completions model with many requests in flight at once
+
+    Args:
+        model (str): Chat model to ask
+        base_url (Optional[str]): API base URL (default: OpenAI, or OPENAI_BASE_URL)
+        api_key (Optional[str]): API key (default: the OPENAI_API_KEY environment variable or .env file)
+        max_concurrency (int): Requests in flight at once
+        requests_per_minute (Optional[float]): Request rate limit, None for unlimited
+        tokens_per_minute (Optional[float]): Token rate limit (estimated per request), None for unlimited
+        max_retries (int): Retries of a request after a rate-limit, timeout or server error
+        backoff (float): Seconds before the first retry, doubling with each further retry (with jitter)
+        max_backoff (float): Longest wait between retries
+        timeout (float): Seconds before a request times out
+        client_factory: Called with no arguments to create the openai.AsyncOpenAI-compatible client
+                        for one scoring run (default: built from base_url and api_key)
+    """
+    prompt_version = PROMPT_VERSION
+
+    def __init__(self, model: str = DEFAULT_LLM_MODEL, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: int = 32, requests_per_minute: Optional[float] = 500,
+                 tokens_per_minute: Optional[float] = 150_000, max_retries: int = 5, backoff: float = 1.0,
+                 max_backoff: float = 60.0, timeout: float = 60.0, client_factory=None):
+        self.model = model
+        self.name = f'llm:{model}'  # same scores as LLMReadabilityBackend, so they share cached scores
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.client_factory = client_factory or self._default_client
+
+    def _default_client(self):
+        import openai
+        # Retries are done here, so they are paced by the rate limiter
+        return openai.AsyncOpenAI(api_key=self.api_key or openai_api_key(), base_url=self.base_url,
+                                  max_retries=0, timeout=self.timeout)
+
+    async def _score(self, client, text: str, semaphore: asyncio.Semaphore) -> float:
+        tokens = estimate_tokens(text)
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(tokens)
+                try:
+                    response = await client.chat.completions.create(
+                        model=self.model, messages=readability_messages(text), temperature=0)
+                    return parse_score(response.choices[0].message.content)
+                except Exception as error:
+                    if attempt == self.max_retries or not _is_retryable(error):
+                        return math.nan
+                    delay = _retry_after(error)
+                    if delay is None:
+                        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                    await asyncio.sleep(delay)
+        return math.nan
+
+    async def ascore_many(self, texts: Sequence[str]) -> List[float]:
+        """
+        Scores of texts, in order; each distinct text is requested once
+        """
+        distinct = list(dict.fromkeys(texts))
+        if not distinct:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        client = self.client_factory()
+        try:
+            scores = await asyncio.gather(*(self._score(client, text, semaphore) for text in distinct))
+        finally:
+            close = getattr(client, 'close', None)
+            if close is not None:
+                await close()
+        by_text: Dict[str, float] = dict(zip(distinct, scores))
+        return [by_text[text] for text in texts]
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.ascore_many(texts))
+        # Called from inside an event loop (e.g. a notebook): run on a loop of our own in another thread
+        result = []
+        worker = threading.Thread(target=lambda: result.append(asyncio.run(self.ascore_many(texts))))
+        worker.start()
+        worker.join()
+        return result[0]
+
+    def score_threads(self, threads: Sequence[Sequence[str]]) -> List[List[float]]:
+        """
+        Scores of the comment texts of many threads, requested concurrently in one pass
+
+        Args:
+            threads (Sequence[Sequence[str]]): Comment texts of each thread
+
+        Returns:
+            List[List[float]]: Scores of each thread's texts, in the same order
+        """
+        scores = self.score_many([text for texts in threads for text in texts])
+        result, start = [], 0
+        for texts in threads:
+            result.append(scores[start:start + len(texts)])
+            start += len(texts)
+        return result
@@ -0,0 +1,457 @@
+"""
+Score every scraped thread JSON in a directory tree with a pool of worker processes.
+
+Each worker loads its own VADER analyzer and sentence transformer once, when it
+starts, and rows are written to the output CSV as soon as each file is scored.
+If a worker cannot load them, the run stops with that worker's error. Files are
+handed to the workers in chunks, and the coalition feature embeds the comments
+of a whole chunk in one encode pass (coalition.get_coalition_scores).
+
+Usage:
+    python batch_scoring.py ../scraping/representative_subreddits_for_varied_percentiles --workers 8
+    python batch_scoring.py <directory> --output scores.csv --resume   # skip files already scored
+    python batch_scoring.py <directory> --workers 1 --torch-threads 8 --embedding-cache embeddings/
+"""
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Callable
+from datetime import datetime
+from functools import partial
+from itertools import islice
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import warnings
+
+from tqdm import tqdm
+
+if __package__:
+    from .comment_thread import as_flat_thread
+    from .corpus_store import CorpusStore, is_corpus_store
+    from .embedding_cache import EmbeddingStore
+    from .metadata_index import iter_meta_data
+    from .run_manifest import RunManifest, content_hash, file_fingerprint
+    from .score_tables import COALITION_SWEEP_K, FEATURE_COLUMN_TYPES, open_score_writer
+else:
+    from comment_thread import as_flat_thread
+    from corpus_store import CorpusStore, is_corpus_store
+    from embedding_cache import EmbeddingStore
+    from metadata_index import iter_meta_data
+    from run_manifest import RunManifest, content_hash, file_fingerprint
+    from score_tables import COALITION_SWEEP_K, FEATURE_COLUMN_TYPES, open_score_writer
+
+SIMPLE_FEATURES = ('coalition', 'onesidedness', 'defection', 'resilience')
+ALL_FEATURES = tuple(FEATURE_COLUMN_TYPES)
+
+
+def gather_meta_data(directory):
+    """
+    Metadata (path, subreddit, download_date, post_id) of every JSON under directory, as a list
+
+    Prefer iter_meta_data (metadata_index.py) for large trees: it yields files
+    as they are found and can persist its listing between runs.
+    """
+    return list(iter_meta_data(directory))
+
+
+def _feature_module(name: str):
+    """
+    Import a sibling feature module, as part of the feature_scripts package or from this directory
+    """
+    return importlib.import_module(f'{__package__}.{name}' if __package__ else name)
+
+
+def get_feature_functions(features: Iterable[str], readability_backend: str = 'llm',
+                          readability_cache: Optional[str] = None,
+                          embedding_cache: Optional[EmbeddingStore] = None) -> Dict[str, Any]:
+    """
+    Map each requested feature name to its get_*_score function
+
+    Modules are imported here rather than at the top so that a run only pays
+    for (and only needs the dependencies of) the features it computes.
+
+    Args:
+        features (Iterable[str]): Feature names, a subset of ALL_FEATURES
+        readability_backend (str): Readability backend of the credibility features ('llm', 'llm-async' or 'local')
+        readability_cache (Optional[str]): Readability cache file the credibility features consult
+        embedding_cache (Optional[EmbeddingStore]): Embedding store the coalition features consult
+
+    Returns:
+        Dict[str, Any]: Scoring function for each feature
+    """
+    functions = {}
+    for feature in features:
+        if feature == 'coalition':
+            functions[feature] = partial(_feature_module('coalition').get_coalition_score,
+                                         embedding_cache=embedding_cache)
+        elif feature == 'coalition_sweep':
+            functions[feature] = partial(_feature_module('coalition').get_coalition_sweep, k_values=COALITION_SWEEP_K,
+                                         embedding_cache=embedding_cache)
+        elif feature == 'onesidedness':
+            functions[feature] = _feature_module('onesidedness').get_onesidedness_score
+        elif feature == 'defection':
+            functions[feature] = _feature_module('defection').get_defection_score
+        elif feature == 'resilience':
+            functions[feature] = _feature_module('resilience').get_resilience_score
+        elif feature == 'credibility':
+            functions[feature] = partial(_feature_module('credibility').get_credibility_score,
+                                         readability_backend=readability_backend, readability_cache=readability_cache)
+        elif feature == 'credibility_subfeatures':
+            functions[feature] = partial(_feature_module('credibility').get_credibility_subfeatures,
+                                         readability_backend=readability_backend, readability_cache=readability_cache)
+        else:
+            raise ValueError(f"Unknown feature '{feature}', expected one of {ALL_FEATURES}")
+    return functions
+
+
+def calculate_feature_scores(comment_forest, features: Iterable[str] = SIMPLE_FEATURES,
+                             readability_backend: str = 'llm', readability_cache: Optional[str] = None,
+                             embedding_cache: Optional[EmbeddingStore] = None) -> Dict[str, Any]:
+    """
+    Return a dictionary with the requested feature scores for the given comment forest
+
+    The forest is flattened once and the flattened thread (with its shared
+    sentiment vector) is passed to every feature.
+
+    Args:
+        comment_forest (Union[FlatThread, Dict]): A comment forest JSON or an already flattened thread
+        features (Iterable[str]): Feature names to compute
+        readability_backend (str): Readability backend of the credibility features ('llm', 'llm-async' or 'local')
+        readability_cache (Optional[str]): Readability cache file the credibility features consult
+        embedding_cache (Optional[EmbeddingStore]): Embedding store the coalition features consult
+
+    Returns:
+        Dict[str, Any]: Score for each feature; features that return several
+                        values (coalition_sweep, credibility_subfeatures) contribute one entry per value
+    """
+    thread = as_flat_thread(comment_forest)
+    scores = {}
+    for feature, function in get_feature_functions(features, readability_backend, readability_cache, embedding_cache).items():
+        value = function(thread)
+        if isinstance(value, dict):
+            scores.update(value)
+        else:
+            scores[feature] = value
+    return scores
+
+
+# Readability backend and cache of this process's credibility features, and the
+# embedding store of its coalition features, set by _init_worker
+_readability_backend = 'llm'
+_readability_cache = None
+_embedding_store: Optional[EmbeddingStore] = None
+# Why this pool worker could not load its models, set by _init_pool_worker
+_init_error = None
+
+
+def _init_worker(features: Tuple[str, ...], torch_threads: int, readability_backend: str = 'llm',
+                 readability_cache: Optional[str] = None, embedding_cache: Optional[str] = None):
+    """
+    Pool initializer: load every model the features need once per worker process
+    """
+    global _readability_backend, _readability_cache, _embedding_store
+    _readability_backend = readability_backend
+    _readability_cache = readability_cache
+    _embedding_store = EmbeddingStore(embedding_cache) if embedding_cache is not None else None
+    get_feature_functions(features, readability_backend, readability_cache)
+    if 'credibility' in features or 'credibility_subfeatures' in features:
+        credibility = _feature_module('credibility')
+        credibility.preload(readability_backend)
+    if 'defection' in features or 'resilience' in features:
+        _feature_module('sentiment').get_sentiment_analyzer()
+    if 'coalition' in features or 'coalition_sweep' in features:
+        import torch
+        # One process per core already saturates the CPU; avoid oversubscribing it
+        torch.set_num_threads(torch_threads)
+        _feature_module('coalition').warm_up_model()
+
+
+def _init_pool_worker(*args):
+    """
+    Pool initializer: _init_worker, keeping its error for _score_file to report
+
+    An exception raised by a Pool initializer kills the worker, and the pool
+    replaces it with a new one that fails the same way, so the run would hang.
+    """
+    global _init_error
+    try:
+        _init_worker(*args)
+    except Exception as e:
+        _init_error = f'Worker initialisation failed: {e!r}'
+
+
+def _build_vocabulary_artifact():
+    """
+    Write credibility's vocabulary artifact once, so the workers memory-map one shared copy of the word lists
+    """
+    credibility = _feature_module('credibility')
+    try:
+        credibility.build_vocabulary_artifact()
+    except OSError as error:
+        warnings.warn(f"Could not write {credibility.VOCABULARY_ARTIFACT} ({error}); each worker reads the word lists")
+
+
+# Corpus stores opened by this process, by directory
+_corpus_stores: Dict[str, CorpusStore] = {}
+
+
+def _get_corpus_store(directory: str) -> CorpusStore:
+    store = _corpus_stores.get(directory)
+    if store is None:
+        store = _corpus_stores[directory] = CorpusStore(directory)
+    return store
+
+
+def _load_thread(meta: Dict[str, Any], use_hash: bool, store_entry: Optional[Tuple[str, int]]):
+    """
+    Flattened thread of one JSON file or corpus store entry, with the fingerprint (and sha1) it was read at
+    """
+    if store_entry is not None:
+        store = _get_corpus_store(store_entry[0])
+        return store.thread(store_entry[1]), store.fingerprint, None
+    fingerprint = file_fingerprint(meta['path'])
+    with open(meta['path'], 'rb') as file:
+        data = file.read()
+    return as_flat_thread(json.loads(data)), fingerprint, content_hash(data) if use_hash else None
+
+
+def _score_files(chunk: List[Tuple[Dict[str, Any], Tuple[str, ...], bool, Optional[Tuple[str, int]]]]) -> List[Dict[str, Any]]:
+    """
+    Score the given features of a chunk of JSON files or corpus store threads
+
+    The coalition scores of the chunk are computed together, so its comments are
+    embedded in one length-bucketed encode pass. Every other feature is scored thread by thread.
+
+    Returns a dict per file with the output 'row', the 'error' message if scoring
+    failed, and the 'fingerprint' (and 'sha1' if requested) of the file as it was read.
+    If the worker could not load its models, the errors are marked 'fatal'.
+    """
+    if _init_error is not None:
+        return [{'row': dict(meta), 'error': _init_error, 'fatal': True} for meta, _, _, _ in chunk]
+    results = []
+    threads = {}
+    for position, (meta, features, use_hash, store_entry) in enumerate(chunk):
+        try:
+            thread, fingerprint, sha1 = _load_thread(meta, use_hash, store_entry)
+            other_features = [feature for feature in features if feature != 'coalition']
+            row = {**meta, **calculate_feature_scores(thread, other_features, _readability_backend,
+                                                      _readability_cache, _embedding_store)}
+            results.append({'row': row, 'error': None, 'features': features, 'fingerprint': fingerprint, 'sha1': sha1})
+            if 'coalition' in features:
+                threads[position] = thread
+        except Exception as e:
+            results.append({'row': dict(meta), 'error': f"{meta['path']}: {e!r}"})
+
+    if threads:
+        coalition = _feature_module('coalition')
+        try:
+            scores = coalition.get_coalition_scores(list(threads.values()), embedding_cache=_embedding_store)
+        except Exception:
+            # Find the thread that failed by scoring them one at a time
+            scores = []
+            for position, thread in threads.items():
+                try:
+                    scores.append(coalition.get_coalition_score(thread, embedding_cache=_embedding_store))
+                except Exception as e:
+                    meta = chunk[position][0]
+                    results[position] = {'row': dict(meta), 'error': f"{meta['path']}: {e!r}"}
+                    scores.append(None)
+        for position, score in zip(threads, scores):
+            if score is not None:
+                results[position]['row']['coalition'] = score
+    return results
+
+
+def _chunked(tasks: Iterable[Any], size: int) -> Iterable[List[Any]]:
+    tasks = iter(tasks)
+    while True:
+        chunk = list(islice(tasks, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def default_target_path(directory_path: str, target_directory_name: str = '../misc_dataframes_with_test_results',
+                        calculation_start_time: Optional[datetime] = None, extension: str = 'csv') -> str:
+    """
+    Output path following the notebook's naming scheme
+    """
+    calculation_start_time = calculation_start_time or datetime.now()
+    timestamp_str = calculation_start_time.strftime('%Y-%m-%d_%H-%M-%S')
+    safe_dir_name = re.sub(r'[\\/]', '_', directory_path) # Sanitize the directory_path to remove slashes or other problematic characters
+    filename = f'simple_feature_scores_for_jsons_in_{safe_dir_name}_calculated_at_{timestamp_str}.{extension}'
+    return os.path.join(target_directory_name, filename)
+
+
+def mass_calculate_feature_scores(directory_path: str, target_path: Optional[str] = None,
+                                  features: Iterable[str] = SIMPLE_FEATURES, workers: Optional[int] = None,
+                                  chunksize: int = 16, torch_threads: int = 1, resume: bool = False,
+                                  manifest_path: Optional[str] = None, use_hash: bool = False,
+                                  output_format: str = 'csv', index_path: Optional[str] = None,
+                                  on_row: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                                  readability_backend: str = 'llm', readability_cache: Optional[str] = None,
+                                  embedding_cache: Optional[str] = None) -> str:
+    """
+    Score every JSON under directory_path in parallel, streaming rows to a CSV or Parquet dataset
+
+    Rows are written in completion order (not directory order) as soon as each
+    file is scored, so a long run keeps little in memory and partial results are
+    on disk if it is interrupted.
+
+    With resume, every scored file is recorded in a run manifest and re-invoking
+    the run on the same directory and output skips the (file, feature) pairs
+    already done, appending rows only for new or changed JSONs. A file that is
+    rescored only for some features gets a row with the other features left empty.
+    If a run is interrupted between writing a row and recording it, that file is
+    scored again and appears twice; keep the last row per path.
+
+    With output_format='parquet', target_path is a dataset directory partitioned
+    by subreddit and download date, with a typed column per feature and
+    credibility subfeature (see score_tables.read_feature_scores).
+
+    directory_path may also be a corpus store (see corpus_store.py), in which case
+    threads are read from its memory-mapped columns instead of parsing JSON.
+
+    JSONs are found with metadata_index.iter_meta_data and scoring starts while
+    the walk is still running. With index_path, the directory listing is saved
+    there and later runs only list date directories that changed.
+
+    The coalition scores of each chunk of files are computed together, embedding
+    all their comments in one encode pass. With embedding_cache, embeddings are
+    kept in an on-disk store (see embedding_cache.py) and reused across threads
+    and runs; the store has a single writer, so this needs workers=1 (give the
+    encoder more torch_threads instead).
+
+    Args:
+        directory_path (str): Directory laid out as <subreddit>/<date_dir>/<post_id>.json,
+                              or a corpus store built from one
+        target_path (Optional[str]): Output CSV or Parquet directory; defaults to a timestamped
+                                     path in ../misc_dataframes_with_test_results
+        features (Iterable[str]): Feature names to compute
+        workers (Optional[int]): Number of worker processes (defaults to the CPU count);
+                                 1 scores in this process without a pool
+        chunksize (int): Files handed to a worker at a time, and threads per coalition encode pass
+        torch_threads (int): Torch threads per worker for the coalition encoder
+        resume (bool): Skip work recorded in the run manifest and append to target_path
+        manifest_path (Optional[str]): Run manifest; defaults to target_path + '.manifest.jsonl'
+        use_hash (bool): Also record content hashes, so touched-but-unchanged files are not rescored
+        output_format (str): 'csv' or 'parquet'
+        index_path (Optional[str]): Metadata index file to reuse and update (see metadata_index.py)
+        on_row (Optional[Callable]): Called with every row as it is written, e.g. to
+                                     accumulate statistics for a later normalisation pass
+        readability_backend (str): Readability backend of the credibility features: 'llm'
+                                   (gpt-4-turbo batch API), 'llm-async' (concurrent gpt-4-turbo
+                                   requests) or 'local' (offline Flesch reading ease)
+        readability_cache (Optional[str]): SQLite readability cache (see readability_cache.py) shared by
+                                           the workers, so repeated comment bodies are scored once
+        embedding_cache (Optional[str]): Embedding store directory for the coalition features (needs workers=1)
+
+    Returns:
+        str: Path of the written CSV or Parquet dataset
+    """
+    features = tuple(features)
+    if resume and target_path is None:
+        raise ValueError("resume needs an explicit target_path to append to")
+    target_path = target_path or default_target_path(directory_path, extension=output_format)
+    workers = workers or os.cpu_count() or 1
+    if embedding_cache is not None and workers != 1:
+        raise ValueError("embedding_cache has a single writer and needs workers=1")
+
+    manifest = None
+    store_fingerprint = None
+    total = None
+    if is_corpus_store(directory_path):
+        store = CorpusStore(directory_path)
+        store_fingerprint = store.fingerprint
+        total = len(store)
+        tasks = ((store.meta(index), features, use_hash, (directory_path, index)) for index in range(len(store)))
+    else:
+        # Files are handed to the workers as the directory walk finds them
+        tasks = ((meta, features, use_hash, None) for meta in iter_meta_data(directory_path, index_path))
+    if resume:
+        manifest = RunManifest(manifest_path or target_path.rstrip('/\\') + '.manifest.jsonl')
+        total = None
+        tasks = ((meta, tuple(pending), use_hash, store_entry) for meta, _, _, store_entry in tasks
+                 for pending in [manifest.pending_features(meta['path'], features, use_hash, store_fingerprint)]
+                 if pending)
+    exceptions_count = 0
+
+    append = resume and os.path.isfile(target_path) and os.path.getsize(target_path) > 0
+    writer = open_score_writer(target_path, features, output_format, append=append)
+
+    try:
+        if workers == 1:
+            _init_worker(features, torch_threads, readability_backend, readability_cache, embedding_cache)
+            chunk_results = map(_score_files, _chunked(tasks, chunksize))
+            pool = None
+        else:
+            if 'credibility' in features or 'credibility_subfeatures' in features:
+                _build_vocabulary_artifact()
+                # Download missing tokenizer data here once, rather than in every worker's preload
+                _feature_module('spelling').load_punkt()
+            pool = multiprocessing.Pool(workers, initializer=_init_pool_worker, initargs=(features, torch_threads, readability_backend, readability_cache))
+            chunk_results = pool.imap_unordered(_score_files, _chunked(tasks, chunksize))
+        results = (result for chunk in chunk_results for result in chunk)
+
+        try:
+            for result in tqdm(results, total=total):
+                if result.get('fatal'):
+                    raise RuntimeError(result['error'])
+                if result['error'] is not None:
+                    exceptions_count += 1
+                    print(f'Exceptions count = {exceptions_count}')
+                    print(result['error'])
+                    continue
+                writer.write(result['row'])
+                if on_row is not None:
+                    on_row(result['row'])
+                if manifest is not None:
+                    manifest.record(result['row'], result['features'], result['fingerprint'], result['sha1'])
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            elif _embedding_store is not None:
+                _embedding_store.flush()
+            if manifest is not None:
+                manifest.close()
+    finally:
+        writer.close()
+
+    return target_path
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Calculate feature scores for every scraped thread JSON in a directory.")
+    parser.add_argument('directory', help="Directory laid out as <subreddit>/<date_dir>/<post_id>.json, or a corpus store")
+    parser.add_argument('--output', default=None, help="Output CSV file or Parquet directory (default: timestamped path in ../misc_dataframes_with_test_results)")
+    parser.add_argument('--format', default='csv', choices=('csv', 'parquet'), help="Output format; parquet is partitioned by subreddit and download date")
+    parser.add_argument('--features', nargs='+', default=list(SIMPLE_FEATURES), choices=ALL_FEATURES)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=16, help="Files handed to a worker at a time; coalition embeds each chunk in one pass")
+    parser.add_argument('--torch-threads', type=int, default=1, help="Torch threads per worker")
+    parser.add_argument('--resume', action='store_true', help="Skip files already recorded in the run manifest (needs --output)")
+    parser.add_argument('--manifest', default=None, help="Run manifest path (default: <output>.manifest.jsonl)")
+    parser.add_argument('--hash', action='store_true', help="Detect changed files by content hash as well as mtime/size")
+    parser.add_argument('--readability-backend', default='llm', choices=('llm', 'llm-async', 'local'), help="How credibility scores readability: gpt-4-turbo (batch API or concurrent requests) or the offline Flesch formula")
+    parser.add_argument('--readability-cache', default=None, help="SQLite file caching readability scores across threads and runs")
+    parser.add_argument('--embedding-cache', default=None, help="Embedding store directory reused by the coalition features across threads and runs (needs --workers 1)")
+    parser.add_argument('--index', default=None, help="Metadata index file; reused between runs so only changed directories are listed again")
+    args = parser.parse_args(argv)
+    if args.resume and args.output is None:
+        parser.error("--resume needs --output")
+    if args.embedding_cache is not None and args.workers != 1:
+        parser.error("--embedding-cache needs --workers 1")
+
+    target_path = mass_calculate_feature_scores(args.directory, args.output, args.features,
+                                                args.workers, args.chunksize, args.torch_threads,
+                                                args.resume, args.manifest, args.hash, args.format, args.index,
+                                                readability_backend=args.readability_backend,
+                                                readability_cache=args.readability_cache,
+                                                embedding_cache=args.embedding_cache)
+    print(f'Wrote {target_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,331 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Union, TYPE_CHECKING
+from itertools import islice
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
+if __package__:
+    from .comment_thread import FlatThread, as_flat_thread
+    from .embedding_cache import EmbeddingStore
+    from .normalization import normalize_scores
+else:
+    from comment_thread import FlatThread, as_flat_thread
+    from embedding_cache import EmbeddingStore
+    from normalization import normalize_scores
+import gc
+import logging
 import os
+import sys
+import threading
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+logger = logging.getLogger(__name__)
+
+# sentence_transformers (and torch) and scikit-learn take seconds to import, so they
+# are imported when first needed: importing this module stays cheap for workers and
+# test collection, and the model is loaded by get_model/warm_up_model
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+def __getattr__(name: str):
+    if name == 'SentenceTransformer':
+        from sentence_transformers import SentenceTransformer
+        globals()['SentenceTransformer'] = SentenceTransformer
+        return SentenceTransformer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Rows scaled to unit length (zero rows stay zero), as sklearn.preprocessing.normalize
+    """
+    from sklearn.preprocessing import normalize as normalize_rows
+    return normalize_rows(embeddings)
+
+
+def cosine_similarity(x: np.ndarray, y: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    sklearn.metrics.pairwise.cosine_similarity, imported on first use
+    """
+    from sklearn.metrics.pairwise import cosine_similarity as pairwise_cosine_similarity
+    return pairwise_cosine_similarity(x, y)
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Process-wide registry of loaded sentence transformer models, keyed by
+# (model_name, device), so every analyzer in a batch run shares one copy.
+_MODEL_REGISTRY: Dict[Tuple[str, Optional[str]], 'SentenceTransformer'] = {}
+_MODEL_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model(model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None) -> 'SentenceTransformer':
+    """
+    Return the shared sentence transformer for (model_name, device), loading it on first use
+    
+    Args:
+        model_name (str): Sentence transformer model name
+        device (Optional[str]): Torch device ('cpu', 'cuda', ...); None lets the library choose
+    
+    Returns:
+        SentenceTransformer: The cached model instance
+    """
+    key = (model_name, device)
+    model = _MODEL_REGISTRY.get(key)
+    if model is None:
+        with _MODEL_REGISTRY_LOCK:
+            model = _MODEL_REGISTRY.get(key)
+            if model is None:
+                # Looked up on the module, so the class is imported only now (and can be substituted in tests)
+                model_class = getattr(sys.modules[__name__], 'SentenceTransformer')
+                model = model_class(model_name, device=device)
+                _MODEL_REGISTRY[key] = model
+    return model
+
+
+def warm_up_model(model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None) -> 'SentenceTransformer':
+    """
+    Load the model ahead of time and run one tiny encode so the first real thread
+    does not pay the load and first-call overhead
+    
+    Args:
+        model_name (str): Sentence transformer model name
+        device (Optional[str]): Torch device; None lets the library choose
+    
+    Returns:
+        SentenceTransformer: The warmed-up model instance
+    """
+    model = get_model(model_name, device)
+    model.encode(["warm up"], convert_to_numpy=True)
+    return model
+
+
+def release_model(model_name: Optional[str] = None, device: Optional[str] = None) -> int:
+    """
+    Drop cached models from the registry so their memory can be reclaimed
+    
+    Args:
+        model_name (Optional[str]): Model to release; None releases every cached model
+        device (Optional[str]): Device of the model to release (ignored when model_name is None)
+    
+    Returns:
+        int: Number of models released
+    """
+    with _MODEL_REGISTRY_LOCK:
+        if model_name is None:
+            keys = list(_MODEL_REGISTRY)
+        else:
+            keys = [key for key in _MODEL_REGISTRY if key == (model_name, device)]
+        for key in keys:
+            del _MODEL_REGISTRY[key]
+    gc.collect()
+    return len(keys)
+
+
+# Upper bound on the similarity block held in memory by the 'blocked' method
+SIMILARITY_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def mean_pairwise_similarity(embeddings: np.ndarray, method: str = 'sum',
+                             max_block_bytes: int = SIMILARITY_BLOCK_BYTES) -> float:
+    """
+    Mean of cosine_similarity(embeddings) without building the n x n matrix
+    
+    With unit vectors u_i (zero vectors stay zero, as in cosine_similarity), the
+    mean of all u_i . u_j is ||sum_i u_i||^2 / n^2, which 'sum' computes in
+    O(n*d) time and O(d) extra memory. 'blocked' sums the similarity matrix itself,
+    a block of rows at a time, for results that follow the pairwise definition
+    term by term; a block never exceeds max_block_bytes (at least one row).
+    
+    Args:
+        embeddings (np.ndarray): Array of comment embeddings
+        method (str): 'sum' or 'blocked'
+        max_block_bytes (int): Memory ceiling for one block of the 'blocked' method
+    
+    Returns:
+        float: Average pairwise cosine similarity
+    """
+    n = len(embeddings)
+    units = normalize(embeddings)
+    if method == 'sum':
+        total = units.sum(axis=0, dtype=np.float64)
+        return float(total @ total) / (n * n)
+    if method == 'blocked':
+        rows_per_block = max(1, max_block_bytes // max(1, n * units.itemsize))
+        total = 0.0
+        for start in range(0, n, rows_per_block):
+            total += float((units[start:start + rows_per_block] @ units.T).sum(dtype=np.float64))
+        return total / (n * n)
+    raise ValueError(f"Unknown similarity method '{method}', expected 'sum' or 'blocked'")
+
+
+CLUSTERING_BACKENDS = ('kmeans', 'minibatch', 'spherical')
+# 'auto' clustering: threads with fewer comments than these use the cheaper backend below them
+MINIBATCH_MIN_COMMENTS = 2_000
+SPHERICAL_MIN_COMMENTS = 50_000
+MINIBATCH_SIZE = 1024
+SPHERICAL_ITERATIONS = 20
+
+
+def select_clustering_backend(n_comments: int, clustering: str = 'auto') -> str:
+    """
+    Resolve 'auto' to a clustering backend by thread size
+    
+    Threads below MINIBATCH_MIN_COMMENTS keep full KMeans (and so today's
+    results); larger threads use MiniBatchKMeans, and threads of
+    SPHERICAL_MIN_COMMENTS or more the fixed-iteration spherical k-means.
+    
+    Args:
+        n_comments (int): Number of comments in the thread
+        clustering (str): 'auto' or one of CLUSTERING_BACKENDS
+    
+    Returns:
+        str: One of CLUSTERING_BACKENDS
+    """
+    if clustering in CLUSTERING_BACKENDS:
+        return clustering
+    if clustering != 'auto':
+        raise ValueError(f"Unknown clustering backend '{clustering}', expected 'auto' or one of {CLUSTERING_BACKENDS}")
+    if n_comments < MINIBATCH_MIN_COMMENTS:
+        return 'kmeans'
+    if n_comments < SPHERICAL_MIN_COMMENTS:
+        return 'minibatch'
+    return 'spherical'
+
+
+def spherical_kmeans(embeddings: np.ndarray, n_clusters: int, n_iter: int = SPHERICAL_ITERATIONS,
+                     random_state: int = 42, init: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster unit-normalised embeddings by cosine similarity with a fixed number of iterations
+    
+    Each iteration is one (n x k) similarity product, so the run time is bounded
+    by O(n_iter * n * k * d) whatever the data. Seeds are picked k-means++ style
+    on cosine distance unless init centroids are given. A cluster left empty is
+    reseeded with the comment farthest from its own centroid.
+    
+    Args:
+        embeddings (np.ndarray): Array of comment embeddings
+        n_clusters (int): Number of clusters to form
+        n_iter (int): Number of assignment/update iterations
+        random_state (int): Seed for the initial centroids
+        init (Optional[np.ndarray]): Initial centroids (n_clusters x d)
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Cluster labels (0..k-1, all present) and unit centroids
+    """
+    units = normalize(embeddings)
+    n = len(units)
+    if init is not None:
+        centroids = normalize(np.asarray(init, dtype=units.dtype))
+    else:
+        rng = np.random.default_rng(random_state)
+        chosen = [int(rng.integers(n))]
+        distances = 1 - units @ units[chosen[0]]
+        for _ in range(1, n_clusters):
+            weights = np.clip(distances, 0, None)
+            total = weights.sum()
+            choice = int(rng.choice(n, p=weights / total)) if total > 0 else int(rng.integers(n))
+            chosen.append(choice)
+            distances = np.minimum(distances, 1 - units @ units[choice])
+        centroids = units[chosen]
+
+    for _ in range(n_iter):
+        similarities = units @ centroids.T
+        labels = similarities.argmax(axis=1)
+        membership = (labels == np.arange(len(centroids))[:, None]).astype(units.dtype)
+        sums = membership @ units
+        counts = np.bincount(labels, minlength=len(centroids))
+        for empty in np.flatnonzero(counts == 0):
+            farthest = int(similarities[np.arange(n), labels].argmin())
+            sums[empty] = units[farthest]
+            labels[farthest] = empty
+            similarities[farthest, empty] = 1.0
+        centroids = normalize(sums)
+
+    labels = (units @ centroids.T).argmax(axis=1)
+    present, labels = np.unique(labels, return_inverse=True)
+    return labels, centroids[present]
+
+
+DEFAULT_SWEEP_K = tuple(range(2, 9))
+
+
+def simplified_silhouette(embeddings: np.ndarray, centroids: np.ndarray, cluster_labels: np.ndarray) -> float:
+    """
+    Centroid-based silhouette on cosine distance, a cheap criterion for choosing k
+    
+    For each comment, a is the distance to its own centroid and b the distance to
+    the nearest other centroid; the score is the mean of (b - a) / max(a, b).
+    This needs one (n x k) similarity product instead of the O(n^2) pairwise
+    distances of the full silhouette.
+    
+    Args:
+        embeddings (np.ndarray): Array of comment embeddings
+        centroids (np.ndarray): Centroids of all coalitions
+        cluster_labels (np.ndarray): Coalition index of each comment
+    
+    Returns:
+        float: Score in [-1, 1] (higher means tighter, better separated coalitions);
+               NaN with fewer than two coalitions
+    """
+    if len(centroids) < 2:
+        return float('NaN')
+    distances = 1 - normalize(embeddings) @ normalize(centroids).T
+    rows = np.arange(len(embeddings))
+    own = distances[rows, cluster_labels]
+    distances[rows, cluster_labels] = np.inf
+    nearest_other = distances.min(axis=1)
+    denominator = np.maximum(own, nearest_other)
+    silhouettes = np.divide(nearest_other - own, denominator, out=np.zeros_like(own), where=denominator > 0)
+    return float(silhouettes.mean())
+
+
 class CoalitionAnalyzer:
-    min_score = float('inf')  # Global minimum score across all threads
-    max_score = float('-inf')  # Global maximum score across all threads
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None,
+                 embedding_cache: Optional[EmbeddingStore] = None, clustering: str = 'auto'):
         """
         Initialize the coalition analyzer with a sentence transformer model
         
+        The model is taken from the process-wide registry, so constructing many
+        analyzers only loads it from disk once.
+        
         Args:
             model_name (str): Sentence transformer model name
+            device (Optional[str]): Torch device; None lets the library choose
+            embedding_cache (Optional[EmbeddingStore]): On-disk store consulted before encoding
+            clustering (str): Clustering backend, 'auto' or one of CLUSTERING_BACKENDS
+                              (see select_clustering_backend)
         """
-        self.model = SentenceTransformer(model_name)
+        select_clustering_backend(0, clustering)  # validate early
+        self.model_name = model_name
+        self.model = get_model(model_name, device)
+        self.embedding_cache = embedding_cache
+        self.clustering = clustering
+
+    def _encode(self, texts: List[str], **encode_kwargs) -> np.ndarray:
+        """
+        Encode texts, taking any embeddings already in the cache and storing the new ones
+        
+        Args:
+            texts (List[str]): List of text comments
+            **encode_kwargs: Extra arguments for SentenceTransformer.encode
+        
+        Returns:
+            np.ndarray: Array of embeddings
+        """
+        if self.embedding_cache is None:
+            return self.model.encode(texts, convert_to_numpy=True, is_split_into_words=True, **encode_kwargs)
+
+        cached, found = self.embedding_cache.get_many(self.model_name, texts)
+        if found.all():
+            return cached
+        missing_texts = [text for text, hit in zip(texts, found) if not hit]
+        encoded = self.model.encode(missing_texts, convert_to_numpy=True, is_split_into_words=True,
+                                    **encode_kwargs).astype(np.float32, copy=False)
+        self.embedding_cache.put_many(self.model_name, missing_texts, encoded)
+        if not found.any():
+            return encoded
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[found] = cached[found]
+        embeddings[~found] = encoded
+        return embeddings
     
     def get_embeddings(self, texts: List[str]) -> np.ndarray:
         """
@@ -28,21 +337,65 @@ class CoalitionAnalyzer:
         Returns:
             np.ndarray: Array of embeddings
         """
-        embeddings = self.model.encode(texts, convert_to_numpy=True, is_split_into_words=True)
+        embeddings = self._encode(texts)
         return embeddings
+
+    def get_embeddings_batch(self, threads: List[List[str]], batch_size: int = 64) -> List[np.ndarray]:
+        """
+        Generate embeddings for the comments of many threads in a single encoder pass
+        
+        Comments from all threads are pooled and ordered by length, so each encoder
+        batch holds texts of similar length (little padding) and small threads no
+        longer leave the encoder under-utilised. The embeddings are then split back
+        into one array per thread, in the original comment order.
+        
+        Args:
+            threads (List[List[str]]): Comment texts for each thread
+            batch_size (int): Number of texts per encoder batch
+        
+        Returns:
+            List[np.ndarray]: Array of embeddings for each thread
+        """
+        pooled = [text for texts in threads for text in texts]
+        if not pooled:
+            return [np.zeros((0, 0), dtype=np.float32) for _ in threads]
+
+        # Length buckets: neighbouring texts in the sorted order share a batch
+        order = np.argsort([len(text) for text in pooled], kind='stable')
+        encoded = self._encode([pooled[i] for i in order], batch_size=batch_size)
+        embeddings = np.empty_like(encoded)
+        embeddings[order] = encoded
+
+        offsets = np.cumsum([len(texts) for texts in threads])[:-1]
+        return np.split(embeddings, offsets)
     
-    def cluster_comments(self, embeddings: np.ndarray, n_clusters: int = 3) -> np.ndarray:
+    def cluster_comments(self, embeddings: np.ndarray, n_clusters: int = 3,
+                         init: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Cluster comments using K-means
         
+        The backend (full KMeans, MiniBatchKMeans or spherical k-means) is the
+        analyzer's clustering setting, resolved per thread by comment count when 'auto'.
+        
         Args:
             embeddings (np.ndarray): Array of comment embeddings
             n_clusters (int): Number of clusters to form
+            init (Optional[np.ndarray]): Initial centroids (n_clusters x d) to warm-start
+                                         from, instead of k-means++ seeding
         
         Returns:
             np.ndarray: Cluster labels for each comment
         """
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+        backend = select_clustering_backend(len(embeddings), self.clustering)
+        if backend == 'spherical':
+            cluster_labels, _ = spherical_kmeans(embeddings, n_clusters, init=init)
+            return cluster_labels
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        seeding = {} if init is None else {'init': np.asarray(init, dtype=embeddings.dtype), 'n_init': 1}
+        if backend == 'minibatch':
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=MINIBATCH_SIZE, **seeding)
+        else:
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, **seeding)
         cluster_labels = kmeans.fit_predict(embeddings)
         return cluster_labels
     
@@ -94,25 +447,56 @@ class CoalitionAnalyzer:
                 comment_embedding.reshape(1, -1), 
                 other_centroids #add a 0 here if we need to 
             ))
-            # inter_score = - cosine_similarity(
-            #     comment_embedding.reshape(1, -1), 
-            #     coalition_centroids[comment_coalition].reshape(1, -1)
-            # )[0] - np.sum(inter_similarities)
-            #print(f"Inter Score: {intra_score}") 
         else:
             inter_score = float("NaN") #not applicable because we need multiple groups 
 
         final_score = inter_score - intra_score  # Direct difference instead of division
 
-        return final_score    
-    
-    def analyze_thread(self, comments: List[str], n_clusters: int = 3) -> Dict[str, Any]:
+        return final_score
+
+    def calculate_comment_scores(self,
+                                 embeddings: np.ndarray,
+                                 coalition_centroids: np.ndarray,
+                                 cluster_labels: np.ndarray) -> np.ndarray:
+        """
+        Calculate coalition-building scores for all comments at once
+
+        Matrix form of calculate_comment_score: embeddings and centroids are
+        normalised once, one product gives every comment x centroid similarity,
+        and each comment's own coalition is masked out of the inter-coalition sum.
+
+        Args:
+            embeddings (np.ndarray): Array of comment embeddings
+            coalition_centroids (np.ndarray): Centroids of all coalitions
+            cluster_labels (np.ndarray): Coalition index of each comment
+
+        Returns:
+            np.ndarray: Coalition-building score for each comment
+        """
+        similarities = normalize(embeddings) @ normalize(coalition_centroids).T
+        rows = np.arange(len(embeddings))
+        intra_scores = similarities[rows, cluster_labels]
+        if len(coalition_centroids) < 2:
+            # Not applicable because we need multiple groups
+            return np.full(len(embeddings), np.nan, dtype=similarities.dtype)
+        other_coalitions = np.ones(similarities.shape, dtype=bool)
+        other_coalitions[rows, cluster_labels] = False
+        inter_scores = np.where(other_coalitions, similarities, 0).sum(axis=1)
+        return inter_scores - intra_scores
+
+    def analyze_thread(self, comments: List[str], n_clusters: int = 3,
+                       embeddings: Optional[np.ndarray] = None,
+                       similarity_method: str = 'sum') -> Dict[str, Any]:
         """
         Perform full coalition analysis on a thread
         
         Args:
             comments (List[str]): List of comment texts
             n_clusters (int): Number of coalitions to identify
+            embeddings (Optional[np.ndarray]): Precomputed comment embeddings
+                                               (e.g. from get_embeddings_batch)
+            similarity_method (str): How the average pairwise similarity is computed
+                                     ('sum' or 'blocked', see mean_pairwise_similarity)
         
         Returns:
             Dict[str, Any]: Analysis results
@@ -123,7 +507,8 @@ class CoalitionAnalyzer:
             n_clusters = max(2, len(comments) - 1) if len(comments) > 1 else 1
 
         # Generate embeddings
-        embeddings = self.get_embeddings(comments)
+        if embeddings is None:
+            embeddings = self.get_embeddings(comments)
         
         # If we have only one comment or n_clusters is 1, we can't do meaningful clustering
         if len(comments) < 10 or n_clusters <= 1:
@@ -134,8 +519,7 @@ class CoalitionAnalyzer:
             }
         
         # Measure overall similarity of all comments
-        all_pairwise_similarities = cosine_similarity(embeddings)
-        avg_pairwise_similarity = np.mean(all_pairwise_similarities)
+        avg_pairwise_similarity = mean_pairwise_similarity(embeddings, similarity_method)
 
         # If similarity is very high (above 0.8), force a low diversity score
         if avg_pairwise_similarity > 0.8:  
@@ -148,42 +532,27 @@ class CoalitionAnalyzer:
         # Cluster comments
         cluster_labels = self.cluster_comments(embeddings, n_clusters)
         
+        return self.score_coalitions(embeddings, cluster_labels)
+
+    def score_coalitions(self, embeddings: np.ndarray, cluster_labels: np.ndarray) -> Dict[str, Any]:
+        """
+        Score a clustering of a thread's comments
+        
+        Args:
+            embeddings (np.ndarray): Array of comment embeddings
+            cluster_labels (np.ndarray): Cluster labels for each comment
+        
+        Returns:
+            Dict[str, Any]: Analysis results
+        """
         # Calculate coalition centroids
         coalition_centroids = self.calculate_coalition_centroids(embeddings, cluster_labels)
-        
-        # Calculate scores for each comment
-        # comment_scores = [
-        #     self.calculate_comment_score(emb, coalition_centroids, cluster)
-        #     for emb, cluster in zip(embeddings, cluster_labels)
-        # ]
-
-
-        # diversity_score = np.std(comment_scores)
-
-        # if np.std(comment_scores) < 0.05:
-        #     normalized_score = 0.0  # Very low diversity
-        # else:
-        #     if not np.isnan(diversity_score):  # Avoid updating if diversity_score is NaN
-        #         CoalitionAnalyzer.min_score = min(CoalitionAnalyzer.min_score, diversity_score)
-        #         CoalitionAnalyzer.max_score = max(CoalitionAnalyzer.max_score, diversity_score)
-
-        # # Normalize using Min-Max Scaling (only if min and max are different)
-        #     if CoalitionAnalyzer.max_score > CoalitionAnalyzer.min_score:
-        #         normalized_score = (diversity_score - CoalitionAnalyzer.min_score) / \
-        #                (CoalitionAnalyzer.max_score - CoalitionAnalyzer.min_score)
-        #     else:
-        #         normalized_score = 0.0  # Avoid division by zero
-        # #print(f"Overall Diversity Score: {normalized_score}")  # Debugging print
 
         # Calculate scores for each comment
-        comment_scores = [
-            self.calculate_comment_score(emb, coalition_centroids, cluster)
-            for emb, cluster in zip(embeddings, cluster_labels)
-        ]
+        comment_scores = self.calculate_comment_scores(embeddings, coalition_centroids, cluster_labels)
 
-        # Debug: Check for NaN in comment scores
         if any(np.isnan(score) for score in comment_scores):
-            print("Warning: Found NaN in comment scores")
+            logger.warning("Found NaN in comment scores; coalition diversity set to 0")
             return {
                 'cluster_labels': cluster_labels,
                 'comment_scores': comment_scores,
@@ -191,10 +560,9 @@ class CoalitionAnalyzer:
             }
 
         diversity_score = np.std(comment_scores)
-        
-        # Debug: Check diversity score
+
         if np.isnan(diversity_score):
-            print("Warning: Diversity score is NaN")
+            logger.warning("Diversity score is NaN; coalition diversity set to 0")
             return {
                 'cluster_labels': cluster_labels,
                 'comment_scores': comment_scores,
@@ -209,19 +577,8 @@ class CoalitionAnalyzer:
                 'overall_coalition_diversity': 0.0
             }
 
-        # Update global min/max scores
-        CoalitionAnalyzer.min_score = min(CoalitionAnalyzer.min_score, diversity_score)
-        CoalitionAnalyzer.max_score = max(CoalitionAnalyzer.max_score, diversity_score)
-
-        # Normalize score
-        # if CoalitionAnalyzer.max_score > CoalitionAnalyzer.min_score:
-        #     print(f'')
-        #     normalized_score = (diversity_score - CoalitionAnalyzer.min_score) / \
-        #         (CoalitionAnalyzer.max_score - CoalitionAnalyzer.min_score)
-        # else:
-        #     normalized_score = 0.0
-
-        # Final return statement (only one!)
+        # Raw scores only: normalise across threads afterwards with a reducer
+        # from normalization.py, so results do not depend on scoring order
         return {
             'cluster_labels': cluster_labels,
             'comment_scores': comment_scores,
@@ -229,57 +586,203 @@ class CoalitionAnalyzer:
         }
 
 
-def extract_comments_from_forest(comment_forest: List[Dict]) -> List[str]:
+    def sweep_clusters(self, comments: List[str], k_values: Iterable[int] = DEFAULT_SWEEP_K,
+                       embeddings: Optional[np.ndarray] = None,
+                       similarity_method: str = 'sum') -> Dict[str, Any]:
+        """
+        Analyze a thread for several numbers of coalitions in one pass and pick the best k
+        
+        The comments are embedded (and checked for homogeneity) once. The smallest k
+        is clustered as in analyze_thread; every larger k is warm-started from the
+        previous centroids plus the comment farthest from its own centroid. Each k is
+        rated with simplified_silhouette, and the k with the highest value is chosen.
+        
+        Args:
+            comments (List[str]): List of comment texts
+            k_values (Iterable[int]): Numbers of coalitions to try
+            embeddings (Optional[np.ndarray]): Precomputed comment embeddings
+            similarity_method (str): How the average pairwise similarity is computed
+        
+        Returns:
+            Dict[str, Any]: 'chosen_k' (None if no k could be rated), 'diversity_by_k',
+                            'silhouette_by_k' and the 'overall_coalition_diversity' of the chosen k
+        """
+        k_values = sorted(set(k_values))
+        nan_by_k = {k: float('NaN') for k in k_values}
+        if len(comments) < 10:
+            return {'chosen_k': None, 'diversity_by_k': dict(nan_by_k), 'silhouette_by_k': dict(nan_by_k),
+                    'overall_coalition_diversity': float('NaN')}
+
+        if embeddings is None:
+            embeddings = self.get_embeddings(comments)
+        if mean_pairwise_similarity(embeddings, similarity_method) > 0.8:
+            return {'chosen_k': None, 'diversity_by_k': {k: 0.0 for k in k_values},
+                    'silhouette_by_k': dict(nan_by_k), 'overall_coalition_diversity': 0.0}
+
+        diversity_by_k = dict(nan_by_k)
+        silhouette_by_k = dict(nan_by_k)
+        init = None
+        for k in k_values:
+            if k < 2 or k >= len(comments):
+                continue
+            if init is not None and len(init) != k:
+                init = None  # k values with gaps, or a previous clustering that left a cluster empty
+            cluster_labels = self.cluster_comments(embeddings, k, init=init)
+            results = self.score_coalitions(embeddings, cluster_labels)
+            diversity_by_k[k] = float(results['overall_coalition_diversity'])
+            centroids = self.calculate_coalition_centroids(embeddings, cluster_labels)
+            silhouette_by_k[k] = simplified_silhouette(embeddings, centroids, cluster_labels)
+            # Warm start for the next k: split off the comment worst served by its centroid
+            own_similarity = (normalize(embeddings) * normalize(centroids)[cluster_labels]).sum(axis=1)
+            init = np.vstack([centroids, embeddings[own_similarity.argmin()]])
+
+        rated = [k for k in k_values if not np.isnan(silhouette_by_k[k])]
+        chosen_k = max(rated, key=lambda k: silhouette_by_k[k]) if rated else None
+        return {
+            'chosen_k': chosen_k,
+            'diversity_by_k': diversity_by_k,
+            'silhouette_by_k': silhouette_by_k,
+            'overall_coalition_diversity': diversity_by_k[chosen_k] if rated else float('NaN'),
+        }
+
+
+def extract_comments_from_forest(comment_forest: Union[FlatThread, Dict]) -> List[str]:
     """
     Extract comment texts from a comment forest structure
     
     Args:
-        comment_forest (List[Dict]): A nested comment structure where each comment
-                                     has 'content' and optionally 'replies'
+        comment_forest (Union[FlatThread, Dict]): A nested comment structure where each comment
+                                                  has 'content' and optionally 'replies',
+                                                  or the thread already flattened
     
     Returns:
         List[str]: Flattened list of comment texts
     """
-    comment_texts = []
-    
-    def extract_recursive(comments):
-        for comment in comments:
-            if 'body' in comment:
-                comment_texts.append(comment['body'])
-            if 'replies' in comment and comment['replies']:
-                extract_recursive(comment['replies'])
-    extract_recursive(comment_forest['comments'])
-    return comment_texts
-    
+    thread = as_flat_thread(comment_forest).in_preorder()
+    return [body for body in thread.bodies if body is not None]
 
 
-def get_coalition_score(comment_forest, n_clusters: int = 3) -> float:
+def get_coalition_score(comment_forest, n_clusters: int = 3,
+                        model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None,
+                        embedding_cache: Optional[EmbeddingStore] = None, clustering: str = 'auto') -> float:
     """
     Calculate the coalition score for a comment forest JSON
     
     Args:
-        comment_forest (List[Dict]): A nested comment structure where each comment
-                                     has 'content' and optionally 'replies'
+        comment_forest (Union[FlatThread, Dict]): A nested comment structure where each comment
+                                                  has 'content' and optionally 'replies',
+                                                  or the thread already flattened
         n_clusters (int): Number of coalitions to identify
+        model_name (str): Sentence transformer model name
+        device (Optional[str]): Torch device; None lets the library choose
+        embedding_cache (Optional[EmbeddingStore]): On-disk store consulted before encoding
+        clustering (str): Clustering backend, 'auto' or one of CLUSTERING_BACKENDS
     
     Returns:
         float: Coalition score indicating viewpoint diversity (higher is more diverse)
                Returns 0.0 if analysis cannot be performed
     """
-    # print("called get_coalition_score successfully.")
-     # Extract comment texts from the forest structure
+    # Extract comment texts from the forest structure
     comment_texts = extract_comments_from_forest(comment_forest)
-    # print(f'successfully extracted {len(comment_texts)} comments.')
-        
+
     # Check if we have enough comments to analyze
     if len(comment_texts) < 10:  # Threshold for minimum comments
         return float("NaN")
         
     # Initialize analyzer and run analysis
-    analyzer = CoalitionAnalyzer()
+    analyzer = CoalitionAnalyzer(model_name, device, embedding_cache, clustering)
     results = analyzer.analyze_thread(comment_texts, n_clusters=min(n_clusters, len(comment_texts)))
         
     # Return the overall coalition diversity as the score
-    result = float(results['overall_coalition_diversity'])
-    # print(f'final value: {result}')
-    return result 
\ No newline at end of file
+    return float(results['overall_coalition_diversity'])
+
+
+def get_coalition_sweep(comment_forest, k_values: Iterable[int] = DEFAULT_SWEEP_K,
+                        model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None,
+                        embedding_cache: Optional[EmbeddingStore] = None,
+                        clustering: str = 'auto') -> Dict[str, Any]:
+    """
+    Calculate the coalition score of a comment forest for several k at once (see sweep_clusters)
+    
+    Args:
+        comment_forest (Union[FlatThread, Dict]): A comment forest JSON or the thread already flattened
+        k_values (Iterable[int]): Numbers of coalitions to try
+        model_name (str): Sentence transformer model name
+        device (Optional[str]): Torch device; None lets the library choose
+        embedding_cache (Optional[EmbeddingStore]): On-disk store consulted before encoding
+        clustering (str): Clustering backend, 'auto' or one of CLUSTERING_BACKENDS
+    
+    Returns:
+        Dict[str, Any]: 'coalition_best_k', 'coalition_best_diversity' and a
+                        'coalition_diversity_k<k>' entry for every k
+    """
+    k_values = sorted(set(k_values))
+    comment_texts = extract_comments_from_forest(comment_forest)
+    if len(comment_texts) < 10:  # Threshold for minimum comments
+        row = {'coalition_best_k': None, 'coalition_best_diversity': float("NaN")}
+        row.update({f'coalition_diversity_k{k}': float("NaN") for k in k_values})
+        return row
+
+    analyzer = CoalitionAnalyzer(model_name, device, embedding_cache, clustering)
+    results = analyzer.sweep_clusters(comment_texts, k_values)
+    row = {
+        'coalition_best_k': results['chosen_k'],
+        'coalition_best_diversity': float(results['overall_coalition_diversity']),
+    }
+    row.update({f'coalition_diversity_k{k}': results['diversity_by_k'][k] for k in k_values})
+    return row
+
+
+def get_coalition_scores(comment_forests: Iterable[Union[FlatThread, Dict]], n_clusters: int = 3,
+                         model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None,
+                         batch_size: int = 64, threads_per_pass: int = 256,
+                         embedding_cache: Optional[EmbeddingStore] = None,
+                         clustering: str = 'auto', normalization: Optional[str] = None) -> List[float]:
+    """
+    Calculate coalition scores for many comment forests, batching the encoder across threads
+    
+    Threads are taken in groups of threads_per_pass; the comments of each group are
+    embedded in one length-bucketed encode pass and then clustered thread by thread.
+    Scores are identical to calling get_coalition_score on each forest.
+    
+    With normalization, the raw scores of all forests are normalised together once
+    they are all computed (see normalization.py); to normalise scores computed in
+    several processes, merge the reducers of each process instead.
+    
+    Args:
+        comment_forests (Iterable[Union[FlatThread, Dict]]): Comment forest JSONs or flattened threads
+        n_clusters (int): Number of coalitions to identify
+        model_name (str): Sentence transformer model name
+        device (Optional[str]): Torch device; None lets the library choose
+        batch_size (int): Number of texts per encoder batch
+        threads_per_pass (int): Number of threads pooled into one encode pass
+                                (bounds the memory held by pooled embeddings)
+        embedding_cache (Optional[EmbeddingStore]): On-disk store consulted before encoding
+        clustering (str): Clustering backend, 'auto' or one of CLUSTERING_BACKENDS
+        normalization (Optional[str]): 'minmax', 'quantile' or 'zscore' to normalise the
+                                       scores across forests; None returns raw scores
+    
+    Returns:
+        List[float]: Coalition score for each forest, in input order
+    """
+    analyzer = CoalitionAnalyzer(model_name, device, embedding_cache, clustering)
+    scores = []
+    forests = iter(comment_forests)
+    while True:
+        group = list(islice(forests, threads_per_pass))
+        if not group:
+            break
+        threads = [extract_comments_from_forest(forest) for forest in group]
+        # Threads below the minimum comment count score NaN and are not embedded
+        scorable = [texts for texts in threads if len(texts) >= 10]
+        embeddings = iter(analyzer.get_embeddings_batch(scorable, batch_size=batch_size))
+        for texts in threads:
+            if len(texts) < 10:
+                scores.append(float("NaN"))
+                continue
+            results = analyzer.analyze_thread(texts, n_clusters=min(n_clusters, len(texts)),
+                                              embeddings=next(embeddings))
+            scores.append(float(results['overall_coalition_diversity']))
+    if normalization is not None:
+        scores = normalize_scores(scores, normalization).tolist()
+    return scores
@@ -0,0 +1,106 @@
+"""
+Bulk scan of comment bodies for credibility's per-comment text subfeatures.
+
+For every comment, credibility needs its whitespace-separated word count,
+whether it contains a link ('www.', '.com', 'http://' or 'https://'), whether it
+references a user ('u/' followed by a name character) and its alphabetic tokens
+(for misspellings, see spelling.py). scan_comments finds all of them for a whole
+thread at once: the bodies are joined and scanned once for links and
+references together, by one precompiled pattern of literals; word counts come
+from str.split and alphabetic tokens from spelling.scan_alpha_tokens.
+"""
+from typing import List, Iterable, Sequence, Union
+import re
+
+import numpy as np
+
+if __package__:
+    from .spelling import Vocabulary, _SEPARATOR, as_vocabulary, count_missing, join_texts, scan_alpha_tokens
+else:
+    from spelling import Vocabulary, _SEPARATOR, as_vocabulary, count_missing, join_texts, scan_alpha_tokens
+
+LINK = r'www\.|\.com|https?://'
+USER_REFERENCE = r'u/[^/,.!? ]'
+# Links and references cannot overlap (no link contains a 'u'), so one consuming pass sees all of them.
+# Texts are joined by the bare separator, which ends a reference like the end of a text does. (No
+# capturing groups: they would stop re skipping ahead to the characters a match can start with)
+LINK_OR_REFERENCE = re.compile(rf'{_SEPARATOR}|{LINK}|u/(?=[^/,.!? {_SEPARATOR}])')
+
+
+class CommentScan:
+    """
+    Per-comment text subfeatures of a list of comment bodies
+
+    Attributes:
+        word_counts (np.ndarray): Whitespace-separated words of each comment (len(body.split()))
+        has_links (np.ndarray): Whether each comment contains a link token
+        has_references (np.ndarray): Whether each comment references a user (u/name)
+    """
+
+    def __init__(self, word_counts: np.ndarray, has_links: np.ndarray, has_references: np.ndarray,
+                 text_of_token: np.ndarray, token_codes: np.ndarray, distinct_tokens: np.ndarray):
+        self.word_counts = word_counts
+        self.has_links = has_links
+        self.has_references = has_references
+        # Alphabetic tokens, as the comment each is in and a code into distinct_tokens
+        self._text_of_token = text_of_token
+        self._token_codes = token_codes
+        self._distinct_tokens = distinct_tokens
+
+    def __len__(self) -> int:
+        return len(self.word_counts)
+
+    @property
+    def alpha_tokens(self) -> List[List[str]]:
+        """
+        Alphabetic tokens of each comment, lower-cased, as spelling.alpha_tokens(body.lower()) gives them
+        """
+        tokens: List[List[str]] = [[] for _ in range(len(self))]
+        for text, code in zip(self._text_of_token.tolist(), self._token_codes.tolist()):
+            tokens[text].append(self._distinct_tokens[code])
+        return tokens
+
+    def misspellings(self, vocabulary: Union[Vocabulary, Iterable[str]]) -> np.ndarray:
+        """
+        Number of alphabetic tokens missing from the vocabulary in each comment
+
+        Args:
+            vocabulary (Union[Vocabulary, Iterable[str]]): Valid words
+
+        Returns:
+            np.ndarray: Misspelling count of each comment (int64), as spelling.count_misspellings of the lower-cased bodies
+        """
+        missing = count_missing(self._distinct_tokens, as_vocabulary(vocabulary))
+        return np.bincount(self._text_of_token, weights=missing[self._token_codes],
+                           minlength=len(self)).astype(np.int64)
+
+
+def scan_comments(texts: Sequence[str]) -> CommentScan:
+    """
+    Word counts, link and user reference flags and alphabetic tokens of comment bodies
+
+    Args:
+        texts (Sequence[str]): Comment bodies, as written (not lower-cased)
+
+    Returns:
+        CommentScan: Subfeatures of each body
+    """
+    word_counts = np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=len(texts))
+    if len(texts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return CommentScan(word_counts, empty.astype(bool), empty.astype(bool), empty, empty, np.zeros(0, dtype=object))
+
+    # Each match is a separator, a link or a reference ('u/'); the separators number the texts
+    has_links = np.zeros(len(texts), dtype=bool)
+    has_references = np.zeros(len(texts), dtype=bool)
+    text = 0
+    for match in LINK_OR_REFERENCE.findall(join_texts(texts, _SEPARATOR)):
+        if match == _SEPARATOR:
+            text += 1
+        elif match == 'u/':
+            has_references[text] = True
+        else:
+            has_links[text] = True
+
+    text_of_token, token_codes, distinct_tokens = scan_alpha_tokens([text.lower() for text in texts])
+    return CommentScan(word_counts, has_links, has_references, text_of_token, token_codes, distinct_tokens)
@@ -0,0 +1,206 @@
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+
+
+class FlatThread:
+    """
+    A comment forest flattened once into parallel arrays
+
+    Comments are stored in depth-first (pre-order) order, the same order in which
+    the recursive walks of every feature visit them, so each comment's parent
+    comes before it and every top-level branch is a contiguous slice.
+
+    Comments added later with append_comments (a live thread) go at the end, so
+    parents still come first but the order is no longer pre-order unless each new
+    comment extends the last branch; in_preorder() gives the thread as flattening
+    the grown forest would, with new replies after their existing siblings.
+
+    Attributes:
+        selftext (Optional[str]): Text of the post, None if the forest has no 'selftext'
+        bodies (List[Optional[str]]): Comment text, None if a comment has no 'body'
+        authors (List[Optional[str]]): Comment author, None if a comment has no 'author'
+        scores (np.ndarray): Vote score of each comment (0 if missing)
+        parents (np.ndarray): Index of each comment's parent comment, -1 for top-level comments
+        depths (np.ndarray): Reply depth of each comment, 0 for top-level comments
+        root_sentiment (Optional[float]): Sentiment of the post, filled by sentiment.get_thread_sentiments
+        sentiments (Optional[np.ndarray]): Sentiment of each comment, filled by sentiment.get_thread_sentiments
+    """
+
+    def __init__(self, selftext: Optional[str], bodies: List[Optional[str]], authors: List[Optional[str]],
+                 scores: np.ndarray, parents: np.ndarray, depths: np.ndarray):
+        self.selftext = selftext
+        self.bodies = bodies
+        self.authors = authors
+        self.scores = scores
+        self.parents = parents
+        self.depths = depths
+        self.root_sentiment = None
+        self.sentiments = None
+        self.is_preorder = True
+        self._child_counts = None
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    @property
+    def child_counts(self) -> np.ndarray:
+        """
+        Number of direct replies of each comment
+        """
+        if self._child_counts is None:
+            self._child_counts = np.bincount(self.parents[self.parents >= 0], minlength=len(self))
+        return self._child_counts
+
+    def roots(self) -> np.ndarray:
+        """
+        Indices of the top-level comments
+        """
+        return np.flatnonzero(self.parents == -1)
+
+    def branch_slices(self) -> List[slice]:
+        """
+        Slice of the comment arrays covered by each top-level branch
+        """
+        if not self.is_preorder:
+            raise ValueError("Branches of a thread with appended comments are not contiguous; use in_preorder()")
+        roots = self.roots()
+        ends = np.append(roots[1:], len(self))
+        return [slice(int(start), int(end)) for start, end in zip(roots, ends)]
+
+    def append_comments(self, comments: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Add new comments to the thread, as replies to comments already in it
+
+        Existing comments keep their indices. Sentiments already computed are
+        kept; get_thread_sentiments scores only the new comments.
+
+        Args:
+            comments (List[Dict]): Comments with 'body', 'author' and 'score' like those of a
+                                   comment forest, and 'parent': the index of the comment replied
+                                   to (-1 or absent for a top-level comment), which may be a
+                                   comment earlier in the same list
+
+        Returns:
+            np.ndarray: Indices of the new comments
+        """
+        start = len(self)
+        parents = [int(comment.get('parent', -1)) for comment in comments]
+        depths = []
+        for index, parent in enumerate(parents, start):
+            if not -1 <= parent < index:
+                raise ValueError(f"Comment {index} cannot reply to comment {parent}: there are only {index} comments before it")
+            depths.append(0 if parent < 0 else (int(self.depths[parent]) if parent < start else depths[parent - start]) + 1)
+            if self.is_preorder and parent >= 0 and not self._on_last_path(parent, parents[:index - start]):
+                self.is_preorder = False
+
+        self.bodies = self.bodies + [comment.get('body') for comment in comments]
+        self.authors = self.authors + [comment.get('author') for comment in comments]
+        self.scores = np.append(self.scores, np.array([comment.get('score') or 0 for comment in comments], dtype=np.int64))
+        self.parents = np.append(self.parents, np.array(parents, dtype=np.int64))
+        self.depths = np.append(self.depths, np.array(depths, dtype=np.int64))
+        self._child_counts = None
+        return np.arange(start, len(self))
+
+    def _on_last_path(self, parent: int, new_parents: List[int]) -> bool:
+        # A reply keeps pre-order only if it replies to the last comment or one of its ancestors
+        ancestor = len(self) + len(new_parents) - 1
+        while ancestor > parent:
+            ancestor = int(self.parents[ancestor]) if ancestor < len(self) else new_parents[ancestor - len(self)]
+        return ancestor == parent
+
+    def preorder(self) -> np.ndarray:
+        """
+        Indices of the comments in pre-order, replies in the order they were added
+        """
+        if self.is_preorder:
+            return np.arange(len(self))
+        children = [[] for _ in range(len(self))]
+        roots = []
+        for index, parent in enumerate(self.parents.tolist()):
+            (roots if parent < 0 else children[parent]).append(index)
+        order = []
+        stack = roots[::-1]
+        while stack:
+            index = stack.pop()
+            order.append(index)
+            stack.extend(reversed(children[index]))
+        return np.array(order, dtype=np.int64)
+
+    def in_preorder(self) -> 'FlatThread':
+        """
+        The thread in pre-order (itself if it already is): the flattening of the forest it has grown into
+        """
+        if self.is_preorder:
+            return self
+        order = self.preorder()
+        position = np.empty(len(self), dtype=np.int64)
+        position[order] = np.arange(len(self))
+        parents = self.parents[order]
+        thread = FlatThread(self.selftext, [self.bodies[i] for i in order], [self.authors[i] for i in order],
+                            self.scores[order], np.where(parents < 0, -1, position[np.maximum(parents, 0)]),
+                            self.depths[order])
+        if self.sentiments is not None and len(self.sentiments) == len(self):
+            thread.root_sentiment = self.root_sentiment
+            thread.sentiments = self.sentiments[order]
+        return thread
+
+
+def flatten_thread(comment_forest: Union[Dict[str, Any], List[Dict[str, Any]]]) -> FlatThread:
+    """
+    Flatten a comment forest JSON in a single iterative pass
+
+    Uses an explicit stack instead of recursion, so arbitrarily deep reply chains
+    cannot hit Python's recursion limit.
+
+    Args:
+        comment_forest (Union[Dict, List[Dict]]): A post JSON with 'comments' (and usually
+                                                  'selftext'), or a bare list of top-level comments
+
+    Returns:
+        FlatThread: The flattened thread
+    """
+    if isinstance(comment_forest, list):
+        selftext = None
+        top_level = comment_forest
+    else:
+        selftext = comment_forest.get('selftext')
+        top_level = comment_forest.get('comments') or []
+
+    bodies = []
+    authors = []
+    scores = []
+    parents = []
+    depths = []
+
+    stack = [(comment, -1, 0) for comment in reversed(top_level)]
+    while stack:
+        comment, parent, depth = stack.pop()
+        index = len(bodies)
+        bodies.append(comment.get('body'))
+        authors.append(comment.get('author'))
+        scores.append(comment.get('score') or 0)
+        parents.append(parent)
+        depths.append(depth)
+        replies = comment.get('replies')
+        if replies:
+            stack.extend((reply, index, depth + 1) for reply in reversed(replies))
+
+    return FlatThread(selftext, bodies, authors,
+                      np.array(scores, dtype=np.int64),
+                      np.array(parents, dtype=np.int64),
+                      np.array(depths, dtype=np.int64))
+
+
+def as_flat_thread(comment_forest: Union[FlatThread, Dict[str, Any], List[Dict[str, Any]]]) -> FlatThread:
+    """
+    Return comment_forest as a FlatThread, flattening it only if it is not one already
+
+    Args:
+        comment_forest (Union[FlatThread, Dict, List[Dict]]): A flattened thread or a comment forest JSON
+
+    Returns:
+        FlatThread: The flattened thread
+    """
+    if isinstance(comment_forest, FlatThread):
+        return comment_forest
+    return flatten_thread(comment_forest)
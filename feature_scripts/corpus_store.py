@@ -0,0 +1,275 @@
+"""
+Compact binary store for a tree of scraped thread JSONs.
+
+build_corpus_store packs a <subreddit>/<date_dir>/<post_id>.json tree into one
+directory of flat binary columns: per-comment score, parent offset, depth and
+author id arrays, an author string table, and the comment bodies of each thread
+as one UTF-8 run. CorpusStore memory-maps those columns and rebuilds any
+thread as a FlatThread without parsing JSON.
+
+Usage:
+    python corpus_store.py ../scraping/representative_subreddits_for_varied_percentiles ../corpus_stores/representative
+"""
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from datetime import datetime
+import argparse
+import json
+import os
+import numpy as np
+
+if __package__:
+    from .comment_thread import FlatThread, flatten_thread
+    from .metadata_index import iter_meta_data
+else:
+    from comment_thread import FlatThread, flatten_thread
+    from metadata_index import iter_meta_data
+
+STORE_VERSION = 1
+STORE_MARKER = 'constructive-ranking corpus store'
+
+# Per-comment columns: file name -> dtype
+COMMENT_COLUMNS = {
+    'scores': np.int64,
+    'parents': np.int32,   # index of the parent within its thread, -1 for top-level comments
+    'depths': np.int32,
+    'author_ids': np.int32,  # row of the author string table, -1 for a missing author
+    'body_lengths': np.int64,  # length in characters of each body, -1 for a missing body
+}
+# Per-thread columns: file name -> dtype
+THREAD_COLUMNS = {
+    'comment_offsets': np.int64,  # first comment of each thread, plus a final end offset
+    'body_byte_offsets': np.int64,  # start of each thread's bodies in bodies.bin, plus a final end offset
+    'selftext_byte_offsets': np.int64,
+    'selftext_present': np.bool_,
+}
+
+
+def _encode(text: str) -> bytes:
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def _decode(data: bytes) -> str:
+    return data.decode('utf-8', 'surrogatepass')
+
+
+def is_corpus_store(path: str) -> bool:
+    """
+    Whether path is a directory written by build_corpus_store
+    """
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return False
+    with open(meta_path) as file:
+        return json.load(file).get('format') == STORE_MARKER
+
+
+def build_corpus_store(source_directory: str, store_directory: str) -> int:
+    """
+    Pack every JSON under source_directory into a corpus store
+
+    Threads are appended to the column files one at a time, so memory use does
+    not grow with the size of the corpus (apart from the author table).
+
+    Args:
+        source_directory (str): Directory laid out as <subreddit>/<date_dir>/<post_id>.json
+        store_directory (str): Directory to write the store to (created if needed)
+
+    Returns:
+        int: Number of threads stored
+    """
+    os.makedirs(store_directory, exist_ok=True)
+    author_ids: Dict[str, int] = {}
+    posts = []
+    comment_offsets = [0]
+    body_byte_offsets = [0]
+    selftext_byte_offsets = [0]
+    selftext_present = []
+
+    def path(name):
+        return os.path.join(store_directory, name)
+
+    comment_files = {name: open(path(f'{name}.bin'), 'wb') for name in COMMENT_COLUMNS}
+    with open(path('bodies.bin'), 'wb') as bodies_file, open(path('selftext.bin'), 'wb') as selftext_file:
+        try:
+            for meta in iter_meta_data(source_directory):
+                with open(meta['path']) as file:
+                    comment_forest = json.load(file)
+                thread = flatten_thread(comment_forest)
+
+                bodies = [body for body in thread.bodies if body is not None]
+                body_bytes = _encode(''.join(bodies))
+                bodies_file.write(body_bytes)
+                body_byte_offsets.append(body_byte_offsets[-1] + len(body_bytes))
+
+                selftext_bytes = _encode(thread.selftext) if thread.selftext is not None else b''
+                selftext_file.write(selftext_bytes)
+                selftext_byte_offsets.append(selftext_byte_offsets[-1] + len(selftext_bytes))
+                selftext_present.append(thread.selftext is not None)
+
+                columns = {
+                    'scores': thread.scores,
+                    'parents': thread.parents,
+                    'depths': thread.depths,
+                    'author_ids': [-1 if author is None else author_ids.setdefault(author, len(author_ids))
+                                   for author in thread.authors],
+                    'body_lengths': [-1 if body is None else len(body) for body in thread.bodies],
+                }
+                for name, values in columns.items():
+                    np.asarray(values, dtype=COMMENT_COLUMNS[name]).tofile(comment_files[name])
+                comment_offsets.append(comment_offsets[-1] + len(thread))
+
+                header = {key: value for key, value in comment_forest.items() if key not in ('comments', 'selftext')}
+                posts.append({
+                    'path': meta['path'],
+                    'subreddit': meta['subreddit'],
+                    'download_date': meta['download_date'].isoformat(),
+                    'post_id': meta['post_id'],
+                    'header': header,
+                })
+        finally:
+            for file in comment_files.values():
+                file.close()
+
+    thread_columns = {
+        'comment_offsets': comment_offsets,
+        'body_byte_offsets': body_byte_offsets,
+        'selftext_byte_offsets': selftext_byte_offsets,
+        'selftext_present': selftext_present,
+    }
+    for name, values in thread_columns.items():
+        np.asarray(values, dtype=THREAD_COLUMNS[name]).tofile(path(f'{name}.bin'))
+
+    authors = list(author_ids)
+    with open(path('authors.bin'), 'wb') as file:
+        file.write(_encode(''.join(authors)))
+    np.asarray([len(author) for author in authors], dtype=np.int64).tofile(path('author_lengths.bin'))
+
+    with open(path('posts.json'), 'w') as file:
+        json.dump(posts, file)
+    with open(path('meta.json'), 'w') as file:
+        json.dump({'format': STORE_MARKER, 'version': STORE_VERSION, 'source': source_directory,
+                   'threads': len(posts), 'comments': comment_offsets[-1], 'authors': len(authors)}, file)
+    return len(posts)
+
+
+def _split(text: str, lengths: np.ndarray) -> List[str]:
+    """ Cut text into consecutive pieces of the given character lengths. """
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [text[start:end] for start, end in zip(starts, ends)]
+
+
+class CorpusStore:
+    """
+    Read-only, memory-mapped view of a corpus store
+
+    Iterating yields (meta, FlatThread) pairs in the same order (and with the
+    same meta keys) as gather_meta_data, so it can replace a walk over the JSONs.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(self._path('meta.json')) as file:
+            self.info = json.load(file)
+        if self.info.get('format') != STORE_MARKER:
+            raise ValueError(f"{directory} is not a corpus store")
+        if self.info['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported corpus store version {self.info['version']} in {directory}")
+        with open(self._path('posts.json')) as file:
+            self.posts = json.load(file)
+        self.columns = {name: self._map(name, dtype) for name, dtype in {**COMMENT_COLUMNS, **THREAD_COLUMNS}.items()}
+        self.bodies = self._map('bodies', np.uint8)
+        self.selftexts = self._map('selftext', np.uint8)
+        self._authors: Optional[List[str]] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        path = self._path(f'{name}.bin')
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    @property
+    def fingerprint(self) -> Tuple[int, int]:
+        """
+        (mtime in ns, size) of the store's meta file; changes whenever the store is rebuilt
+        """
+        stat = os.stat(self._path('meta.json'))
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def authors(self) -> List[str]:
+        """
+        Author string table, decoded on first use
+        """
+        if self._authors is None:
+            self._authors = _split(_decode(self._map('authors', np.uint8).tobytes()),
+                                   self._map('author_lengths', np.int64))
+        return self._authors
+
+    def __len__(self) -> int:
+        return len(self.posts)
+
+    def meta(self, index: int) -> Dict[str, Any]:
+        """
+        gather_meta_data-style metadata of a thread (path, subreddit, download_date, post_id)
+        """
+        post = self.posts[index]
+        return {
+            'path': post['path'],
+            'subreddit': post['subreddit'],
+            'download_date': datetime.fromisoformat(post['download_date']),
+            'post_id': post['post_id'],
+        }
+
+    def header(self, index: int) -> Dict[str, Any]:
+        """
+        Post-level fields of a thread (title, author, score, ...) other than selftext and comments
+        """
+        return self.posts[index]['header']
+
+    def thread(self, index: int) -> FlatThread:
+        """
+        Rebuild a thread as a FlatThread straight from the memory-mapped columns
+        """
+        columns = self.columns
+        start, end = columns['comment_offsets'][index:index + 2]
+        body_start, body_end = columns['body_byte_offsets'][index:index + 2]
+
+        body_lengths = np.asarray(columns['body_lengths'][start:end])
+        present = body_lengths >= 0
+        pieces = iter(_split(_decode(self.bodies[body_start:body_end].tobytes()), body_lengths[present]))
+        bodies = [next(pieces) if is_present else None for is_present in present.tolist()]
+
+        authors = self.authors
+        authors = [authors[author_id] if author_id >= 0 else None
+                   for author_id in columns['author_ids'][start:end].tolist()]
+
+        selftext = None
+        if columns['selftext_present'][index]:
+            text_start, text_end = columns['selftext_byte_offsets'][index:index + 2]
+            selftext = _decode(self.selftexts[text_start:text_end].tobytes())
+
+        return FlatThread(selftext, bodies, authors,
+                          np.array(columns['scores'][start:end], dtype=np.int64),
+                          np.array(columns['parents'][start:end], dtype=np.int64),
+                          np.array(columns['depths'][start:end], dtype=np.int64))
+
+    def __iter__(self) -> Iterator[Tuple[Dict[str, Any], FlatThread]]:
+        for index in range(len(self)):
+            yield self.meta(index), self.thread(index)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pack a directory of scraped thread JSONs into a corpus store.")
+    parser.add_argument('source', help="Directory laid out as <subreddit>/<date_dir>/<post_id>.json")
+    parser.add_argument('store', help="Directory to write the corpus store to")
+    args = parser.parse_args(argv)
+    count = build_corpus_store(args.source, args.store)
+    print(f'Stored {count} threads in {args.store}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,3 @@
-import nltk
-nltk.download('punkt_tab')
-from nltk import tokenize
-
-import pandas as pd
-import matplotlib.pyplot as plt
-import re
-import numpy as np
-import os
-import openai
-from dotenv import load_dotenv
-
-# Load .env variables
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
 # # Create VALID_WORDS word set from auxiliary files. 
 # # wikitionary_popular_words_40k.txt downloaded from https://github.com/dolph/dictionary/blob/master/popular.txt
 # # valid_words.txt downloaded from https://github.com/dwyl/english-words/blob/master/words.txt
@@ -168,53 +152,146 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 #     return return_dictionary
 
 
-import nltk
-nltk.download('punkt')
-from nltk import tokenize
-
 import pandas as pd
-import matplotlib.pyplot as plt
-import re
-import numpy as np
 import os
-import openai
-from dotenv import load_dotenv
+import threading
 import time
+import warnings
 from typing import List, Dict, Any
 
-# Load .env variables
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-# Create VALID_WORDS word set from auxiliary files
+if __package__:
+    from .comment_thread import as_flat_thread
+    from .readability_backends import ReadabilityBackend, get_readability_backend, openai_api_key
+    from .readability_cache import ReadabilityCache, normalize_text
+    from .comment_scan import scan_comments
+    from .spelling import Vocabulary, as_vocabulary, load_punkt
+else:
+    from comment_thread import as_flat_thread
+    from readability_backends import ReadabilityBackend, get_readability_backend, openai_api_key
+    from readability_cache import ReadabilityCache, normalize_text
+    from comment_scan import scan_comments
+    from spelling import Vocabulary, as_vocabulary, load_punkt
+
+# Word lists making up VALID_WORDS. valid_words.txt (https://github.com/dwyl/english-words)
+# is not in the repository; without it only the popular words list is used
 script_dir = os.path.dirname(os.path.abspath(__file__))
-VALID_WORDS = set()
-for file_name in ["valid_words.txt", "wikitionary_popular_words_40k.txt"]:
-    file_path = os.path.join(script_dir, "auxiliary_files", file_name)
-    with open(file_path, "r") as file: 
-        VALID_WORDS.update(set(word.strip() for word in file.readlines()))
+VALID_WORD_FILES = [os.path.join(script_dir, "auxiliary_files", file_name)
+                    for file_name in ["valid_words.txt", "wikitionary_popular_words_40k.txt"]]
+# Memory-mappable build of the word lists (see build_vocabulary_artifact), shared by worker processes
+VOCABULARY_ARTIFACT = os.path.join(script_dir, "auxiliary_files", "valid_words.vocab")
+
+# Subfeatures summed into the credibility score, with their sign: investment
+# (length, links, misspellings, readability), then reputation (author references, votes)
+CREDIBILITY_WEIGHTS = {
+    "comment_length_mean": 1,
+    "comment_has_links_proportion": 1,
+    "misspelled_words_proportion": -1,
+    "readability_mean": 1,
+    "comment_has_author_references_proportion": 1,
+    "vote_score_mean": 1,
+}
+
+# The OpenAI client and the word lists are loaded on first use (or by preload()),
+# so importing this module reads no files, sets up no client and needs no network
+_client = None
+_valid_words = None
+_valid_vocabulary = None
+_lazy_lock = threading.Lock()
+
+def get_openai_client():
+    """The process-wide OpenAI client, created (after loading .env) on first use"""
+    global _client
+    if _client is None:
+        with _lazy_lock:
+            if _client is None:
+                import openai
+                _client = openai.OpenAI(api_key=openai_api_key())
+    return _client
+
+def get_valid_words():
+    """The set of valid words, read from VALID_WORD_FILES on first use"""
+    global _valid_words
+    if _valid_words is None:
+        with _lazy_lock:
+            if _valid_words is None:
+                valid_words = set()
+                for file_path in VALID_WORD_FILES:
+                    if not os.path.isfile(file_path):
+                        warnings.warn(f"Word list {file_path} not found; misspellings are checked without it")
+                        continue
+                    with open(file_path, "r") as file: 
+                        valid_words.update(set(word.strip() for word in file.readlines()))
+                _valid_words = valid_words
+    return _valid_words
+
+def _existing_word_files():
+    return [file_path for file_path in VALID_WORD_FILES if os.path.isfile(file_path)]
+
+def load_vocabulary_artifact():
+    """The memory-mapped VOCABULARY_ARTIFACT, or None if it is missing or was built from other word lists"""
+    if not os.path.isfile(VOCABULARY_ARTIFACT):
+        return None
+    try:
+        return Vocabulary.load(VOCABULARY_ARTIFACT, sources=_existing_word_files())
+    except ValueError:
+        return None
+
+def build_vocabulary_artifact(force=False):
+    """Write VOCABULARY_ARTIFACT from VALID_WORD_FILES, unless an up-to-date one exists
+
+    Run once before starting worker processes (batch_scoring does), so that each
+    maps the same file instead of reading the word lists into a set of its own.
+    Returns the artifact's path.
+    """
+    if force or load_vocabulary_artifact() is None:
+        word_files = _existing_word_files()
+        Vocabulary.from_files(word_files).save(VOCABULARY_ARTIFACT, sources=word_files)
+    return VOCABULARY_ARTIFACT
+
+def get_valid_vocabulary():
+    """The valid words as a Vocabulary for counting misspellings, loaded on first use
+
+    Memory-mapped from VOCABULARY_ARTIFACT when it is up to date, otherwise built from VALID_WORDS.
+    """
+    global _valid_vocabulary
+    if _valid_vocabulary is None:
+        vocabulary = load_vocabulary_artifact()
+        if vocabulary is None:
+            vocabulary = Vocabulary.from_words(get_valid_words())
+        with _lazy_lock:
+            if _valid_vocabulary is None:
+                _valid_vocabulary = vocabulary
+    return _valid_vocabulary
+
+def __getattr__(name):
+    # Module attributes that used to be set at import time, now loaded when first accessed
+    if name == 'client':
+        return get_openai_client()
+    if name == 'VALID_WORDS':
+        return get_valid_words()
+    if name == 'VALID_VOCABULARY':
+        return get_valid_vocabulary()
+    if name == 'OPENAI_API_KEY':
+        return openai_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def preload(readability_backend='llm'):
+    """Load everything credibility scoring with readability_backend needs now rather than on the first thread
+
+    For long-running workers; scoring works the same without it.
+    """
+    get_valid_vocabulary()
+    load_punkt()
+    if readability_backend == 'llm':
+        get_openai_client()
+    get_named_readability_backend(readability_backend)
 
 def flatten_comments(comment_forest):
-    flattened = []
-
-    def traverse(comment):
-        flattened.append({
-                "author": comment["author"],
-                "body": comment["body"],
-                "score": comment["score"]
-            })
-
-        if "replies" in comment and comment["replies"]:
-            for reply in comment["replies"]:
-                traverse(reply)
-
-    if "comments" in comment_forest:
-        for comment in comment_forest["comments"]:
-            traverse(comment)
-    return flattened
+    thread = as_flat_thread(comment_forest)
+    return [
+        {"author": author, "body": body, "score": int(score)}
+        for author, body, score in zip(thread.authors, thread.bodies, thread.scores)
+    ]
 
 def create_batch_readability_requests(comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Prepare batch requests for readability scoring"""
@@ -256,9 +333,9 @@ def process_batch_responses(batch_id: str, comment_bodies: List[str]) -> List[fl
     
     for attempt in range(max_retries):
         try:
-            batch_status = client.batches.retrieve(batch_id)
+            batch_status = get_openai_client().batches.retrieve(batch_id)
             if batch_status.status == "completed":
-                results = client.batches.retrieve_output(batch_id)
+                results = get_openai_client().batches.retrieve_output(batch_id)
                 return [float(response['body']['choices'][0]['message']['content']) 
                         for response in results['results']]
             elif batch_status.status == "failed":
@@ -274,104 +351,176 @@ def process_batch_responses(batch_id: str, comment_bodies: List[str]) -> List[fl
     
     raise Exception("Max retries exceeded while waiting for batch completion")
 
-def get_credibility_subfeatures(comment_forest, valid_words=VALID_WORDS):
-    flattened_comment_forest = flatten_comments(comment_forest)
-
-    # Initialize subfeatures for aggregation
-    comments_referencing_other_authors_count = 0
-    total_vote_score = 0
-    authors_set = set()
-    total_word_count = 0
-    comments_with_links_count = 0
-    misspellings_count = 0
-    total_readability_score = 0
-    total_readable_comments_count = 0
-    total_comments = 0
-    
-    # First pass: Collect all comments that need readability scoring
-    comments_for_readability = []
-    for comment in flattened_comment_forest:
-        comment_body = comment['body']
+READABILITY_BACKENDS = ('llm', 'llm-async', 'local')
+# Named backends are created once per process, so e.g. the async backend's rate limits span all threads scored here
+_named_backends = {}
+_readability_caches = {}
+
+def get_named_readability_backend(readability_backend):
+    if isinstance(readability_backend, ReadabilityBackend):
+        return readability_backend
+    if readability_backend not in _named_backends:
+        _named_backends[readability_backend] = get_readability_backend(readability_backend)
+    return _named_backends[readability_backend]
+
+def get_readability_cache(readability_cache):
+    """A ReadabilityCache, opened once per process if given as a path"""
+    if readability_cache is None or isinstance(readability_cache, ReadabilityCache):
+        return readability_cache
+    if readability_cache not in _readability_caches:
+        _readability_caches[readability_cache] = ReadabilityCache(readability_cache)
+    return _readability_caches[readability_cache]
+
+def score_readability(bodies, readability_backend='llm'):
+    """Readability score of each body (NaN where it could not be scored), in order"""
+    if not bodies:
+        return []
+    if readability_backend != 'llm':
+        return get_named_readability_backend(readability_backend).score_many(bodies)
+    try:
+        # Create batch requests
+        batch_requests = create_batch_readability_requests([{'body': body} for body in bodies])
         
-        if comment_body in ("[removed]", "[deleted]"):
-            continue
-            
-        total_comments += 1
-        authors_set.add(comment['author'])
+        # Create and submit batch
+        batch = get_openai_client().batches.create(
+            input_file=batch_requests,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
         
-        # Reputation subfeatures
-        has_reference = re.search(r'u/([^/,.!? ]+)', comment_body) is not None
-        comments_referencing_other_authors_count += has_reference
-        total_vote_score += comment['score']
+        print(f"Batch created with ID: {batch.id}")
         
-        # Investment subfeatures
-        total_word_count += len(comment_body.split())
+        # Process batch responses
+        return process_batch_responses(batch.id, bodies)
+    except Exception as e:
+        print(f"Error processing batch: {str(e)}")
+        # Fallback to concurrent individual requests if batch fails
+        return get_named_readability_backend('llm-async').score_many(bodies)
+
+def get_readability_scores(bodies, readability_backend='llm', readability_cache=None):
+    """Readability score of each body, scoring only the bodies not in readability_cache and caching the new scores
+
+    Bodies that normalise to the same text (see readability_cache.normalize_text) are scored once.
+    Failed scores are not cached, so they are retried on the next run.
+    """
+    cache = get_readability_cache(readability_cache)
+    if cache is None:
+        return score_readability(bodies, readability_backend)
+    namespace = get_named_readability_backend(readability_backend).cache_namespace
+    known = cache.get_many(namespace, bodies)
+    missing = {}
+    for body in bodies:
+        if body not in known:
+            missing.setdefault(normalize_text(body), body)
+    missing = list(missing.values())
+    new_scores = dict(zip(missing, score_readability(missing, readability_backend)))
+    cache.put_many(namespace, {body: score for body, score in new_scores.items() if not pd.isna(score)})
+    by_normalized_text = {normalize_text(body): score for body, score in new_scores.items()}
+    return [known[body] if body in known else by_normalized_text[normalize_text(body)] for body in bodies]
+
+class CredibilityTotals:
+    """Running sums the credibility subfeatures are computed from
+
+    Comments can be added a batch at a time, e.g. as they arrive in a live thread
+    (see live_scoring.py): only the new comments are scanned and scored for readability.
+    Vote scores are taken as they were when a comment was added.
+    """
+
+    def __init__(self):
+        # reputation
+        self.comments_referencing_other_authors_count = 0
+        self.total_vote_score = 0
+        self.authors_set = set()
+        # investment
+        self.total_word_count = 0
+        self.comments_with_links_count = 0
+        self.misspellings_count = 0
+        self.total_readability_score = 0
+        self.total_readable_comments_count = 0
+        self.total_comments = 0
+
+    def add(self, comments, valid_words=None, readability_backend='llm', readability_cache=None):
+        """Add comments (dicts with 'author', 'body' and 'score'); removed and deleted comments are skipped
+
+        The arguments after comments are those of get_credibility_subfeatures.
+        """
+        # First pass: Collect all comments that need text subfeatures and readability scoring
+        comments_for_readability = []
+        for comment in comments:
+            comment_body = comment['body']
+            
+            if comment_body is None or comment_body in ("[removed]", "[deleted]"):
+                continue
+                
+            self.total_comments += 1
+            self.authors_set.add(comment['author'])
+            self.total_vote_score += comment['score']
+            
+            # Store comment for the batch text scan and readability scoring
+            comments_for_readability.append(comment)
         
-        tokens = ['www.', '.com', 'http://', 'https://']
-        has_links = any(token in comment_body for token in tokens)
-        comments_with_links_count += has_links
+        bodies = [comment['body'] for comment in comments_for_readability]
         
-        paragraph_lower = comment_body.lower()
-        tokens = tokenize.word_tokenize(paragraph_lower)
-        misspellings = [token for token in tokens if token.isalpha() and token not in valid_words]
-        misspellings_count += len(misspellings)
+        # Author references, word counts, links and misspellings of all comments in one scan (see comment_scan.py)
+        scan = scan_comments(bodies)
+        self.comments_referencing_other_authors_count += int(scan.has_references.sum())
+        self.total_word_count += int(scan.word_counts.sum())
+        self.comments_with_links_count += int(scan.has_links.sum())
+        vocabulary = get_valid_vocabulary() if valid_words is None or valid_words is _valid_words else as_vocabulary(valid_words)
+        self.misspellings_count += int(scan.misspellings(vocabulary).sum())
         
-        # Store comment for batch processing
-        comments_for_readability.append(comment)
-    
-    # Batch process readability scores
-    if comments_for_readability:
-        try:
-            # Create batch requests
-            batch_requests = create_batch_readability_requests(comments_for_readability)
-            
-            # Create and submit batch
-            batch = client.batches.create(
-                input_file=batch_requests,
-                endpoint="/v1/chat/completions",
-                completion_window="24h"
-            )
-            
-            print(f"Batch created with ID: {batch.id}")
-            
-            # Process batch responses
-            readability_scores = process_batch_responses(batch.id, [c['body'] for c in comments_for_readability])
-            
-            # Map scores back to comments
-            for i, score in enumerate(readability_scores):
-                if not pd.isna(score):
-                    total_readability_score += score
-                    total_readable_comments_count += 1
-                    
-        except Exception as e:
-            print(f"Error processing batch: {str(e)}")
-            # Fallback to individual processing if batch fails
-            for comment in comments_for_readability:
-                readability_score = get_comment_readability_individual(comment['body'])
-                if not pd.isna(readability_score):
-                    total_readability_score += readability_score
-                    total_readable_comments_count += 1
-    
-    total_authors = len(authors_set)
-    
-    return {
-        "comment_has_author_references_proportion": comments_referencing_other_authors_count / total_comments if total_comments else pd.NA,
-        "vote_score_mean": total_vote_score / total_comments if total_comments else pd.NA,
-        "comments_per_author": total_comments / total_authors if total_authors else pd.NA,
-        "comment_length_mean": total_word_count / total_comments if total_comments else pd.NA,
-        "comment_has_links_proportion": comments_with_links_count / total_comments if total_comments else pd.NA,
-        "misspelled_words_proportion": misspellings_count / total_word_count if total_word_count else pd.NA,
-        "readability_mean": total_readability_score / total_readable_comments_count if total_readable_comments_count else pd.NA,
-        "total_word_count": total_word_count,
-        "total_comments": total_comments,
-        "total_coments_readability_scorable": total_readable_comments_count
-    }
-
-# Keep individual processing as fallback
+        # Score readability, looking each body up in the cache first if one is given
+        for readability_score in get_readability_scores(bodies, readability_backend, readability_cache):
+            if not pd.isna(readability_score):
+                self.total_readability_score += readability_score
+                self.total_readable_comments_count += 1
+        return self
+
+    def subfeatures(self):
+        """The credibility subfeatures of the comments added so far"""
+        total_comments = self.total_comments
+        total_word_count = self.total_word_count
+        total_authors = len(self.authors_set)
+        
+        return {
+            "comment_has_author_references_proportion": self.comments_referencing_other_authors_count / total_comments if total_comments else pd.NA,
+            "vote_score_mean": self.total_vote_score / total_comments if total_comments else pd.NA,
+            "comments_per_author": total_comments / total_authors if total_authors else pd.NA,
+            "comment_length_mean": total_word_count / total_comments if total_comments else pd.NA,
+            "comment_has_links_proportion": self.comments_with_links_count / total_comments if total_comments else pd.NA,
+            "misspelled_words_proportion": self.misspellings_count / total_word_count if total_word_count else pd.NA,
+            "readability_mean": self.total_readability_score / self.total_readable_comments_count if self.total_readable_comments_count else pd.NA,
+            "total_word_count": total_word_count,
+            "total_comments": total_comments,
+            "total_coments_readability_scorable": self.total_readable_comments_count
+        }
+
+def check_readability_backend(readability_backend):
+    if not isinstance(readability_backend, ReadabilityBackend) and readability_backend not in READABILITY_BACKENDS:
+        raise ValueError(f"Unknown readability backend '{readability_backend}', expected one of {READABILITY_BACKENDS} or a ReadabilityBackend")
+
+def get_credibility_subfeatures(comment_forest, valid_words=None, readability_backend='llm', readability_cache=None):
+    """Credibility subfeatures of a comment forest JSON (or of an already flattened thread)
+
+    valid_words (a set of words or a spelling.Vocabulary) defaults to VALID_WORDS.
+
+    readability_backend picks how readability_mean is scored: 'llm' asks gpt-4-turbo
+    for every comment through the batch API, 'llm-async' sends concurrent rate-limited
+    requests (async_readability.py), 'local' uses the offline Flesch reading ease in readability.py,
+    and a ReadabilityBackend instance (see readability_backends.py) scores all comments
+    with its score_many, e.g. a cached backend or one pointed at another endpoint.
+    readability_cache (a ReadabilityCache or the path of one) is consulted before scoring,
+    so repeated bodies are only sent for scoring once across threads and runs.
+    """
+    check_readability_backend(readability_backend)
+    totals = CredibilityTotals().add(flatten_comments(comment_forest), valid_words, readability_backend, readability_cache)
+    return totals.subfeatures()
+
+# Sequential single-comment scoring (the fallback is now async_readability)
 def get_comment_readability_individual(comment_body):
     """Fallback individual processing if batch fails"""
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4-turbo",
             messages=[
                 {"role": "system", "content": "You are a readability expert who can only respond in numbers."},
@@ -392,9 +541,12 @@ def get_comment_readability_individual(comment_body):
         return pd.NA
     
 
-def get_credibility_score(comment_forest): 
+def get_credibility_score(comment_forest, readability_backend='llm', readability_cache=None): 
     """Get combined credibility score."""
-    result_dict = get_credibility_subfeatures(comment_forest)
-    investment_score = result_dict.get("comment_length_mean") + result_dict.get("comment_has_links_proportion") - result_dict.get("misspelled_words_proportion") + result_dict.get("readability_mean")
-    reputation_score = result_dict.get("comment_has_author_references_proportion") + result_dict.get("vote_score_mean")
-    return investment_score + reputation_score
\ No newline at end of file
+    result_dict = get_credibility_subfeatures(comment_forest, readability_backend=readability_backend,
+                                              readability_cache=readability_cache)
+    return combine_credibility_subfeatures(result_dict)
+
+def combine_credibility_subfeatures(result_dict):
+    """Credibility score from the subfeatures of get_credibility_subfeatures"""
+    return sum(weight * result_dict.get(name) for name, weight in CREDIBILITY_WEIGHTS.items())
\ No newline at end of file
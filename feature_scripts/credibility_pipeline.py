@@ -0,0 +1,189 @@
+"""
+Two-phase credibility scoring over a directory of scraped thread JSONs.
+
+Credibility combines subfeatures that live on very different scales (mean
+comment length in words, proportions, mean vote score, readability out of 100),
+so each subfeature is standardised against the whole corpus before they are
+summed. Phase one computes get_credibility_subfeatures for every thread in
+parallel (batch_scoring) and writes them to a subfeature table, accumulating
+running mean/variance per subfeature as rows arrive. Phase two streams the
+stored table once more and writes the normalised credibility score of each
+thread, without redoing any text processing.
+
+Usage:
+    python credibility_pipeline.py ../scraping/representative_subreddits_for_varied_percentiles \
+        --subfeatures subfeatures.csv --output credibility.csv --workers 8
+"""
+from typing import List, Dict, Any, Optional, Iterator, Union
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .batch_scoring import mass_calculate_feature_scores
+    from .credibility import CREDIBILITY_WEIGHTS
+    from .normalization import make_reducer
+    from .score_tables import META_COLUMN_TYPES, open_score_writer
+else:
+    from batch_scoring import mass_calculate_feature_scores
+    from credibility import CREDIBILITY_WEIGHTS
+    from normalization import make_reducer
+    from score_tables import META_COLUMN_TYPES, open_score_writer
+
+
+def _as_float(value: Any) -> float:
+    """ Subfeature value as a float, NaN for None, pd.NA and other missing markers. """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class CredibilityNormalizer:
+    """
+    Per-subfeature reducers (running moments by default) and the normalised credibility score
+
+    Normalizers filled from different parts of a corpus can be merged.
+    """
+
+    def __init__(self, method: str = 'zscore'):
+        self.method = method
+        self.reducers = {name: make_reducer(method) for name in CREDIBILITY_WEIGHTS}
+
+    def update(self, rows: Union[Dict[str, Any], pd.DataFrame]) -> 'CredibilityNormalizer':
+        """
+        Add the subfeatures of one row (dict) or of a DataFrame of rows
+        """
+        for name, reducer in self.reducers.items():
+            if isinstance(rows, pd.DataFrame):
+                reducer.update(pd.to_numeric(rows[name], errors='coerce').to_numpy(dtype=np.float64))
+            else:
+                reducer.update([_as_float(rows.get(name))])
+        return self
+
+    def merge(self, other: 'CredibilityNormalizer') -> 'CredibilityNormalizer':
+        for name, reducer in self.reducers.items():
+            reducer.merge(other.reducers[name])
+        return self
+
+    def score(self, rows: pd.DataFrame) -> np.ndarray:
+        """
+        Normalised credibility of each row: the signed sum of its normalised subfeatures
+
+        A missing subfeature (e.g. readability when no comment could be scored)
+        contributes 0; a row with no subfeatures at all scores NaN.
+        """
+        total = np.zeros(len(rows))
+        present = np.zeros(len(rows), dtype=bool)
+        for name, weight in CREDIBILITY_WEIGHTS.items():
+            normalized = self.reducers[name].normalize(
+                pd.to_numeric(rows[name], errors='coerce').to_numpy(dtype=np.float64))
+            present |= ~np.isnan(normalized)
+            total += weight * np.nan_to_num(normalized, nan=0.0)
+        return np.where(present, total, np.nan)
+
+
+def _read_table_chunks(path: str, output_format: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    if output_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunksize)
+        return
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    partitioning = ds.partitioning(pa.schema([('subreddit', pa.string()), ('download_date', pa.string())]),
+                                   flavor='hive')
+    for batch in ds.dataset(path, format='parquet', partitioning=partitioning).to_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def normalize_credibility_table(subfeatures_path: str, target_path: str, output_format: str = 'csv',
+                                normalizer: Optional[CredibilityNormalizer] = None, method: str = 'zscore',
+                                chunksize: int = 10_000) -> str:
+    """
+    Second phase: write the normalised credibility of every row of a stored subfeature table
+
+    Args:
+        subfeatures_path (str): Table written by batch scoring with the credibility_subfeatures feature
+        target_path (str): Output CSV file or Parquet directory (meta columns + credibility)
+        output_format (str): 'csv' or 'parquet', for both tables
+        normalizer (Optional[CredibilityNormalizer]): Statistics gathered during the first phase;
+                                                      if None they are gathered from the table first
+        method (str): Normalisation method when the statistics are gathered here
+        chunksize (int): Rows read at a time
+
+    Returns:
+        str: Path of the written table
+    """
+    if normalizer is None:
+        normalizer = CredibilityNormalizer(method)
+        for chunk in _read_table_chunks(subfeatures_path, output_format, chunksize):
+            normalizer.update(chunk)
+
+    writer = open_score_writer(target_path, ['credibility'], output_format)
+    try:
+        for chunk in _read_table_chunks(subfeatures_path, output_format, chunksize):
+            chunk = chunk.assign(credibility=normalizer.score(chunk))
+            for row in chunk[list(META_COLUMN_TYPES) + ['credibility']].to_dict('records'):
+                writer.write(row)
+    finally:
+        writer.close()
+    return target_path
+
+
+def mass_calculate_credibility_scores(directory_path: str, subfeatures_path: str, target_path: str,
+                                      workers: Optional[int] = None, method: str = 'zscore',
+                                      output_format: str = 'csv', chunksize: int = 1,
+                                      readability_backend: str = 'llm', readability_cache: Optional[str] = None) -> str:
+    """
+    Run both phases: parallel subfeatures with streaming statistics, then normalised scores
+
+    Args:
+        directory_path (str): Directory of thread JSONs, or a corpus store
+        subfeatures_path (str): Where the first phase writes the subfeature table
+        target_path (str): Where the second phase writes the credibility scores
+        workers (Optional[int]): Worker processes for the first phase
+        method (str): 'zscore' (running moments), 'minmax' or 'quantile'
+        output_format (str): 'csv' or 'parquet'
+        chunksize (int): Files handed to a worker at a time
+        readability_backend (str): 'llm', 'llm-async' or 'local' (see credibility.get_credibility_subfeatures)
+        readability_cache (Optional[str]): SQLite readability cache consulted before scoring readability
+
+    Returns:
+        str: Path of the credibility table
+    """
+    normalizer = CredibilityNormalizer(method)
+    mass_calculate_feature_scores(directory_path, subfeatures_path, ['credibility_subfeatures'],
+                                  workers=workers, chunksize=chunksize, output_format=output_format,
+                                  on_row=normalizer.update, readability_backend=readability_backend,
+                                  readability_cache=readability_cache)
+    return normalize_credibility_table(subfeatures_path, target_path, output_format, normalizer)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Score normalised credibility for every thread JSON in a directory.")
+    parser.add_argument('directory', nargs='?', help="Directory laid out as <subreddit>/<date_dir>/<post_id>.json, or a corpus store")
+    parser.add_argument('--subfeatures', required=True, help="Subfeature table written by the first phase (read-only with --from-table)")
+    parser.add_argument('--output', required=True, help="Credibility table to write")
+    parser.add_argument('--format', default='csv', choices=('csv', 'parquet'))
+    parser.add_argument('--method', default='zscore', choices=('zscore', 'minmax', 'quantile'))
+    parser.add_argument('--readability-backend', default='llm', choices=('llm', 'llm-async', 'local'))
+    parser.add_argument('--readability-cache', default=None, help="SQLite file caching readability scores across threads and runs")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--from-table', action='store_true', help="Skip the first phase and normalise an existing subfeature table")
+    args = parser.parse_args(argv)
+
+    if args.from_table:
+        target_path = normalize_credibility_table(args.subfeatures, args.output, args.format, method=args.method)
+    else:
+        if args.directory is None:
+            parser.error("directory is required unless --from-table is given")
+        target_path = mass_calculate_credibility_scores(args.directory, args.subfeatures, args.output,
+                                                        args.workers, args.method, args.format,
+                                                        readability_backend=args.readability_backend,
+                                                        readability_cache=args.readability_cache)
+    print(f'Wrote {target_path}')
+
+
+if __name__ == '__main__':
+    main()
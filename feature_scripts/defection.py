@@ -1,6 +1,12 @@
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import pandas as pd
 
+if __package__:
+    from .comment_thread import as_flat_thread
+    from .sentiment import get_thread_sentiments
+else:
+    from comment_thread import as_flat_thread
+    from sentiment import get_thread_sentiments
+
 def defection_list(json_data, neutral_threshold=0.3):
     ''' 
     For each branch, returns the depth of the first defection point,
@@ -9,37 +15,44 @@ def defection_list(json_data, neutral_threshold=0.3):
     inherit the parent comment sentiment.
     '''
 
-    sid = SentimentIntensityAnalyzer()
+    thread = as_flat_thread(json_data)
+
+    # The post is the root of every branch (depth 0), so comments sit one level deeper.
+    root_sentiment, raw_sentiments = get_thread_sentiments(thread)
+    raw_sentiments = raw_sentiments.tolist()
+    if len(thread) == 0:
+        return [1]
+
+    child_counts = thread.child_counts
+    sentiments = [None] * len(thread)  # None marks comments below a defection (not visited)
+    defection_lengths = []
+
+    # Parents precede their replies in the flattened order, so one forward pass
+    # visits the tree exactly like the depth-first recursion did.
+    for i, parent in enumerate(thread.parents):
+        parent_sentiment = root_sentiment if parent < 0 else sentiments[parent]
+        if parent_sentiment is None:
+            continue
+        depth = int(thread.depths[i]) + 1
+
+        raw_sentiment = raw_sentiments[i]
 
-    def process_node(node, parent_sentiment, depth):
-        comment_body = node['body']
-        raw_sentiment = sid.polarity_scores(comment_body)['compound']
-    
         # Inherit parent's sentiment if this comment is neutral.
         if abs(raw_sentiment) < neutral_threshold:
             sentiment = parent_sentiment
         else:
             sentiment = raw_sentiment
-        
+
         # Check for defection (sentiment flip relative to parent's sentiment).
         if sentiment * parent_sentiment < 0:
-            return [depth]
-        
-        # If this node is a leaf, return the depth + 1 (No defection occured, so we return branch length).
-        if not node['replies']:
-            return [depth + 1]
-        
-        defection_lengths = []
-        for child in node['replies']:
-            defection_lengths.extend(process_node(child, sentiment, depth + 1))
-        return defection_lengths
-    
-    # Adjust keys so they match the expected names for recursion.
-    json_data['body'] = json_data['selftext']
-    json_data['replies'] = json_data['comments']
-    
-    root_sentiment = sid.polarity_scores(json_data['body'])['compound']
-    defection_lengths = process_node(json_data, root_sentiment, 0)
+            defection_lengths.append(depth)
+            continue
+
+        # If this node is a leaf, record the depth + 1 (No defection occured, so we return branch length).
+        if not child_counts[i]:
+            defection_lengths.append(depth + 1)
+        sentiments[i] = sentiment
+
     return defection_lengths
 
 def get_defection_score_legacy(comment_forest):
@@ -53,6 +66,35 @@ def get_defection_score_legacy(comment_forest):
 
 # like the legacy version but normalized by branch lengths``
 
+def propagate_defection(raw_sentiment, parent_sentiment, defection_depth, depth, neutral_threshold=0.3):
+    """
+    Sentiment of a comment at depth replying to a comment with parent_sentiment, and the
+    depth of the first defection on its branch (defection_depth is its parent's, None if none yet).
+    """
+    # Inherit parent's sentiment if the comment is neutral.
+    if abs(raw_sentiment) < neutral_threshold:
+        sentiment = parent_sentiment
+    else:
+        sentiment = raw_sentiment
+
+    # If we haven't yet seen a defection on this branch and
+    # the sentiment flips relative to the parent's sentiment,
+    # record the defection at the current depth.
+    if defection_depth is None and sentiment * parent_sentiment < 0:
+        defection_depth = depth
+    return sentiment, defection_depth
+
+def branch_score(defection_depth, depth):
+    """
+    Score of the branch ending at a leaf at depth.
+    The branch length is defined as (depth + 1).
+    If a defection occurred, normalize its depth by the branch length.
+    Otherwise, return 1.
+    """
+    if defection_depth is None:
+        return 1.0
+    return defection_depth / (depth + 1)
+
 def get_defection_score(comment_forest, neutral_threshold=0.3):
     
     """
@@ -61,51 +103,39 @@ def get_defection_score(comment_forest, neutral_threshold=0.3):
     early defection gets a score close to 0. The function returns the average 
     score over all branches.
     """
-    from nltk.sentiment.vader import SentimentIntensityAnalyzer
-    sid = SentimentIntensityAnalyzer()
-
-    # Adjust keys to match expected names for recursion.
-    comment_forest['body'] = comment_forest['selftext']
-    comment_forest['replies'] = comment_forest['comments']
-
-    def process_branch(node, parent_sentiment, depth, defection_depth):
-        # Compute the sentiment for this node.
-        comment_body = node['body']
-        raw_sentiment = sid.polarity_scores(comment_body)['compound']
-        
-        # Inherit parent's sentiment if the comment is neutral.
-        if abs(raw_sentiment) < neutral_threshold:
-            sentiment = parent_sentiment
+    thread = as_flat_thread(comment_forest)
+
+    # Compute the root sentiment (and, in the same pass, every comment's).
+    root_sentiment, raw_sentiments = get_thread_sentiments(thread)
+    raw_sentiments = raw_sentiments.tolist()
+    # A post without replies is a single branch with no defection.
+    if len(thread) == 0:
+        return 1.0
+
+    child_counts = thread.child_counts
+    sentiments = [0.0] * len(thread)
+    defection_depths = [None] * len(thread)
+    branch_scores = []
+
+    # Parents precede their replies in the flattened order, so one forward pass
+    # visits the tree exactly like the depth-first recursion did.
+    for i, parent in enumerate(thread.parents):
+        if parent < 0:
+            parent_sentiment, defection_depth = root_sentiment, None
         else:
-            sentiment = raw_sentiment
+            parent_sentiment, defection_depth = sentiments[parent], defection_depths[parent]
+        # The post is at depth 0, so comments sit one level deeper.
+        depth = int(thread.depths[i]) + 1
+
+        sentiment, defection_depth = propagate_defection(raw_sentiments[i], parent_sentiment, defection_depth,
+                                                         depth, neutral_threshold)
+        sentiments[i] = sentiment
+        defection_depths[i] = defection_depth
+
+        # If this node is a leaf, score the branch ending at it.
+        if not child_counts[i]:
+            branch_scores.append(branch_score(defection_depth, depth))
 
-        # If we haven't yet seen a defection on this branch and
-        # the sentiment flips relative to the parent's sentiment,
-        # record the defection at the current depth.
-        if defection_depth is None and sentiment * parent_sentiment < 0:
-            defection_depth = depth
-
-        # If this node is a leaf, compute the branch length.
-        # The branch length is defined as (depth + 1).
-        # If a defection occurred, normalize its depth by the branch length.
-        # Otherwise, return 1.
-        if not node['replies']:
-            branch_length = depth + 1
-            if defection_depth is None:
-                return [1.0]
-            else:
-                return [defection_depth / branch_length]
-
-        # Otherwise, continue recursively for each reply.
-        values = []
-        for child in node['replies']:
-            values.extend(process_branch(child, sentiment, depth + 1, defection_depth))
-        return values
-
-    # Compute the root sentiment.
-    root_sentiment = sid.polarity_scores(comment_forest['body'])['compound']
-    # Process the tree starting from the root (with no defection recorded yet).
-    branch_scores = process_branch(comment_forest, root_sentiment, 0, None)
     # Return the average normalized defection score.
-    
-    return sum(branch_scores) / len(branch_scores) if branch_scores else None
\ No newline at end of file
+
+    return sum(branch_scores) / len(branch_scores) if branch_scores else None
@@ -0,0 +1,212 @@
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import json
+import os
+import numpy as np
+
+STORE_VERSION = 1
+KEY_SIZE = 20  # bytes of a SHA-1 digest
+
+
+def embedding_key(model_name: str, text: str) -> bytes:
+    """
+    Content address of an embedding: hash of the model name and the comment body
+
+    Args:
+        model_name (str): Sentence transformer model name
+        text (str): Comment text
+
+    Returns:
+        bytes: 20-byte SHA-1 digest
+    """
+    return hashlib.sha1(f'{model_name}\0{text}'.encode('utf-8', 'surrogatepass')).digest()
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed store of float32 embeddings
+
+    Vectors live in a memory-mapped array (vectors.npy) with one row per slot.
+    The index is kept alongside it as two arrays, the key of each slot
+    (keys.npy, 20 raw bytes per row) and the tick at which it was last used
+    (last_used.npy), and is rebuilt into a dict when the store is opened. When
+    the store is full the least recently used entries are evicted to make room.
+
+    The store is meant for a single writer process; call flush() (or use it as
+    a context manager) to persist the index.
+    """
+
+    def __init__(self, directory: str, capacity: int = 500_000, evict_fraction: float = 0.1):
+        """
+        Open (or create) an embedding store
+
+        Args:
+            directory (str): Directory holding the store files
+            capacity (int): Maximum number of embeddings kept on disk
+            evict_fraction (float): Share of the capacity freed at once when the store is full
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.keys = np.zeros((capacity, KEY_SIZE), dtype=np.uint8)
+        self.last_used = np.zeros(capacity, dtype=np.int64)  # 0 marks a free slot
+        self.clock = 0
+        self.index: Dict[bytes, int] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        meta_path = self._path('meta.json')
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported embedding store version {meta.get('version')} in {self.directory}")
+        if meta['capacity'] != self.capacity:
+            # Capacity is fixed by the files on disk
+            self.capacity = meta['capacity']
+        self.dim = meta['dim']
+        self.clock = meta['clock']
+        self.vectors = np.load(self._path('vectors.npy'), mmap_mode='r+')
+        self.keys = np.load(self._path('keys.npy'))
+        if self.keys.dtype.kind == 'S':
+            # Stores written as 'S20' strings: numpy strips trailing NUL bytes from their
+            # items, so read the same 20 bytes per key as raw bytes instead
+            self.keys = self.keys.view(np.uint8).reshape(len(self.keys), KEY_SIZE)
+        self.last_used = np.load(self._path('last_used.npy'))
+        self.index = {self.keys[slot].tobytes(): int(slot) for slot in np.flatnonzero(self.last_used)}
+
+    def _create_vectors(self, dim: int):
+        self.dim = dim
+        self.vectors = np.lib.format.open_memmap(self._path('vectors.npy'), mode='w+',
+                                                 dtype=np.float32, shape=(self.capacity, dim))
+
+    def get_many(self, model_name: str, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up the embeddings of many texts
+
+        Args:
+            model_name (str): Sentence transformer model name
+            texts (List[str]): Comment texts
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Embeddings (rows of misses are zero) and a
+                                           boolean mask of which texts were found
+        """
+        found = np.zeros(len(texts), dtype=bool)
+        if self.vectors is None:
+            self.misses += len(texts)
+            return np.zeros((len(texts), 0), dtype=np.float32), found
+        slots = np.full(len(texts), -1, dtype=np.int64)
+        for i, text in enumerate(texts):
+            slot = self.index.get(embedding_key(model_name, text))
+            if slot is not None:
+                slots[i] = slot
+        found = slots >= 0
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if found.any():
+            self.clock += 1
+            self.last_used[slots[found]] = self.clock
+            embeddings[found] = self.vectors[slots[found]]
+        n_hits = int(found.sum())
+        self.hits += n_hits
+        self.misses += len(texts) - n_hits
+        return embeddings, found
+
+    def put_many(self, model_name: str, texts: List[str], embeddings: np.ndarray):
+        """
+        Store the embeddings of many texts, evicting least recently used entries if full
+
+        Args:
+            model_name (str): Sentence transformer model name
+            texts (List[str]): Comment texts
+            embeddings (np.ndarray): Embedding for each text
+        """
+        if len(texts) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.vectors is None:
+            self._create_vectors(embeddings.shape[1])
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self.dim}")
+
+        # Only the newest copy of a text is kept if a batch repeats it
+        new_entries = {}
+        for text, embedding in zip(texts, embeddings):
+            key = embedding_key(model_name, text)
+            if key not in self.index:
+                new_entries[key] = embedding
+        new_entries = list(new_entries.items())[-self.capacity:]
+        if not new_entries:
+            return
+
+        free_slots = np.flatnonzero(self.last_used == 0)
+        if len(free_slots) < len(new_entries):
+            self._evict(max(len(new_entries) - len(free_slots), int(self.capacity * self.evict_fraction)))
+            free_slots = np.flatnonzero(self.last_used == 0)
+
+        self.clock += 1
+        slots = free_slots[:len(new_entries)]
+        for slot, (key, _) in zip(slots, new_entries):
+            self.index[key] = int(slot)
+            self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self.last_used[slots] = self.clock
+        self.vectors[slots] = np.stack([embedding for _, embedding in new_entries])
+
+    def _evict(self, count: int):
+        used_slots = np.flatnonzero(self.last_used)
+        count = min(count, len(used_slots))
+        oldest = used_slots[np.argsort(self.last_used[used_slots], kind='stable')[:count]]
+        for slot in oldest:
+            del self.index[self.keys[slot].tobytes()]
+        self.keys[oldest] = 0
+        self.last_used[oldest] = 0
+        self.evictions += count
+
+    def flush(self):
+        """
+        Persist the index and vectors to disk
+        """
+        if self.vectors is None:
+            return
+        self.vectors.flush()
+        np.save(self._path('keys.npy'), self.keys)
+        np.save(self._path('last_used.npy'), self.last_used)
+        with open(self._path('meta.json'), 'w') as file:
+            json.dump({'version': STORE_VERSION, 'dim': self.dim,
+                       'capacity': self.capacity, 'clock': self.clock}, file)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit-rate statistics for this session and the current fill level of the store
+
+        Returns:
+            Dict[str, Any]: hits, misses, hit_rate, evictions, size and capacity
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else float('NaN'),
+            'evictions': self.evictions,
+            'size': len(self.index),
+            'capacity': self.capacity,
+        }
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
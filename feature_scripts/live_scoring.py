@@ -0,0 +1,427 @@
+"""
+Incremental feature scores for live threads.
+
+Hot threads are re-scored every few minutes as new comments arrive. LiveThread
+keeps the state each feature's score is computed from, so that adding comments
+only processes the new ones:
+
+- onesidedness: comments per author and authors per comment count, so the Gini
+  coefficient sums over distinct counts rather than authors;
+- credibility: the running sums of credibility.CredibilityTotals (only the new
+  comments are scanned and scored for readability);
+- defection: each comment's propagated sentiment and first defection depth, and
+  the score of every branch ending at a leaf (a reply to a leaf replaces its branch);
+- resilience: the comments in pre-order as a linked list with whether each comes
+  after the first defection of its sequence, and the post-defection sums; a new
+  defection marks the comments after it up to the next already post-defection one;
+- coalition: the embeddings of the comments (each encoded once) and per-cluster
+  sums, with new comments assigned to the nearest centroid and a full reclustering
+  whenever the thread has grown by recluster_growth since the last one.
+
+Onesidedness, credibility, defection and resilience equal the from-scratch
+scores of the grown forest (up to float summation order), new replies coming
+after their existing siblings. Coalition equals get_coalition_score right after
+a reclustering and approximates it in between. Vote scores are taken as they
+were when a comment was added. coalition_sweep has no incremental form.
+"""
+from typing import List, Dict, Any, Iterable, Optional
+from collections import Counter
+import math
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .coalition import DEFAULT_MODEL_NAME, CoalitionAnalyzer, normalize, select_clustering_backend
+    from .comment_thread import FlatThread, as_flat_thread
+    from .credibility import CredibilityTotals, check_readability_backend, combine_credibility_subfeatures
+    from .defection import branch_score, propagate_defection
+    from .sentiment import SentimentMemo, compound_score, get_thread_sentiments
+else:
+    from coalition import DEFAULT_MODEL_NAME, CoalitionAnalyzer, normalize, select_clustering_backend
+    from comment_thread import FlatThread, as_flat_thread
+    from credibility import CredibilityTotals, check_readability_backend, combine_credibility_subfeatures
+    from defection import branch_score, propagate_defection
+    from sentiment import SentimentMemo, compound_score, get_thread_sentiments
+
+LIVE_FEATURES = ('coalition', 'onesidedness', 'defection', 'resilience', 'credibility', 'credibility_subfeatures')
+DEFAULT_LIVE_FEATURES = ('coalition', 'onesidedness', 'defection', 'resilience')
+
+
+class OnesidednessState:
+    """
+    Comment counts of a thread's authors, for get_onesidedness_score's Gini coefficient
+    """
+
+    def __init__(self):
+        self.counts = Counter()  # comments of each author
+        self.authors_by_count = Counter()  # number of authors with each comment count
+        self.total = 0
+
+    def add(self, authors: Iterable[Optional[str]]):
+        for author in authors:
+            count = self.counts[author]
+            if count:
+                self.authors_by_count[count] -= 1
+                if not self.authors_by_count[count]:
+                    del self.authors_by_count[count]
+            self.counts[author] = count + 1
+            self.authors_by_count[count + 1] += 1
+            self.total += 1
+
+    def score(self):
+        n = len(self.counts)
+        if n <= 1:
+            return pd.NA
+        # The m authors with count x hold sorted ranks rank+1..rank+m, which contribute x * sum(2i - n - 1)
+        numerator = 0
+        rank = 0
+        for count in sorted(self.authors_by_count):
+            m = self.authors_by_count[count]
+            numerator += count * m * (2 * rank + m - n)
+            rank += m
+        denominator = n * self.total
+        return numerator / denominator if denominator != 0 else pd.NA
+
+
+class DefectionState:
+    """
+    Propagated sentiment and first defection depth of every comment, and the score of every branch
+    """
+
+    def __init__(self, neutral_threshold: float = 0.3):
+        self.neutral_threshold = neutral_threshold
+        self.sentiments: List[float] = []
+        self.defection_depths: List[Optional[int]] = []
+        self.branch_scores: Dict[int, float] = {}  # leaf index -> score of the branch ending there
+
+    def add(self, thread: FlatThread, indices: np.ndarray):
+        root_sentiment, raw_sentiments = get_thread_sentiments(thread)
+        for i in indices.tolist():
+            parent = int(thread.parents[i])
+            if parent < 0:
+                parent_sentiment, defection_depth = root_sentiment, None
+            else:
+                parent_sentiment, defection_depth = self.sentiments[parent], self.defection_depths[parent]
+                # The parent is no longer a leaf: its branch now ends at this comment
+                self.branch_scores.pop(parent, None)
+            depth = int(thread.depths[i]) + 1
+            sentiment, defection_depth = propagate_defection(raw_sentiments[i], parent_sentiment, defection_depth,
+                                                             depth, self.neutral_threshold)
+            self.sentiments.append(sentiment)
+            self.defection_depths.append(defection_depth)
+            self.branch_scores[i] = branch_score(defection_depth, depth)
+
+    def score(self):
+        if not self.branch_scores:
+            return 1.0
+        return sum(self.branch_scores.values()) / len(self.branch_scores)
+
+
+class ResilienceState:
+    """
+    Post-defection sentiment sums of a thread, as get_resilience_score computes them
+
+    With a post (selftext), the whole thread in pre-order is one sequence replying
+    to the post; without one, each top-level branch is a sequence replying to an
+    empty post. A comment with a body defects when the post is not negative and
+    its sentiment is below -neutral_threshold; it and every comment after it in
+    its sequence are post-defection.
+    """
+
+    def __init__(self, thread: FlatThread, neutral_threshold: float = 0.3, memo: Optional[SentimentMemo] = None):
+        self.neutral_threshold = neutral_threshold
+        self.whole_thread = thread.selftext is not None
+        if self.whole_thread:
+            self.root_sentiment, _ = get_thread_sentiments(thread, memo)
+        else:
+            self.root_sentiment = compound_score("", memo)
+        # Comments in pre-order as a linked list, and each comment's last reply (-1 for none)
+        self._next: List[int] = []
+        self._last_reply: List[int] = []
+        self._last = -1
+        self._post_defection: List[bool] = []
+        self._sequence: List[int] = []
+        self._values: List[float] = []
+        self.sums: Dict[int, List[float]] = {}  # sequence -> [sum, count] of post-defection sentiments
+
+    def add(self, thread: FlatThread, indices: np.ndarray):
+        _, raw_sentiments = get_thread_sentiments(thread)
+        threshold = self.neutral_threshold
+        for i in indices.tolist():
+            parent = int(thread.parents[i])
+            if parent >= 0:
+                sequence = self._sequence[parent]
+                # After the parent's last descendant
+                previous = parent
+                while self._last_reply[previous] >= 0:
+                    previous = self._last_reply[previous]
+                self._last_reply[parent] = i
+            elif self.whole_thread:
+                sequence, previous = 0, self._last
+            else:
+                sequence, previous = i, -1
+            following = self._next[previous] if previous >= 0 else -1
+            self.sums.setdefault(sequence, [0.0, 0])
+
+            raw_sentiment = raw_sentiments[i]
+            has_body = thread.bodies[i] is not None
+            self._values.append(raw_sentiment if abs(raw_sentiment) >= threshold else self.root_sentiment)
+            self._sequence.append(sequence)
+            self._next.append(following)
+            self._last_reply.append(-1)
+            if previous >= 0:
+                self._next[previous] = i
+            if following < 0:
+                self._last = i
+
+            if previous >= 0 and self._post_defection[previous]:
+                post_defection = True
+            elif has_body and self.root_sentiment >= 0 and raw_sentiment < -threshold:
+                post_defection = True
+                # The first defection of its sequence so far: the comments after it become post-defection too
+                comment = following
+                while comment >= 0 and not self._post_defection[comment]:
+                    self._post_defection[comment] = True
+                    if thread.bodies[comment] is not None:
+                        self._add_value(sequence, comment)
+                    comment = self._next[comment]
+            else:
+                post_defection = False
+            self._post_defection.append(post_defection)
+            if post_defection and has_body:
+                self._add_value(sequence, i)
+
+    def _add_value(self, sequence: int, comment: int):
+        sums = self.sums[sequence]
+        sums[0] += self._values[comment]
+        sums[1] += 1
+
+    def score(self):
+        resilience_scores = [total / count if count else float("NaN") for total, count in self.sums.values()]
+        if self.whole_thread:
+            return resilience_scores[0] if resilience_scores else float("NaN")
+        valid_scores = [score for score in resilience_scores if not pd.isna(score)]
+        resilience_score = sum(valid_scores) / len(valid_scores) if valid_scores else float("NaN")
+        if resilience_score <= 0.1 and resilience_score >= -0.1:
+            return float("NaN")
+        return resilience_score
+
+
+class CoalitionState:
+    """
+    Embeddings and coalitions of a thread's comments, for get_coalition_score
+
+    Every comment is embedded once, when it is added. The comments are clustered
+    (in pre-order, as get_coalition_score does) when the thread first has enough of
+    them and again each time it has grown by recluster_growth; in between, new
+    comments join the coalition with the nearest centroid. Per coalition the sum
+    of embeddings, of unit embeddings and of their outer products are kept, which
+    give the mean and spread of the comments' coalition-building scores
+    (inter- minus intra-coalition similarity) without revisiting the comments.
+    """
+
+    def __init__(self, n_clusters: int = 3, model_name: Optional[str] = None, device: Optional[str] = None,
+                 embedding_cache=None, clustering: str = 'auto', recluster_growth: float = 1.5):
+        if recluster_growth < 1:
+            raise ValueError(f"recluster_growth must be at least 1, got {recluster_growth}")
+        self.analyzer = CoalitionAnalyzer(model_name or DEFAULT_MODEL_NAME, device, embedding_cache, clustering)
+        self.n_clusters = n_clusters
+        self.recluster_growth = recluster_growth
+        self.comments: List[int] = []  # thread index of each embedded comment (those with a body)
+        self._embeddings: List[np.ndarray] = []
+        self.unit_sum = None
+        self.labels: Optional[List[int]] = None
+        self.clustered_size = 0
+        self.backend = None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        if len(self._embeddings) > 1:
+            self._embeddings = [np.concatenate(self._embeddings)]
+        return self._embeddings[0] if self._embeddings else np.zeros((0, 0), dtype=np.float32)
+
+    def add(self, thread: FlatThread, indices: np.ndarray):
+        new = [i for i in indices.tolist() if thread.bodies[i] is not None]
+        if not new:
+            return
+        embeddings = self.analyzer.get_embeddings([thread.bodies[i] for i in new])
+        units = normalize(embeddings).astype(np.float64)
+        self.unit_sum = units.sum(axis=0) if self.unit_sum is None else self.unit_sum + units.sum(axis=0)
+        self.comments.extend(new)
+        self._embeddings.append(embeddings)
+        if self.labels is not None:
+            for embedding, unit in zip(embeddings.astype(np.float64), units):
+                label = self._nearest_coalition(embedding, unit)
+                self.labels.append(label)
+                self._add_to_coalition(label, embedding, unit)
+
+    def _nearest_coalition(self, embedding: np.ndarray, unit: np.ndarray) -> int:
+        present = np.flatnonzero(self.counts)
+        if self.backend == 'spherical':
+            similarities = self._unit_centroids()[present] @ unit
+            return int(present[similarities.argmax()])
+        centroids = self.raw_sums[present] / self.counts[present, None]
+        return int(present[((centroids - embedding) ** 2).sum(axis=1).argmin()])
+
+    def _add_to_coalition(self, label: int, embedding: np.ndarray, unit: np.ndarray):
+        self.raw_sums[label] += embedding
+        self.unit_sums[label] += unit
+        self.second_moments[label] += np.outer(unit, unit)
+        self.counts[label] += 1
+
+    def _unit_centroids(self) -> np.ndarray:
+        return normalize(self.raw_sums)
+
+    def recluster(self, thread: FlatThread):
+        """
+        Cluster all comments from scratch, in the thread's pre-order
+        """
+        rows = {comment: row for row, comment in enumerate(self.comments)}
+        order = np.array([rows[i] for i in thread.preorder().tolist() if i in rows], dtype=np.int64)
+        embeddings = self.embeddings
+        n_clusters = min(self.n_clusters, len(order))
+        labels = np.empty(len(order), dtype=np.int64)
+        labels[order] = self.analyzer.cluster_comments(embeddings[order], n_clusters)
+        self.backend = select_clustering_backend(len(order), self.analyzer.clustering)
+
+        size = int(labels.max()) + 1
+        vectors = embeddings.astype(np.float64)
+        units = normalize(embeddings).astype(np.float64)
+        membership = (labels == np.arange(size)[:, None]).astype(np.float64)
+        self.raw_sums = membership @ vectors
+        self.unit_sums = membership @ units
+        self.second_moments = np.stack([units[labels == label].T @ units[labels == label] for label in range(size)])
+        self.counts = np.bincount(labels, minlength=size)
+        self.labels = labels.tolist()
+        self.clustered_size = len(order)
+
+    def score(self, thread: FlatThread) -> float:
+        n = len(self.comments)
+        if n < 10:
+            return float("NaN")
+        # If similarity is very high (above 0.8), force a low diversity score
+        if float(self.unit_sum @ self.unit_sum) / (n * n) > 0.8:
+            return 0.0
+        if self.labels is None or n >= self.clustered_size * self.recluster_growth:
+            self.recluster(thread)
+
+        # Comment u of coalition j scores u.(C - 2c_j), with c_j its unit centroid and C the sum of all of them
+        present = np.flatnonzero(self.counts)
+        if len(present) < 2:
+            return 0.0
+        centroids = self._unit_centroids()[present]
+        directions = centroids.sum(axis=0) - 2 * centroids
+        mean = float(np.einsum('jd,jd->', self.unit_sums[present], directions)) / n
+        mean_square = float(np.einsum('jd,jde,je->', directions, self.second_moments[present], directions)) / n
+        if math.sqrt(max(mean_square - mean * mean, 0.0)) < 0.05:
+            return 0.0
+        return mean
+
+
+class LiveThread:
+    """
+    A thread whose feature scores are updated as comments are added to it
+
+    Args:
+        comment_forest (Union[FlatThread, Dict, List[Dict]]): The thread so far; a FlatThread is
+                                                              extended in place
+        features (Iterable[str]): Features to keep up to date, a subset of LIVE_FEATURES
+        neutral_threshold (float): Neutral sentiment threshold of defection and resilience
+        readability_backend: Readability backend of the credibility features ('llm', 'llm-async',
+                             'local' or a ReadabilityBackend)
+        readability_cache: Readability cache (or the path of one) the credibility features consult
+        valid_words: Vocabulary for misspellings (default: credibility's VALID_WORDS)
+        n_clusters (int): Number of coalitions
+        model_name (Optional[str]): Sentence transformer model name (default: coalition.DEFAULT_MODEL_NAME)
+        device (Optional[str]): Torch device; None lets the library choose
+        embedding_cache (Optional[EmbeddingStore]): On-disk store consulted before encoding
+        clustering (str): Clustering backend, 'auto' or one of coalition.CLUSTERING_BACKENDS
+        recluster_growth (float): Growth factor of the number of comments since the last
+                                  clustering at which the coalitions are clustered again
+                                  (1 reclusters on every score)
+    """
+
+    def __init__(self, comment_forest, features: Iterable[str] = DEFAULT_LIVE_FEATURES,
+                 neutral_threshold: float = 0.3, readability_backend='llm', readability_cache=None,
+                 valid_words=None, n_clusters: int = 3, model_name: Optional[str] = None,
+                 device: Optional[str] = None, embedding_cache=None, clustering: str = 'auto',
+                 recluster_growth: float = 1.5):
+        self.features = tuple(features)
+        for feature in self.features:
+            if feature not in LIVE_FEATURES:
+                raise ValueError(f"Unknown live feature '{feature}', expected one of {LIVE_FEATURES}")
+        self.thread = as_flat_thread(comment_forest)
+        self.memo = SentimentMemo()
+        get_thread_sentiments(self.thread, self.memo)
+
+        self.onesidedness = OnesidednessState() if 'onesidedness' in self.features else None
+        self.defection = DefectionState(neutral_threshold) if 'defection' in self.features else None
+        self.resilience = (ResilienceState(self.thread, neutral_threshold, self.memo)
+                           if 'resilience' in self.features else None)
+        self.credibility = None
+        if 'credibility' in self.features or 'credibility_subfeatures' in self.features:
+            check_readability_backend(readability_backend)
+            self.credibility = CredibilityTotals()
+            self.credibility_options = {'valid_words': valid_words, 'readability_backend': readability_backend,
+                                        'readability_cache': readability_cache}
+        self.coalition = (CoalitionState(n_clusters, model_name, device, embedding_cache, clustering, recluster_growth)
+                          if 'coalition' in self.features else None)
+
+        self._update(np.arange(len(self.thread)))
+
+    def __len__(self) -> int:
+        return len(self.thread)
+
+    def add_comments(self, comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Add newly arrived comments and return the updated scores
+
+        Args:
+            comments (List[Dict]): New comments, as for FlatThread.append_comments: 'body', 'author',
+                                   'score' and 'parent', the index of the comment replied to
+                                   (-1 or absent for a top-level comment)
+
+        Returns:
+            Dict[str, Any]: The scores, as scores() returns them
+        """
+        self._update(self.thread.append_comments(comments))
+        return self.scores()
+
+    def _update(self, indices: np.ndarray):
+        thread = self.thread
+        get_thread_sentiments(thread, self.memo)
+        if self.onesidedness is not None:
+            self.onesidedness.add(thread.authors[i] for i in indices.tolist())
+        if self.defection is not None:
+            self.defection.add(thread, indices)
+        if self.resilience is not None:
+            self.resilience.add(thread, indices)
+        if self.credibility is not None:
+            self.credibility.add([{'author': thread.authors[i], 'body': thread.bodies[i], 'score': int(thread.scores[i])}
+                                  for i in indices.tolist()], **self.credibility_options)
+        if self.coalition is not None:
+            self.coalition.add(thread, indices)
+
+    def scores(self) -> Dict[str, Any]:
+        """
+        Score of each feature, shaped like batch_scoring.calculate_feature_scores
+
+        Returns:
+            Dict[str, Any]: Score for each feature; credibility_subfeatures contributes one entry per subfeature
+        """
+        scores = {}
+        for feature in self.features:
+            if feature == 'coalition':
+                scores[feature] = self.coalition.score(self.thread)
+            elif feature == 'onesidedness':
+                scores[feature] = self.onesidedness.score()
+            elif feature == 'defection':
+                scores[feature] = self.defection.score()
+            elif feature == 'resilience':
+                scores[feature] = self.resilience.score()
+            elif feature == 'credibility':
+                scores[feature] = combine_credibility_subfeatures(self.credibility.subfeatures())
+            else:
+                scores.update(self.credibility.subfeatures())
+        return scores
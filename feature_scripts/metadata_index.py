@@ -0,0 +1,128 @@
+"""
+Incremental index of the scraped thread JSONs in a directory tree.
+
+The tree is laid out as <directory>/<subreddit>/date_<%m-%d-%Y>_time_<%H-%M>/<post_id>.json.
+MetadataIndex walks it with os.scandir and yields one entry per file as soon as
+it is found. The listing of every date directory is persisted together with
+the directory's mtime, so later scans reuse the listing of date directories
+that have not changed instead of listing and stat'ing their files again.
+"""
+from typing import List, Dict, Any, Optional, Iterator
+from datetime import datetime
+import json
+import os
+
+INDEX_VERSION = 1
+DATE_DIR_FORMAT = 'date_%m-%d-%Y_time_%H-%M'
+
+
+class MetadataIndex:
+    """
+    Lazily updated (subreddit, download_date, post_id, size, mtime) index of a scrape directory
+    """
+
+    def __init__(self, directory: str, index_path: Optional[str] = None):
+        """
+        Args:
+            directory (str): Scrape directory laid out as <subreddit>/<date_dir>/<post_id>.json
+            index_path (Optional[str]): JSON file the index is loaded from and saved to;
+                                        None keeps the index in memory only
+        """
+        self.directory = os.path.normpath(directory)
+        self.index_path = index_path
+        # '<subreddit>/<date_dir>' -> {'mtime_ns': ..., 'files': [[name, size, mtime_ns], ...]}
+        self.date_dirs: Dict[str, Dict[str, Any]] = {}
+        self.rescanned_dirs = 0
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path) as file:
+                saved = json.load(file)
+            if saved.get('version') == INDEX_VERSION and saved.get('directory') == self.directory:
+                self.date_dirs = saved['date_dirs']
+
+    def entries(self, restat: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one entry per JSON file, updating the index as the tree is walked
+
+        Entries have the keys path, subreddit, download_date, post_id, size and
+        mtime_ns. Date directories whose mtime is unchanged since the last scan
+        are served from the index. Files edited in place do not change their
+        directory's mtime, so pass restat=True to refresh size and mtime anyway.
+        The index is saved once the walk completes.
+
+        Args:
+            restat (bool): List and stat every date directory even if it looks unchanged
+
+        Yields:
+            Dict[str, Any]: Entry for each JSON file
+        """
+        seen = set()
+        for subreddit_entry in _sorted_dirs(self.directory):
+            for date_entry in _sorted_dirs(subreddit_entry.path):
+                try:
+                    download_date = datetime.strptime(date_entry.name, DATE_DIR_FORMAT)
+                except ValueError:
+                    continue  # not a scrape date directory
+                key = f'{subreddit_entry.name}/{date_entry.name}'
+                seen.add(key)
+                mtime_ns = date_entry.stat().st_mtime_ns
+                cached = self.date_dirs.get(key)
+                if restat or cached is None or cached['mtime_ns'] != mtime_ns:
+                    cached = {'mtime_ns': mtime_ns, 'files': _list_json_files(date_entry.path)}
+                    self.date_dirs[key] = cached
+                    self.rescanned_dirs += 1
+                for name, size, file_mtime_ns in cached['files']:
+                    yield {
+                        'path': os.path.join(date_entry.path, name),
+                        'subreddit': subreddit_entry.name,
+                        'download_date': download_date,
+                        'post_id': name[:-len('.json')],
+                        'size': size,
+                        'mtime_ns': file_mtime_ns,
+                    }
+        # Forget directories that were deleted since the last scan
+        for key in set(self.date_dirs) - seen:
+            del self.date_dirs[key]
+        self.save()
+
+    def save(self):
+        """
+        Write the index to index_path (no-op for an in-memory index)
+        """
+        if self.index_path is None:
+            return
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'version': INDEX_VERSION, 'directory': self.directory, 'date_dirs': self.date_dirs}, file)
+        os.replace(temporary_path, self.index_path)
+
+
+def _sorted_dirs(path: str) -> List[os.DirEntry]:
+    with os.scandir(path) as entries:
+        return sorted((entry for entry in entries if entry.is_dir()), key=lambda entry: entry.name)
+
+
+def _list_json_files(path: str) -> List[List[Any]]:
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                stat = entry.stat()
+                files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+    files.sort()
+    return files
+
+
+def iter_meta_data(directory: str, index_path: Optional[str] = None, restat: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield gather_meta_data-style dicts (path, subreddit, download_date, post_id)
+
+    Args:
+        directory (str): Scrape directory laid out as <subreddit>/<date_dir>/<post_id>.json
+        index_path (Optional[str]): Persisted index to reuse and update
+        restat (bool): Refresh every date directory listing even if it looks unchanged
+
+    Yields:
+        Dict[str, Any]: Metadata of each JSON file
+    """
+    for entry in MetadataIndex(directory, index_path).entries(restat):
+        yield {key: entry[key] for key in ('path', 'subreddit', 'download_date', 'post_id')}
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for tests and benchmarks.
+
+The server answers POST <url>/chat/completions the way the readability prompt
+expects: it pulls the text out of the <<...>> in the user message and replies
+with its offline Flesch readability score (readability.local_readability), so
+answers are deterministic. Latency and failures can be injected to exercise
+batching, retries and throughput without network access.
+
+    with MockChatCompletionsServer(latency=0.01, fail_every=5) as server:
+        backend = LLMReadabilityBackend(base_url=server.url, api_key='test')
+
+Usage:
+    python mock_llm_server.py --port 8089 --latency 0.05
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+import argparse
+import json
+import math
+import re
+import threading
+import time
+
+if __package__:
+    from .readability import local_readability
+else:
+    from readability import local_readability
+
+_PROMPT_TEXT = re.compile(r'<<(.*)>>', re.DOTALL)
+
+
+class MockChatCompletionsServer:
+    """
+    Threaded HTTP server mimicking /v1/chat/completions, run in a background thread
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free port
+        latency (float): Seconds to wait before answering each request
+        fail_every (int): If > 0, every fail_every-th request fails with fail_status
+        fail_status (int): HTTP status of injected failures (429 and 5xx are retried by clients)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 fail_every: int = 0, fail_status: int = 500):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.request_count = 0
+        self.failure_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts: List[str] = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL to pass to an OpenAI client (ends in /v1)
+        """
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockChatCompletionsServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_request_fails(self) -> bool:
+        with self._lock:
+            self.request_count += 1
+            fails = self.fail_every > 0 and self.request_count % self.fail_every == 0
+            self.failure_count += fails
+            return fails
+
+    def reply(self, body: dict) -> dict:
+        """
+        Chat completion response for a request body
+        """
+        prompt = body['messages'][-1]['content']
+        with self._lock:
+            self.prompts.append(prompt)
+        match = _PROMPT_TEXT.search(prompt)
+        score = local_readability(match.group(1)) if match else math.nan
+        content = 'N/A' if math.isnan(score) else f'{score:.1f}'
+        prompt_tokens = sum(len(message['content'].split()) for message in body['messages'])
+        return {
+            'id': f'chatcmpl-mock-{self.request_count}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 1,
+                      'total_tokens': prompt_tokens + 1},
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, as clients expect from the real API
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    self._answer(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _answer(self, body: dict):
+                if server.latency:
+                    time.sleep(server.latency)
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+                elif server._next_request_fails():
+                    self._send(server.fail_status, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+                else:
+                    self._send(200, server.reply(body))
+
+            def _send(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # keep test and benchmark output quiet
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve a mock chat-completions endpoint that scores readability offline.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before each answer")
+    parser.add_argument('--fail-every', type=int, default=0, help="Fail every n-th request (0: never)")
+    parser.add_argument('--fail-status', type=int, default=500)
+    args = parser.parse_args(argv)
+    server = MockChatCompletionsServer(args.host, args.port, args.latency, args.fail_every, args.fail_status)
+    print(f'Serving mock chat completions at {server.url}')
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Two-phase normalisation of feature scores.
+
+Scoring workers only compute raw scores. The statistics a normalisation needs
+are gathered in reducers that can be filled independently (one per worker or
+per chunk of threads) and merged, and scores are normalised once every reducer
+has been merged. Min/max and quantile reducers give exactly the same result
+however the scores were split up; running moments agree up to float rounding.
+
+    reducers = [make_reducer('minmax') for _ in chunks]
+    for reducer, chunk in zip(reducers, chunks):
+        reducer.update(chunk)
+    reducer = merge_reducers(reducers)
+    normalized = reducer.normalize(all_scores)
+"""
+from typing import List, Iterable, Optional
+import numpy as np
+
+NORMALIZATION_METHODS = ('minmax', 'quantile', 'zscore')
+
+
+def _as_array(values: Iterable[float]) -> np.ndarray:
+    return np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64)
+
+
+def _finite(values: Iterable[float]) -> np.ndarray:
+    values = _as_array(values).ravel()
+    return values[np.isfinite(values)]
+
+
+class MinMaxReducer:
+    """
+    Tracks the minimum and maximum score; normalises to [0, 1]
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def update(self, values: Iterable[float]) -> 'MinMaxReducer':
+        """
+        Add scores (NaN and infinite values are ignored)
+        """
+        values = _finite(values)
+        if len(values):
+            self.count += len(values)
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+        return self
+
+    def merge(self, other: 'MinMaxReducer') -> 'MinMaxReducer':
+        """
+        Fold another reducer's statistics into this one
+        """
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def normalize(self, values: Iterable[float]) -> np.ndarray:
+        """
+        (value - min) / (max - min); 0.0 when every score was the same, NaN stays NaN
+        """
+        values = _as_array(values)
+        if self.max > self.min:
+            return (values - self.min) / (self.max - self.min)
+        return np.where(np.isnan(values), np.nan, 0.0)
+
+
+class QuantileReducer:
+    """
+    Keeps every score; normalises each value to its mid-rank percentile in [0, 1]
+
+    Exact and robust to outliers, at the cost of 8 bytes per score.
+    """
+
+    def __init__(self):
+        self._chunks: List[np.ndarray] = []
+        self._sorted: Optional[np.ndarray] = None
+
+    @property
+    def count(self) -> int:
+        return int(sum(len(chunk) for chunk in self._chunks))
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Every finite score seen, sorted
+        """
+        if self._sorted is None:
+            self._sorted = np.sort(np.concatenate(self._chunks)) if self._chunks else np.zeros(0)
+            self._chunks = [self._sorted]
+        return self._sorted
+
+    def update(self, values: Iterable[float]) -> 'QuantileReducer':
+        """
+        Add scores (NaN and infinite values are ignored)
+        """
+        values = _finite(values)
+        if len(values):
+            self._chunks.append(values)
+            self._sorted = None
+        return self
+
+    def merge(self, other: 'QuantileReducer') -> 'QuantileReducer':
+        """
+        Fold another reducer's scores into this one
+        """
+        self._chunks.extend(other._chunks)
+        self._sorted = None
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        q-th quantile (0 <= q <= 1) of the scores seen
+        """
+        return float(np.quantile(self.values, q))
+
+    def normalize(self, values: Iterable[float]) -> np.ndarray:
+        """
+        Fraction of scores below each value, counting ties as half; NaN stays NaN
+        """
+        values = _as_array(values)
+        seen = self.values
+        if not len(seen):
+            return np.full(values.shape, np.nan)
+        below = np.searchsorted(seen, values, side='left')
+        below_or_equal = np.searchsorted(seen, values, side='right')
+        return np.where(np.isnan(values), np.nan, (below + below_or_equal) / (2 * len(seen)))
+
+
+class RunningMoments:
+    """
+    Streaming count, mean and variance (Welford, with Chan et al.'s merge); normalises to z-scores
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+
+    def update(self, values: Iterable[float]) -> 'RunningMoments':
+        """
+        Add scores (NaN and infinite values are ignored)
+        """
+        values = _finite(values)
+        if len(values):
+            chunk = RunningMoments()
+            chunk.count = len(values)
+            chunk.mean = float(values.mean())
+            chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+            self.merge(chunk)
+        return self
+
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        """
+        Fold another accumulator's moments into this one
+        """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self) -> float:
+        """
+        Population variance of the scores seen (NaN before any score)
+        """
+        return self.m2 / self.count if self.count else float('nan')
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def normalize(self, values: Iterable[float]) -> np.ndarray:
+        """
+        (value - mean) / std; 0.0 when every score was the same, NaN stays NaN
+        """
+        values = _as_array(values)
+        std = self.std
+        if std > 0:
+            return (values - self.mean) / std
+        return np.where(np.isnan(values), np.nan, 0.0)
+
+
+def make_reducer(method: str = 'minmax'):
+    """
+    Create an empty reducer for a normalisation method ('minmax', 'quantile' or 'zscore')
+    """
+    if method == 'minmax':
+        return MinMaxReducer()
+    if method == 'quantile':
+        return QuantileReducer()
+    if method == 'zscore':
+        return RunningMoments()
+    raise ValueError(f"Unknown normalization method '{method}', expected one of {NORMALIZATION_METHODS}")
+
+
+def merge_reducers(reducers: Iterable):
+    """
+    Merge reducers of the same kind into a new one
+    """
+    reducers = list(reducers)
+    if not reducers:
+        raise ValueError("No reducers to merge")
+    merged = type(reducers[0])()
+    for reducer in reducers:
+        merged.merge(reducer)
+    return merged
+
+
+def normalize_scores(values: Iterable[float], method: str = 'minmax') -> np.ndarray:
+    """
+    Normalise a complete list of scores in one go (both phases in this process)
+    """
+    values = _as_array(values)
+    return make_reducer(method).update(values).normalize(values)
@@ -1,30 +1,28 @@
 from collections import defaultdict
 import pandas as pd
 
+if __package__:
+    from .comment_thread import as_flat_thread
+else:
+    from comment_thread import as_flat_thread
+
 def get_onesidedness_score(comment_forest):
     """
     Calculates the one-sidedness (Gini coefficient) of author contributions 
     in a comment forest.
     
     Parameters:
-    comment_forest (list): A list of comment dictionaries, where each comment
+    comment_forest (dict, list or FlatThread): A post JSON whose 'comments' is a list of
+                          comment dictionaries (or that list itself), where each comment
                           has an 'author' field and optionally a 'replies' field
-                          containing nested comments.
+                          containing nested comments; or the thread already flattened.
     
     Returns:
     float: The Gini coefficient representing one-sidedness of the conversation.
            0 means perfect equality, 1 means perfect inequality.
     """
-    # flatten the comment forest to get all authors
-    authors = []
-    
-    def extract_authors(comments):
-        for comment in comments:
-            authors.append(comment['author'])
-            if 'replies' in comment and comment['replies']:
-                extract_authors(comment['replies'])
-    
-    extract_authors(comment_forest['comments']) #extract_authors(comment_forest['comments'])
+    # the flattened thread holds all authors
+    authors = as_flat_thread(comment_forest).authors
     
     # counting contributions by each author
     contribution_counts = defaultdict(int)
@@ -0,0 +1,103 @@
+"""
+Offline readability scoring with the Flesch reading ease and Flesch-Kincaid grade formulas.
+
+Text is split into sentences and words the way textstat does (the library the
+scores in misc_dataframes_with_test_results/flesch_kincaid_comparison_results.csv
+were computed with), and syllables are counted with a rule-based counter instead
+of a pronunciation dictionary, so scoring needs no downloads, no network and
+only a few microseconds per comment.
+"""
+from functools import lru_cache
+from typing import Tuple
+import math
+import re
+
+# Sentences as textstat finds them; sentences of two words or fewer are not counted
+_SENTENCE = re.compile(r'\b[^.!?]+[.!?]*')
+# Punctuation is deleted (not replaced by a space), apostrophes kept, as in textstat
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+_NON_LETTERS = re.compile(r'[^a-z]')
+
+# Endings that add a syllable the vowel-group count misses ("cre-at-ed" style hiatus)
+_EXTRA_SYLLABLE = re.compile(r'(?:ia|iet|io|ii|ua|uo|eo(?![up])|ea(?![dkrtsln])|[^aeiou]les$|[aeiouy]ing$|[^aeiou]yi)')
+# Vowel groups that are one syllable although the endings look like two
+_FEWER_SYLLABLES = re.compile(r'(?:cia[ln]|tia[ln]|[cgst]ion|ious|eous|uou|[^aeiou]ed$|[^aeiou]es$|ely$|ement)')
+
+
+@lru_cache(maxsize=200_000)
+def count_syllables(word: str) -> int:
+    """
+    Estimated number of syllables in a word (at least 1 for any word with a letter)
+
+    Counts groups of vowels, then corrects for a silent final e, for "-ed"/"-es"
+    endings that do not add a syllable, and for common vowel pairs that are
+    pronounced as two syllables. Acronyms count one syllable per letter. Results
+    are cached, since comment vocabularies repeat heavily.
+    """
+    letters = _NON_LETTERS.sub('', word.lower())
+    if not letters:
+        return 0
+    if (word.isupper() and 2 <= len(letters) <= 5) or not _VOWEL_GROUPS.search(letters):
+        # Acronyms and vowelless abbreviations are spelled out: "ADHD", "nsfw"
+        return len(letters) + 2 * letters.count('w')
+    word = letters
+    if len(word) <= 3:
+        return 1
+    count = len(_VOWEL_GROUPS.findall(word))
+    if word.endswith('e') and not word.endswith(('le', 'ee', 'ye')) and count > 1:
+        count -= 1  # silent final e: "make", "there"
+    count += len(_EXTRA_SYLLABLE.findall(word))
+    if count > 1 and not word.endswith(('ted', 'ded')):  # "wanted", "needed" keep their -ed syllable
+        count -= len(_FEWER_SYLLABLES.findall(word))
+    return max(1, count)
+
+
+def count_words(text: str) -> int:
+    return len(_PUNCTUATION.sub('', text).split())
+
+
+def count_sentences(text: str) -> int:
+    sentences = _SENTENCE.findall(text)
+    ignored = sum(1 for sentence in sentences if count_words(sentence) <= 2)
+    return max(1, len(sentences) - ignored)
+
+
+def text_statistics(text: str) -> Tuple[int, int, int]:
+    """
+    (sentences, words, syllables) of a text, counted as the Flesch formulas expect
+    """
+    words = _PUNCTUATION.sub('', text).split()
+    syllables = sum(count_syllables(word) for word in words)
+    return count_sentences(text), len(words), syllables
+
+
+def flesch_reading_ease(text: str) -> float:
+    """
+    Flesch reading ease (higher is easier; about 0-100 for ordinary prose); NaN for a text without words
+    """
+    sentences, words, syllables = text_statistics(text)
+    if words == 0:
+        return math.nan
+    return 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
+
+
+def flesch_kincaid_grade(text: str) -> float:
+    """
+    Flesch-Kincaid grade level (US school grade); NaN for a text without words
+    """
+    sentences, words, syllables = text_statistics(text)
+    if words == 0:
+        return math.nan
+    return 0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59
+
+
+def local_readability(text: str) -> float:
+    """
+    Readability on the 1-100 scale the LLM prompt uses (1 = extremely challenging,
+    100 = very easy): Flesch reading ease clipped to that range, NaN for a text without words
+    """
+    ease = flesch_reading_ease(text)
+    if math.isnan(ease):
+        return ease
+    return min(100.0, max(1.0, ease))
@@ -0,0 +1,209 @@
+"""
+Interchangeable ways of scoring comment readability on the 1-100 scale credibility uses.
+
+    LocalReadabilityBackend   offline Flesch reading ease (readability.py)
+    LLMReadabilityBackend     asks a chat-completions model, by default gpt-4-turbo on OpenAI;
+                              base_url can point it at any compatible server, such as
+                              mock_llm_server.MockChatCompletionsServer
+    CachedReadabilityBackend  wraps another backend and only scores texts it has not seen
+    AsyncLLMReadabilityBackend  (async_readability.py) like the LLM backend, with many
+                              requests in flight under rate limits
+
+Every backend scores a list of texts at once with score_many, returning NaN for
+texts that could not be scored, in input order.
+"""
+from typing import List, Dict, Optional, Iterable, Tuple, Union
+import math
+import os
+
+if __package__:
+    from .readability import local_readability
+else:
+    from readability import local_readability
+
+DEFAULT_LLM_MODEL = 'gpt-4-turbo'
+# Bump when the prompt changes, so cached scores from the old prompt are not reused
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = "You are a readability expert who can only respond in numbers."
+PROMPT_TEMPLATE = (
+    "Read the text below. Then, indicate the readability of the text, "
+    "on a scale from 1 (extremely challenging to understand) to 100 "
+    "(very easy to read and understand). In your assessment, consider "
+    "factors such as sentence structure, vocabulary complexity, and "
+    "overall clarity. This is the text: <<{}>>. "
+    "It is extremely important that you reply with the score only, "
+    "no explanation, just a single number:"
+)
+
+
+_dotenv_loaded = False
+
+
+def openai_api_key() -> Optional[str]:
+    """
+    OPENAI_API_KEY from the environment, loading a .env file into it the first time
+    """
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+    return os.getenv("OPENAI_API_KEY")
+
+
+def readability_messages(text: str) -> List[Dict[str, str]]:
+    """
+    Chat messages asking for the readability of text
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": PROMPT_TEMPLATE.format(text)},
+    ]
+
+
+def parse_score(content: Optional[str]) -> float:
+    """
+    Readability score from a model reply, NaN if the reply is not a number
+    """
+    try:
+        return float(content.strip())
+    except (AttributeError, ValueError):
+        return math.nan
+
+
+class ReadabilityBackend:
+    """
+    Base class: subclasses implement score_many and set a name (used in cache keys)
+    """
+    name = 'base'
+    prompt_version = 0  # only backends that prompt a model have a prompt version
+
+    @property
+    def cache_namespace(self) -> str:
+        """
+        Identifies the scores this backend produces, for caching
+        """
+        return f'{self.name}:v{self.prompt_version}'
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        raise NotImplementedError
+
+    def score(self, text: str) -> float:
+        return self.score_many([text])[0]
+
+
+class LocalReadabilityBackend(ReadabilityBackend):
+    """
+    Offline Flesch reading ease, clipped to 1-100
+    """
+    name = 'local'
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        return [local_readability(text) for text in texts]
+
+
+class LLMReadabilityBackend(ReadabilityBackend):
+    """
+    Readability from a chat-completions model, one request per text
+
+    The OpenAI client is created on first use from api_key (default: the
+    OPENAI_API_KEY environment variable or .env file) and base_url, unless a client is given.
+    Failed requests are retried by the client with exponential backoff; a text
+    whose request still fails, or whose reply is not a number, scores NaN.
+    """
+    prompt_version = PROMPT_VERSION
+
+    def __init__(self, model: str = DEFAULT_LLM_MODEL, client=None, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, max_retries: int = 3, timeout: float = 60.0):
+        self.model = model
+        self.name = f'llm:{model}'
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key or openai_api_key(),
+                                         base_url=self.base_url, max_retries=self.max_retries,
+                                         timeout=self.timeout)
+        return self._client
+
+    def score(self, text: str) -> float:
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model, messages=readability_messages(text), temperature=0)
+        except Exception:
+            return math.nan
+        return parse_score(response.choices[0].message.content)
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        return [self.score(text) for text in texts]
+
+
+class CachedReadabilityBackend(ReadabilityBackend):
+    """
+    Scores each distinct text once per backend and prompt version
+
+    cache is any object with get_many(namespace, texts) -> {text: score} and
+    put_many(namespace, {text: score}); by default an in-memory InMemoryScoreCache.
+    NaN scores (failed requests) are not cached, so they are retried next time.
+    """
+
+    def __init__(self, backend: ReadabilityBackend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else InMemoryScoreCache()
+        self.name = backend.name
+        self.prompt_version = backend.prompt_version
+
+    def score_many(self, texts: List[str]) -> List[float]:
+        namespace = self.backend.cache_namespace
+        known = self.cache.get_many(namespace, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in known))
+        if missing:
+            scored = dict(zip(missing, self.backend.score_many(missing)))
+            self.cache.put_many(namespace, {text: score for text, score in scored.items() if not math.isnan(score)})
+            known.update(scored)
+        return [known[text] for text in texts]
+
+
+class InMemoryScoreCache:
+    """
+    Process-local score cache keyed by (namespace, text)
+    """
+
+    def __init__(self):
+        self._scores: Dict[Tuple[str, str], float] = {}
+
+    def get_many(self, namespace: str, texts: Iterable[str]) -> Dict[str, float]:
+        return {text: self._scores[(namespace, text)] for text in texts if (namespace, text) in self._scores}
+
+    def put_many(self, namespace: str, scores: Dict[str, float]):
+        for text, score in scores.items():
+            self._scores[(namespace, text)] = score
+
+    def __len__(self):
+        return len(self._scores)
+
+
+def get_readability_backend(backend: Union[str, ReadabilityBackend] = 'local', **kwargs) -> ReadabilityBackend:
+    """
+    Backend for a name ('local', 'llm' or 'llm-async', extra keyword arguments go to its constructor),
+    or the backend itself if one is given
+    """
+    if isinstance(backend, ReadabilityBackend):
+        return backend
+    if backend == 'local':
+        return LocalReadabilityBackend()
+    if backend == 'llm':
+        return LLMReadabilityBackend(**kwargs)
+    if backend == 'llm-async':
+        if __package__:
+            from .async_readability import AsyncLLMReadabilityBackend
+        else:
+            from async_readability import AsyncLLMReadabilityBackend
+        return AsyncLLMReadabilityBackend(**kwargs)
+    raise ValueError(f"Unknown readability backend '{backend}', expected 'local', 'llm', 'llm-async' or a ReadabilityBackend")
@@ -0,0 +1,142 @@
+from typing import List, Dict, Iterable, Optional
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+
+CACHE_VERSION = 1
+# SQLite's default limit on parameters per statement is 999 (32766 since 3.32); stay below the old one
+_LOOKUP_BATCH = 900
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Text as cached: Unicode NFC with runs of whitespace collapsed and the ends stripped,
+    so bodies differing only in spacing share a score
+    """
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def readability_key(text: str) -> bytes:
+    """
+    Content address of a comment body's readability score
+
+    Args:
+        text (str): Comment text
+
+    Returns:
+        bytes: 20-byte SHA-1 digest of the normalised text
+    """
+    return hashlib.sha1(normalize_text(text).encode('utf-8', 'surrogatepass')).digest()
+
+
+class ReadabilityCache:
+    """
+    Persistent readability scores in SQLite, keyed by backend namespace and normalised text
+
+    The namespace (ReadabilityBackend.cache_namespace) names the backend, model
+    and prompt version, so changing any of them never reuses old scores. Lookups
+    and inserts work on whole lists of texts, one query per few hundred texts
+    and one transaction per insert. The database is in WAL mode, so several
+    worker processes can share one cache file; each process opens its own
+    connection on first use, which also makes the cache safe to pickle into a pool.
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        """
+        Open (or create) a readability cache
+
+        Args:
+            path (str): SQLite database file
+            timeout (float): Seconds to wait for another process's write to finish
+        """
+        self.path = path
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.execute('CREATE TABLE IF NOT EXISTS scores (namespace TEXT NOT NULL, key BLOB NOT NULL, '
+                               'score REAL NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID')
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+            version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if int(version) != CACHE_VERSION:
+                connection.close()
+                raise ValueError(f"{self.path} is a version {version} readability cache, expected {CACHE_VERSION}")
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def get_many(self, namespace: str, texts: Iterable[str]) -> Dict[str, float]:
+        """
+        Cached scores of texts
+
+        Args:
+            namespace (str): Backend namespace
+            texts (Iterable[str]): Comment texts
+
+        Returns:
+            Dict[str, float]: Score of each text found in the cache
+        """
+        keys_by_text = {text: readability_key(text) for text in texts}
+        keys = list(set(keys_by_text.values()))
+        found: Dict[bytes, float] = {}
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start:start + _LOOKUP_BATCH]
+            rows = self.connection.execute(
+                f'SELECT key, score FROM scores WHERE namespace = ? AND key IN ({",".join("?" * len(batch))})',
+                [namespace, *batch])
+            found.update(rows)
+        scores = {text: found[key] for text, key in keys_by_text.items() if key in found}
+        self.hits += len(scores)
+        self.misses += len(keys_by_text) - len(scores)
+        return scores
+
+    def put_many(self, namespace: str, scores: Dict[str, float]):
+        """
+        Store scores of texts, replacing any cached for the same normalised text
+
+        Args:
+            namespace (str): Backend namespace
+            scores (Dict[str, float]): Score of each text
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?)',
+                                        [(namespace, readability_key(text), float(score))
+                                         for text, score in scores.items()])
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def namespaces(self) -> List[str]:
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT namespace FROM scores')]
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
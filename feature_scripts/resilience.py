@@ -1,35 +1,26 @@
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import pandas as pd
 
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import pandas as pd
-
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import pandas as pd
+if __package__:
+    from .comment_thread import as_flat_thread
+    from .sentiment import compound_score, get_thread_sentiments
+else:
+    from comment_thread import as_flat_thread
+    from sentiment import compound_score, get_thread_sentiments
 
 def extract_comments_from_forest(comment_forest):
     """
     Extract comment texts from a comment forest structure
     
     Args:
-        comment_forest (List[Dict]): A nested comment structure where each comment
-                                     has 'content' and optionally 'replies'
+        comment_forest (List[Dict] or FlatThread): A nested comment structure where each comment
+                                     has 'content' and optionally 'replies',
+                                     or the thread already flattened
     
     Returns:
         List[str]: Flattened list of comment texts
     """
-    comment_texts = []
-    
-    def extract_recursive(comments):
-        for comment in comments:
-            if 'body' in comment:  # Extract body text from each comment
-                comment_texts.append(comment['body'])
-            if 'replies' in comment and comment['replies']:  # Recursively extract replies
-                extract_recursive(comment['replies'])
-    
-    extract_recursive(comment_forest)
-    #print(comment_forest)
-    return comment_texts
+    thread = as_flat_thread(comment_forest)
+    return [body for body in thread.bodies if body is not None]
 
 
 def calculate_resilience(json_data, neutral_threshold=0.3):
@@ -46,17 +37,25 @@ def calculate_resilience(json_data, neutral_threshold=0.3):
     - **NaN if no defection occurred**.
     '''
 
-    sid = SentimentIntensityAnalyzer()
+    thread = as_flat_thread(json_data).in_preorder()
+    root_sentiment, _ = get_thread_sentiments(thread)
+    return _resilience_of_comments(_body_sentiments(thread, slice(None)), root_sentiment, neutral_threshold)
 
-    # Extract comments from the comment forest
-    comments = extract_comments_from_forest(json_data.get("comments", []))
-    
-    if not comments:  # If there are no comments, return NaN
+
+def _body_sentiments(thread, branch):
+    """ Sentiments of the comments with a body in the given slice of the thread. """
+    _, sentiments = get_thread_sentiments(thread)
+    return [sentiment for body, sentiment in zip(thread.bodies[branch], sentiments[branch].tolist())
+            if body is not None]
+
+
+def _resilience_of_comments(comment_sentiments, root_sentiment, neutral_threshold=0.3):
+    """ Resilience of a flattened list of comment sentiments replying to a post with sentiment root_sentiment. """
+    if not comment_sentiments:  # If there are no comments, return NaN
         return float("NaN")
     
-    def process_node(comment_text, parent_sentiment, found_defection, sentiment_changes):
+    def process_node(raw_sentiment, parent_sentiment, found_defection, sentiment_changes):
         """ Process each comment and its replies recursively. """
-        raw_sentiment = sid.polarity_scores(comment_text)['compound']
         
         # Inherit parent's sentiment if the comment is neutral
         if abs(raw_sentiment) < neutral_threshold:
@@ -77,13 +76,12 @@ def calculate_resilience(json_data, neutral_threshold=0.3):
         
         return found_defection, sentiment_changes
 
-    root_sentiment = sid.polarity_scores(json_data['selftext'])['compound']
     sentiment_changes = []
     found_defection = False
     
     # Process each comment in the thread
-    for comment in comments:
-        found_defection, sentiment_changes = process_node(comment, root_sentiment, found_defection, sentiment_changes)
+    for comment_sentiment in comment_sentiments:
+        found_defection, sentiment_changes = process_node(comment_sentiment, root_sentiment, found_defection, sentiment_changes)
     
     # If no defection occurred, return NaN
     if not sentiment_changes:
@@ -107,12 +105,15 @@ def get_resilience_score(comment_forest, neutral_threshold=0.3):
     - **Average resilience score across all branches**.
     """
 
-    if "selftext" in comment_forest:
-        return calculate_resilience(comment_forest, neutral_threshold)
-    
-    # Otherwise process as comment forest
-    resilience_scores = [calculate_resilience({"selftext": "", "comments": [branch]}, neutral_threshold) 
-                        for branch in comment_forest.get("comments", [])]
+    # Comments are taken in pre-order, so a live thread scores like the forest it has grown into
+    thread = as_flat_thread(comment_forest).in_preorder()
+    if thread.selftext is not None:
+        return calculate_resilience(thread, neutral_threshold)
+    
+    # Otherwise process as comment forest, one top-level branch at a time
+    empty_post_sentiment = compound_score("")
+    resilience_scores = [_resilience_of_comments(_body_sentiments(thread, branch), empty_post_sentiment, neutral_threshold)
+                        for branch in thread.branch_slices()]
     
     valid_scores = [score for score in resilience_scores if not pd.isna(score)]
     resilience_score = sum(valid_scores) / len(valid_scores) if valid_scores else float("NaN")
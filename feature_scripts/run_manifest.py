@@ -0,0 +1,124 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import hashlib
+import json
+import os
+
+
+def file_fingerprint(path: str) -> Tuple[int, int]:
+    """
+    Cheap change detector for a file: (modification time in ns, size in bytes)
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def content_hash(data: bytes) -> str:
+    """
+    SHA-1 of a file's contents, used to recognise files that were touched but not changed
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+class RunManifest:
+    """
+    Append-only record of which (file, feature) combinations a batch run has finished
+
+    Each line of the manifest is a JSON object with the file's path, post_id,
+    fingerprint (mtime and size, plus the content hash when hashing is on) and
+    the features scored for it. The latest line for a path wins, so a file that
+    changed is simply recorded again after it is rescored. Lines are flushed as
+    they are written, so the manifest survives a crash or Ctrl-C.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a manifest, loading any runs already recorded in it
+
+        Args:
+            path (str): Manifest file (JSON lines); created on the first record
+        """
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut off by an interrupted run
+                    self.records[record['path']] = record
+        self._file = None
+
+    def pending_features(self, path: str, features: Iterable[str], use_hash: bool = False,
+                         fingerprint: Optional[Tuple[int, int]] = None) -> List[str]:
+        """
+        Features of path that still need scoring
+
+        A file whose mtime and size match its record only needs the features not
+        recorded yet. With use_hash, a file whose mtime or size changed but whose
+        contents hash the same is treated as unchanged.
+
+        Args:
+            path (str): JSON file path
+            features (Iterable[str]): Features requested for this run
+            use_hash (bool): Compare content hashes when the fingerprint differs
+            fingerprint (Optional[Tuple[int, int]]): Fingerprint to compare instead of the file's
+                                                     own (e.g. of the corpus store it was read from)
+
+        Returns:
+            List[str]: Requested features that are not recorded as done for the current file
+        """
+        features = list(features)
+        record = self.records.get(path)
+        if record is None:
+            return features
+        unchanged = list(fingerprint or file_fingerprint(path)) == record['fingerprint']
+        if not unchanged and use_hash and fingerprint is None and record.get('sha1') is not None:
+            with open(path, 'rb') as file:
+                unchanged = content_hash(file.read()) == record['sha1']
+        if not unchanged:
+            return features
+        done = set(record['features'])
+        return [feature for feature in features if feature not in done]
+
+    def record(self, meta: Dict[str, Any], features: Iterable[str], fingerprint: Tuple[int, int],
+               sha1: Optional[str] = None):
+        """
+        Mark features as done for a file
+
+        Args:
+            meta (Dict[str, Any]): File metadata with at least 'path' and 'post_id'
+            features (Iterable[str]): Features that were scored
+            fingerprint (Tuple[int, int]): File fingerprint at the time it was read
+            sha1 (Optional[str]): Content hash at the time it was read
+        """
+        record = {
+            'path': meta['path'],
+            'post_id': meta.get('post_id'),
+            'fingerprint': list(fingerprint),
+            'sha1': sha1,
+            'features': sorted(features),
+        }
+        previous = self.records.get(meta['path'])
+        if previous is not None and previous['fingerprint'] == record['fingerprint'] \
+                and previous.get('sha1') in (None, sha1):
+            record['features'] = sorted(set(previous['features']) | set(record['features']))
+        self.records[meta['path']] = record
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
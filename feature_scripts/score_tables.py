@@ -0,0 +1,197 @@
+"""
+Column layout of feature score tables and the writers that stream them to disk.
+
+Score tables can be written as CSV (one file, like the notebooks produced) or as
+a Parquet dataset partitioned by subreddit and download date, whose typed
+columns can be loaded column-pruned with read_feature_scores. Parquet support
+needs the optional pyarrow dependency.
+"""
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime
+import csv
+import math
+import os
+import uuid
+
+META_COLUMN_TYPES = {
+    'path': 'string',
+    'subreddit': 'string',
+    'download_date': 'string',
+    'post_id': 'string',
+}
+
+CREDIBILITY_SUBFEATURE_TYPES = {
+    'comment_has_author_references_proportion': 'float64',
+    'vote_score_mean': 'float64',
+    'comments_per_author': 'float64',
+    'comment_length_mean': 'float64',
+    'comment_has_links_proportion': 'float64',
+    'misspelled_words_proportion': 'float64',
+    'readability_mean': 'float64',
+    'total_word_count': 'int64',
+    'total_comments': 'int64',
+    'total_coments_readability_scorable': 'int64',
+}
+
+# Numbers of coalitions tried by the coalition_sweep feature
+COALITION_SWEEP_K = tuple(range(2, 9))
+COALITION_SWEEP_TYPES = {
+    'coalition_best_k': 'int64',
+    'coalition_best_diversity': 'float64',
+    **{f'coalition_diversity_k{k}': 'float64' for k in COALITION_SWEEP_K},
+}
+
+# Columns each feature contributes to a score table, with their types
+FEATURE_COLUMN_TYPES = {
+    'coalition': {'coalition': 'float64'},
+    'coalition_sweep': COALITION_SWEEP_TYPES,
+    'onesidedness': {'onesidedness': 'float64'},
+    'defection': {'defection': 'float64'},
+    'resilience': {'resilience': 'float64'},
+    'credibility': {'credibility': 'float64'},
+    'credibility_subfeatures': CREDIBILITY_SUBFEATURE_TYPES,
+}
+
+PARTITION_COLUMNS = ('subreddit', 'download_date')
+DOWNLOAD_DATE_FORMAT = '%Y-%m-%d_%H-%M'
+
+
+def column_types(features: Iterable[str]) -> Dict[str, str]:
+    """
+    Ordered column name -> type mapping of a score table for the given features
+    """
+    types = dict(META_COLUMN_TYPES)
+    for feature in features:
+        types.update(FEATURE_COLUMN_TYPES[feature])
+    return types
+
+
+def _cell(value: Any, column_type: str) -> Any:
+    """ Convert a feature value to a plain Python value of the column type (None for missing). """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(DOWNLOAD_DATE_FORMAT)
+    if column_type == 'string':
+        return str(value)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None  # pd.NA and other missing markers
+    if math.isnan(value):
+        return None
+    return int(value) if column_type == 'int64' else value
+
+
+class CsvScoreWriter:
+    """
+    Streams score rows to a single CSV file, flushing after every row
+    """
+
+    def __init__(self, path: str, features: Iterable[str], append: bool = False):
+        self.path = path
+        self.fieldnames = list(column_types(features))
+        if append:
+            with open(path, newline='') as file:
+                existing_fieldnames = next(csv.reader(file))
+            if existing_fieldnames != self.fieldnames:
+                raise ValueError(f"{path} has columns {existing_fieldnames}, expected {self.fieldnames}; "
+                                 "resume into a new output file when changing features")
+        self._file = open(path, 'a' if append else 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+        if not append:
+            self._writer.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetScoreWriter:
+    """
+    Streams score rows to a Parquet dataset partitioned by subreddit and download date
+
+    Rows are buffered and written as a new set of files every rows_per_file rows
+    (and on close), under <path>/subreddit=<name>/download_date=<date>/. Each
+    writer uses its own file name prefix, so appending to an existing dataset
+    never overwrites earlier files. Missing and NaN scores are stored as nulls.
+    """
+
+    def __init__(self, path: str, features: Iterable[str], rows_per_file: int = 10_000):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from e
+        self.path = path
+        self.types = column_types(features)
+        self.schema = pa.schema([(name, pa.string() if kind == 'string' else getattr(pa, kind)())
+                                 for name, kind in self.types.items()])
+        self.rows_per_file = rows_per_file
+        self._prefix = uuid.uuid4().hex[:12]
+        self._flushes = 0
+        self._rows: List[Dict[str, Any]] = []
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, row: Dict[str, Any]):
+        self._rows.append({name: _cell(row.get(name), kind) for name, kind in self.types.items()})
+        if len(self._rows) >= self.rows_per_file:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        pq.write_to_dataset(table, self.path, partition_cols=list(PARTITION_COLUMNS),
+                            basename_template=f'part-{self._prefix}-{self._flushes}-{{i}}.parquet')
+        self._flushes += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+def open_score_writer(path: str, features: Iterable[str], output_format: str = 'csv', append: bool = False):
+    """
+    Create the score table writer for the given output format ('csv' or 'parquet')
+    """
+    if output_format == 'csv':
+        return CsvScoreWriter(path, features, append=append)
+    if output_format == 'parquet':
+        return ParquetScoreWriter(path, features)
+    raise ValueError(f"Unknown output format '{output_format}', expected 'csv' or 'parquet'")
+
+
+def read_feature_scores(path: str, columns: Optional[List[str]] = None, filters=None):
+    """
+    Load a partitioned Parquet score table into a pandas DataFrame
+
+    Only the requested columns are read from disk, and filters on the partition
+    columns (e.g. [('subreddit', '=', 'AskReddit')]) skip whole directories.
+
+    Args:
+        path (str): Dataset directory written by ParquetScoreWriter
+        columns (Optional[List[str]]): Columns to load (all if None)
+        filters: pyarrow filter expression or list of (column, op, value) tuples
+
+    Returns:
+        pd.DataFrame: The score table, with download_date parsed as datetime
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    partitioning = ds.partitioning(
+        pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor='hive')
+    table = pq.read_table(path, columns=columns, filters=filters, partitioning=partitioning)
+    df = table.to_pandas()
+    for column in PARTITION_COLUMNS:
+        if column in df and isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str)
+    if 'download_date' in df:
+        df['download_date'] = pd.to_datetime(df['download_date'], format=DOWNLOAD_DATE_FORMAT)
+    return df
@@ -0,0 +1,128 @@
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+import hashlib
+import os
+import threading
+import numpy as np
+
+if __package__:
+    from .comment_thread import FlatThread
+else:
+    from comment_thread import FlatThread
+
+# NLTK is imported with the analyzer, on first use
+if TYPE_CHECKING:
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+_ANALYZER: Optional['SentimentIntensityAnalyzer'] = None
+_ANALYZER_LOCK = threading.Lock()
+
+
+def get_sentiment_analyzer() -> 'SentimentIntensityAnalyzer':
+    """
+    Return the process-wide VADER analyzer, creating it (and reading its lexicon) on first use
+    """
+    global _ANALYZER
+    if _ANALYZER is None:
+        with _ANALYZER_LOCK:
+            if _ANALYZER is None:
+                from nltk.sentiment.vader import SentimentIntensityAnalyzer
+                _ANALYZER = SentimentIntensityAnalyzer()
+    return _ANALYZER
+
+
+# Length of a memo key (a SHA-1 digest of the text)
+KEY_SIZE = 20
+
+
+class SentimentMemo:
+    """
+    Memo of VADER compound scores keyed by a hash of the text
+
+    Lets recurring comment bodies be scored once, and can be saved to and loaded
+    from an .npz file so the scores carry over between runs.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (Optional[str]): .npz file to load from (if it exists) and save to, used as given
+        """
+        self.path = path
+        self.scores: Dict[bytes, float] = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with np.load(path) as data:
+                keys = data['keys']
+                if keys.dtype.kind == 'S':
+                    # Memos saved as 'S20' strings: numpy strips trailing NUL bytes from
+                    # their items, so read the same 20 bytes per key as raw bytes instead
+                    keys = keys.view(np.uint8)
+                keys = keys.reshape(-1, KEY_SIZE)
+                self.scores = dict(zip((key.tobytes() for key in keys), data['scores'].tolist()))
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).digest()
+
+    def compound(self, text: str) -> float:
+        """
+        VADER compound score of text, computed only if it has not been seen before
+        """
+        key = self.key(text)
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+            score = get_sentiment_analyzer().polarity_scores(text)['compound']
+            self.scores[key] = score
+        else:
+            self.hits += 1
+        return score
+
+    def save(self, path: Optional[str] = None):
+        """
+        Write the memo to path (defaults to the path it was opened with)
+        """
+        path = path or self.path
+        keys = np.frombuffer(b''.join(self.scores), dtype=np.uint8).reshape(-1, KEY_SIZE)
+        # Through a file object, so numpy writes to path as given rather than appending '.npz'
+        with open(path, 'wb') as file:
+            np.savez(file, keys=keys, scores=np.array(list(self.scores.values()), dtype=np.float64))
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def compound_score(text: str, memo: Optional[SentimentMemo] = None) -> float:
+    """
+    VADER compound score of a single text
+    """
+    if memo is not None:
+        return memo.compound(text)
+    return get_sentiment_analyzer().polarity_scores(text)['compound']
+
+
+def get_thread_sentiments(thread: FlatThread, memo: Optional[SentimentMemo] = None) -> Tuple[float, np.ndarray]:
+    """
+    VADER compound scores of a thread's post and of each of its comments
+
+    The scores are computed once per thread and kept on it, so defection and
+    resilience share a single sentiment pass; comments appended to the thread
+    since (FlatThread.append_comments) are scored on the next call. Comments
+    without a body score as the empty string (0.0).
+
+    Args:
+        thread (FlatThread): The flattened thread
+        memo (Optional[SentimentMemo]): Memo of scores for texts seen before
+
+    Returns:
+        Tuple[float, np.ndarray]: Post sentiment and the sentiment of each comment
+    """
+    if thread.sentiments is None:
+        thread.root_sentiment = compound_score(thread.selftext or "", memo)
+        thread.sentiments = np.array([compound_score(body or "", memo) for body in thread.bodies],
+                                     dtype=np.float64)
+    elif len(thread.sentiments) < len(thread):
+        appended = [compound_score(body or "", memo) for body in thread.bodies[len(thread.sentiments):]]
+        thread.sentiments = np.append(thread.sentiments, np.array(appended, dtype=np.float64))
+    return thread.root_sentiment, thread.sentiments
@@ -0,0 +1,347 @@
+"""
+Batch misspelling counts for credibility's misspelled_words_proportion.
+
+Credibility counts a misspelling for every purely alphabetic token of a
+lower-cased comment (as nltk.word_tokenize splits it) that is not in the
+vocabulary. word_tokenize runs the treebank substitutions sentence by
+sentence; scan_alpha_tokens gives a whole thread the same tokens with one pass
+of each substitution over all of its punkt sentences, one per line, and instead
+of testing every token against a Python set, the distinct tokens of the thread
+are looked up once, together, in a sorted byte-string array with
+numpy.searchsorted.
+
+The array can be saved as a versioned binary artifact (Vocabulary.save, or
+`python spelling.py OUTPUT WORD_FILE...`) and memory-mapped by Vocabulary.load,
+so a pool of worker processes shares one read-only copy of the word lists
+instead of each reading and holding its own.
+"""
+from typing import List, Dict, Iterable, Optional, Sequence, Tuple, Union
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Vocabulary artifact layout: magic, format version and header length, a JSON header,
+# then the sorted fixed-width words from an aligned offset, ready to memory-map
+VOCABULARY_MAGIC = b'VOCAB\x00\x00\x00'
+VOCABULARY_FORMAT_VERSION = 1
+_PREFIX = struct.Struct('<8sII')
+_DATA_ALIGNMENT = 64
+# Separates texts joined for a single scan (see join_texts)
+_SEPARATOR = '\x00'
+# Whether NLTK's punkt data has been found (or downloaded) in this process, set by load_punkt
+_punkt_ready = False
+_punkt_lock = threading.Lock()
+# NLTKWordTokenizer's substitutions, recompiled by _treebank_rules on first use
+_treebank = None
+
+
+class Vocabulary:
+    """
+    Sorted array of UTF-8 encoded words for vectorised membership tests
+
+    A fixed-width byte-string array takes a fraction of the memory of a Python
+    set of str and is tested against a whole batch of tokens with one searchsorted.
+    """
+
+    def __init__(self, words: np.ndarray):
+        """
+        Args:
+            words (np.ndarray): Sorted, unique words as a fixed-width bytes ('S') array
+        """
+        self.words = words
+
+    @classmethod
+    def from_words(cls, words: Iterable[str]) -> 'Vocabulary':
+        encoded = sorted({word.encode('utf-8', 'surrogatepass') for word in words if word})
+        return cls(np.array(encoded, dtype=f'S{max(map(len, encoded), default=1)}'))
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str]) -> 'Vocabulary':
+        """
+        Vocabulary of the stripped lines of one or more word list files
+        """
+        words = set()
+        for path in paths:
+            with open(path, 'r') as file:
+                words.update(line.strip() for line in file)
+        return cls.from_words(words)
+
+    @classmethod
+    def load(cls, path: str, sources: Optional[Iterable[str]] = None, mmap: bool = True) -> 'Vocabulary':
+        """
+        Vocabulary saved by save
+
+        Memory-mapped read-only by default, so processes loading the same file
+        share one copy of the words through the page cache.
+
+        Args:
+            path (str): Vocabulary artifact
+            sources (Optional[Iterable[str]]): Word list files the artifact must have been built from,
+                                               unchanged; None skips the check
+            mmap (bool): Map the file instead of reading it into memory
+
+        Returns:
+            Vocabulary: The saved vocabulary
+
+        Raises:
+            ValueError: If the file is not a vocabulary artifact of this format version,
+                        or was built from other word lists
+        """
+        header, offset = read_vocabulary_header(path)
+        if sources is not None and header['sources'] != source_fingerprints(sources):
+            raise ValueError(f"{path} was built from other word lists than {list(sources)}")
+        dtype, count = np.dtype(f"S{header['width']}"), header['count']
+        if count == 0:
+            return cls(np.zeros(0, dtype=dtype))
+        if mmap:
+            return cls(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,)).view(np.ndarray))
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return cls(np.fromfile(file, dtype=dtype, count=count))
+
+    def save(self, path: str, sources: Iterable[str] = ()):
+        """
+        Write the vocabulary as a memory-mappable artifact, replacing path atomically
+
+        Args:
+            path (str): Output file
+            sources (Iterable[str]): Word list files it was built from, fingerprinted so load can tell a stale artifact
+        """
+        header = json.dumps({
+            'width': self.words.dtype.itemsize,
+            'count': len(self.words),
+            'sources': source_fingerprints(sources),
+        }).encode('utf-8')
+        offset = _data_offset(len(header))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(_PREFIX.pack(VOCABULARY_MAGIC, VOCABULARY_FORMAT_VERSION, len(header)))
+                file.write(header.ljust(offset - _PREFIX.size, b' '))
+                file.write(np.ascontiguousarray(self.words).tobytes())
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def contains(self, tokens: Sequence[str]) -> np.ndarray:
+        """
+        Whether each token is in the vocabulary
+
+        Args:
+            tokens (Sequence[str]): Tokens to look up
+
+        Returns:
+            np.ndarray: Boolean array, one entry per token
+        """
+        if len(self.words) == 0 or len(tokens) == 0:
+            return np.zeros(len(tokens), dtype=bool)
+        encoded = [token.encode('utf-8', 'surrogatepass') for token in tokens]
+        width = self.words.dtype.itemsize
+        # Longer tokens cannot be in the vocabulary, and would be truncated to fit the array
+        fits = np.array([len(token) <= width for token in encoded])
+        query = np.array(encoded, dtype=self.words.dtype)
+        positions = np.minimum(np.searchsorted(self.words, query), len(self.words) - 1)
+        return fits & (self.words[positions] == query)
+
+    def __contains__(self, token: str) -> bool:
+        return bool(self.contains([token])[0])
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+def _data_offset(header_length: int) -> int:
+    return -(-(_PREFIX.size + header_length) // _DATA_ALIGNMENT) * _DATA_ALIGNMENT
+
+
+def source_fingerprints(paths: Iterable[str]) -> Dict[str, str]:
+    """
+    SHA-1 of each word list file's contents, by file name
+    """
+    fingerprints = {}
+    for path in paths:
+        with open(path, 'rb') as file:
+            fingerprints[os.path.basename(path)] = hashlib.sha1(file.read()).hexdigest()
+    return fingerprints
+
+
+def read_vocabulary_header(path: str) -> Tuple[dict, int]:
+    """
+    Header of a vocabulary artifact and the offset of its words
+
+    Returns:
+        Tuple[dict, int]: Header (width, count and sources) and the byte offset of the words array
+    """
+    with open(path, 'rb') as file:
+        prefix = file.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size or prefix[:len(VOCABULARY_MAGIC)] != VOCABULARY_MAGIC:
+            raise ValueError(f"{path} is not a vocabulary artifact")
+        _, version, length = _PREFIX.unpack(prefix)
+        if version != VOCABULARY_FORMAT_VERSION:
+            raise ValueError(f"{path} is a version {version} vocabulary artifact, expected {VOCABULARY_FORMAT_VERSION}")
+        header = json.loads(file.read(length))
+    return header, _data_offset(length)
+
+
+def as_vocabulary(words: Union[Vocabulary, Iterable[str]]) -> Vocabulary:
+    return words if isinstance(words, Vocabulary) else Vocabulary.from_words(words)
+
+
+def load_punkt():
+    """
+    Make sure the punkt sentence tokenizer data word_tokenize needs is installed, downloading it if missing
+
+    Checked once per process; NLTK is imported only here, on first use.
+    """
+    global _punkt_ready
+    if not _punkt_ready:
+        with _punkt_lock:
+            if not _punkt_ready:
+                import nltk
+                try:
+                    nltk.data.find('tokenizers/punkt_tab')
+                except LookupError:
+                    nltk.download('punkt_tab', quiet=True)
+                _punkt_ready = True
+
+
+def _treebank_rules() -> Tuple[List[Tuple['re.Pattern', str]], List[Tuple['re.Pattern', str]]]:
+    """
+    NLTKWordTokenizer's substitutions, in its order, before and after it pads the sentence with spaces
+
+    Anchored patterns are recompiled in multiline mode, so that on sentences
+    joined by newlines '^' and '$' match at every sentence's start and end.
+    """
+    global _treebank
+    if _treebank is None:
+        from nltk.tokenize.destructive import NLTKWordTokenizer
+        tokenizer = NLTKWordTokenizer
+
+        def multiline(rules):
+            return [(re.compile(regex.pattern, regex.flags | re.MULTILINE), substitution)
+                    for regex, substitution in rules]
+
+        before = multiline(tokenizer.STARTING_QUOTES + tokenizer.PUNCTUATION
+                           + [tokenizer.PARENS_BRACKETS, tokenizer.DOUBLE_DASHES])
+        after = multiline(tokenizer.ENDING_QUOTES
+                          + [(regex, r' \1 \2 ') for regex in tokenizer.CONTRACTIONS2 + tokenizer.CONTRACTIONS3])
+        _treebank = (before, after)
+    return _treebank
+
+
+def scan_alpha_tokens(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Alphabetic tokens of lower-cased texts, as nltk.word_tokenize gives them, numbered by distinct token
+
+    word_tokenize splits a text into sentences with punkt and runs the treebank
+    substitutions over each sentence. Here the sentences of all the texts are
+    joined, one per line, and each substitution runs once over the whole: none
+    of them matches across a line break differently than at the start or end of
+    a sentence, and newlines inside a sentence become '\r', which the
+    substitutions treat the same way. The text of each token is told by a
+    separator line after every text.
+
+    Args:
+        texts (Sequence[str]): Texts, already lower-cased
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Index of the text of each token, each token's code,
+        and the distinct tokens the codes refer to
+    """
+    load_punkt()
+    from nltk.tokenize import sent_tokenize
+    before, after = _treebank_rules()
+    lines = []
+    for text in texts:
+        lines.extend(sentence.replace('\n', '\r').replace(_SEPARATOR, '\x01') for sentence in sent_tokenize(text))
+        lines.append(_SEPARATOR)
+    joined = '\n'.join(lines)
+    for regex, substitution in before:
+        joined = regex.sub(substitution, joined)
+    joined = f' {joined} '
+    for regex, substitution in after:
+        joined = regex.sub(substitution, joined)
+
+    tokens = np.array([token for token in joined.split() if token == _SEPARATOR or token.isalpha()], dtype=object)
+    codes, distinct = pd.factorize(tokens)
+    # (compared per distinct token: numpy would read '\x00' as an empty string)
+    separator = np.flatnonzero([token == _SEPARATOR for token in distinct])
+    is_separator = np.isin(codes, separator)
+    codes = codes[~is_separator]
+    if len(separator):
+        codes = codes - (codes > separator[0])
+        distinct = np.delete(distinct, separator[0])
+    return np.cumsum(is_separator)[~is_separator], codes, distinct
+
+
+def alpha_tokens(text: str) -> List[str]:
+    """
+    Alphabetic tokens of a lower-cased text, as nltk.word_tokenize produces them
+    """
+    _, codes, distinct = scan_alpha_tokens([text])
+    return [distinct[code] for code in codes]
+
+
+def join_texts(texts: Sequence[str], joiner: str = _SEPARATOR) -> str:
+    """
+    Texts joined for a single scan by a joiner holding the separator character
+
+    A separator inside a text becomes '\x01', which no scan tells apart from it:
+    neither is whitespace, a word character or punctuation.
+    """
+    joined = joiner.join(texts)
+    if joined.count(_SEPARATOR) != (len(texts) - 1) * joiner.count(_SEPARATOR):
+        joined = joiner.join(text.replace(_SEPARATOR, '\x01') for text in texts)
+    return joined
+
+
+def count_missing(distinct: Sequence[str], vocabulary: Vocabulary) -> np.ndarray:
+    """
+    Whether each distinct token is missing from the vocabulary, as 0 or 1
+    """
+    return (~vocabulary.contains(distinct)).astype(np.int64)
+
+
+def count_misspellings(texts: Sequence[str], vocabulary: Union[Vocabulary, Iterable[str]]) -> np.ndarray:
+    """
+    Number of alphabetic tokens missing from the vocabulary in each lower-cased text
+
+    Each distinct token of all the texts is looked up once.
+
+    Args:
+        texts (Sequence[str]): Texts, already lower-cased
+        vocabulary (Union[Vocabulary, Iterable[str]]): Valid words
+
+    Returns:
+        np.ndarray: Misspelling count of each text (int64)
+    """
+    if len(texts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    text_of_token, codes, distinct = scan_alpha_tokens(texts)
+    missing = count_missing(distinct, as_vocabulary(vocabulary))
+    return np.bincount(text_of_token, weights=missing[codes], minlength=len(texts)).astype(np.int64)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build a memory-mappable vocabulary artifact from word list files.")
+    parser.add_argument('output', help="Artifact to write")
+    parser.add_argument('word_files', nargs='+', help="Word lists, one word per line")
+    args = parser.parse_args(argv)
+    vocabulary = Vocabulary.from_files(args.word_files)
+    vocabulary.save(args.output, sources=args.word_files)
+    print(f'Wrote {len(vocabulary)} words ({vocabulary.words.nbytes} bytes) to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition
+from helpers import FakeSentenceTransformer
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    # setattr would first read the attribute to restore it, which imports sentence_transformers
+    monkeypatch.setitem(coalition.__dict__, 'SentenceTransformer', FakeSentenceTransformer)
+    coalition.release_model()
+    FakeSentenceTransformer.instances = 0
+    yield FakeSentenceTransformer
+    coalition.release_model()
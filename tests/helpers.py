@@ -0,0 +1,120 @@
+"""
+Forests, corpora and stand-ins shared by the feature tests
+"""
+import json
+
+import numpy as np
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts.readability_backends import ReadabilityBackend
+
+
+class FakeSentenceTransformer:
+    """
+    Stand-in for SentenceTransformer that embeds texts deterministically by
+    hashing their words, so coalition plumbing can be tested without a model download
+    """
+    instances = 0
+
+    def __init__(self, model_name, device=None):
+        FakeSentenceTransformer.instances += 1
+        self.model_name = model_name
+        self.device = device
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        embeddings = np.zeros((len(texts), 16), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in str(text).lower().split():
+                embeddings[i, sum(map(ord, word)) % 16] += 1.0
+        embeddings[:, 0] += 0.1
+        return embeddings
+
+
+def make_flat_forest(bodies, author_prefix='user'):
+    """
+    Build a comment forest whose comments are all top-level replies to the post
+    """
+    return {
+        'selftext': 'Initial post',
+        'comments': [
+            {'body': body, 'author': f'{author_prefix}{i % 4}', 'score': i, 'replies': []}
+            for i, body in enumerate(bodies)
+        ]
+    }
+
+
+SAMPLE_BODIES = [
+    'I think the first perspective is important',
+    'Interesting point, but have you considered another angle?',
+    'I disagree completely and here is why',
+    'You raise a valid counterpoint',
+    'Taxes should be lower for small businesses',
+    'Public transit is the best investment a city can make',
+    'Cats are better than dogs',
+    'Absolutely right!',
+    'No doubt about it',
+    'This is a bridge too far, for me.',
+    'Substitute this advice for a dishwasher.',
+    'Cooking meals is a life skill',
+]
+
+
+FLESCH_KINCAID_COMPARISON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                         'misc_dataframes_with_test_results', 'flesch_kincaid_comparison_results.csv')
+
+
+class CountingBackend(ReadabilityBackend):
+    name = 'counting'
+
+    def __init__(self):
+        self.scored = []
+
+    def score_many(self, texts):
+        self.scored.extend(texts)
+        return [float(len(text)) for text in texts]
+
+
+NESTED_CONVERSATION = {
+    'selftext': 'Initial positive post',
+    'comments': [
+        {
+            'body': 'Great point, I agree',
+            'author': 'user1',
+            'score': 3,
+            'replies': [
+                {'body': 'I strongly disagree with this', 'author': 'user2', 'score': -1,
+                 'replies': [{'body': 'Why are you so negative?', 'author': 'user1', 'score': 2}]},
+                {'body': 'Me too, very insightful', 'author': 'user3', 'score': 5}
+            ]
+        },
+        {'body': 'Terrible idea, awful and wrong', 'author': 'user4', 'score': 0, 'replies': []}
+    ]
+}
+
+
+def make_deep_forest(depth):
+    """
+    Build a single reply chain of the given depth
+    """
+    comment = {'body': 'the end', 'author': 'last', 'score': 1, 'replies': []}
+    for i in range(depth - 1):
+        comment = {'body': f'reply {i} is good', 'author': f'user{i % 3}', 'score': 1, 'replies': [comment]}
+    return {'selftext': 'deep post', 'comments': [comment]}
+
+
+def write_corpus(directory, forests_by_subreddit):
+    """
+    Write forests in the scraper's <subreddit>/date_<...>/<post_id>.json layout
+    """
+    for subreddit, forests in forests_by_subreddit.items():
+        date_dir = directory / subreddit / 'date_03-18-2025_time_12-37'
+        date_dir.mkdir(parents=True)
+        for i, forest in enumerate(forests):
+            (date_dir / f'post{i}.json').write_text(json.dumps(forest))
+    return str(directory)
+
+
+BATCH_FEATURES = ['onesidedness', 'defection', 'resilience']
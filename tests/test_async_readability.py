@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import readability
+from feature_scripts.mock_llm_server import MockChatCompletionsServer
+from feature_scripts.async_readability import AsyncLLMReadabilityBackend, RateLimiter
+
+
+class TestAsyncReadability:
+    def test_concurrent_requests_keep_input_order(self):
+        """
+        Requests run concurrently up to max_concurrency and scores come back in input order, once per distinct text
+        """
+        texts = [f'Comment number {i} says something. It is short and clear.' + ' Indeed' * i for i in range(30)]
+        # The backend imports openai on first use; keep that import out of the timed requests
+        pytest.importorskip('openai')
+        with MockChatCompletionsServer(latency=0.05) as server:
+            backend = AsyncLLMReadabilityBackend(base_url=server.url, api_key='test', max_concurrency=10,
+                                                 requests_per_minute=None, tokens_per_minute=None)
+            start = time.perf_counter()
+            scores = backend.score_many(texts + texts[:5])
+            elapsed = time.perf_counter() - start
+        expected = [round(readability.local_readability(text), 1) for text in texts]
+        assert scores == expected + expected[:5]
+        assert server.request_count == 30
+        assert server.max_in_flight <= 10
+        assert elapsed < 30 * 0.05 / 2
+
+    def test_score_threads(self):
+        """
+        Comments of several threads are scored in one pass and split back per thread
+        """
+        threads = [['First thread, first comment here.', 'Second comment of the first thread.'], [],
+                   ['Only comment of the third thread.']]
+        with MockChatCompletionsServer() as server:
+            backend = AsyncLLMReadabilityBackend(base_url=server.url, api_key='test')
+            scores = backend.score_threads(threads)
+        assert [len(thread) for thread in scores] == [2, 0, 1]
+        assert scores[2] == [round(readability.local_readability(threads[2][0]), 1)]
+
+    def test_retries_with_backoff(self):
+        """
+        Server errors and rate limits are retried; a request failing every retry scores NaN
+        """
+        with MockChatCompletionsServer(fail_every=3, fail_status=429) as server:
+            backend = AsyncLLMReadabilityBackend(base_url=server.url, api_key='test', max_concurrency=1, backoff=0.01)
+            scores = backend.score_many([f'Sentence number {i} is here.' for i in range(6)])
+        assert not any(np.isnan(scores))
+        assert server.failure_count == 2 and server.request_count == 8
+        with MockChatCompletionsServer(fail_every=1) as server:
+            backend = AsyncLLMReadabilityBackend(base_url=server.url, api_key='test', max_retries=2, backoff=0.01)
+            assert np.isnan(backend.score('Never answered.'))
+            assert server.request_count == 3
+
+    def test_rate_limiter_paces_requests_and_tokens(self):
+        """
+        After a minute's allowance is used up, requests wait for the buckets to refill
+        """
+        now = [0.0]
+        limiter = RateLimiter(requests_per_minute=60, clock=lambda: now[0])
+        assert [limiter.reserve() for _ in range(60)] == [0.0] * 60
+        assert limiter.reserve() == pytest.approx(1.0)
+        assert limiter.reserve() == pytest.approx(2.0)
+        now[0] = 10.0
+        assert limiter.reserve() == 0.0
+        limiter = RateLimiter(tokens_per_minute=6000, clock=lambda: now[0])
+        assert limiter.reserve(6000) == 0.0
+        assert limiter.reserve(100) == pytest.approx(1.0)
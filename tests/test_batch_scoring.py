@@ -0,0 +1,193 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import batch_scoring
+from feature_scripts.embedding_cache import EmbeddingStore
+from feature_scripts.run_manifest import RunManifest
+from feature_scripts.score_tables import read_feature_scores
+from helpers import make_flat_forest, SAMPLE_BODIES, NESTED_CONVERSATION, make_deep_forest, write_corpus, BATCH_FEATURES
+
+
+class TestBatchScoring:
+    def test_parallel_run_matches_serial_run(self, tmp_path):
+        """
+        A process pool produces the same rows as scoring in-process
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, make_deep_forest(40)],
+            'Conservative': [make_flat_forest(SAMPLE_BODIES), {'selftext': 'empty', 'comments': []}],
+        })
+        serial = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'serial.csv'), BATCH_FEATURES, workers=1)
+        parallel = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'parallel.csv'), BATCH_FEATURES, workers=2)
+
+        serial_df = pd.read_csv(serial).sort_values('path').reset_index(drop=True)
+        parallel_df = pd.read_csv(parallel).sort_values('path').reset_index(drop=True)
+        assert len(serial_df) == 4
+        assert set(serial_df['subreddit']) == {'AskReddit', 'Conservative'}
+        pd.testing.assert_frame_equal(serial_df, parallel_df)
+
+    def test_unreadable_files_are_skipped(self, tmp_path):
+        """
+        A broken JSON is reported and skipped without stopping the run
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION]})
+        (tmp_path / 'corpus' / 'AskReddit' / 'date_03-18-2025_time_12-37' / 'broken.json').write_text('{')
+        output = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'out.csv'), BATCH_FEATURES, workers=1)
+        assert pd.read_csv(output)['post_id'].tolist() == ['post0']
+
+    def test_coalition_is_scored_per_chunk(self, tmp_path, fake_model, monkeypatch):
+        """
+        The coalition scores of a chunk of files come from one batched call and fill the embedding cache
+        """
+        forests = [make_flat_forest(SAMPLE_BODIES), make_flat_forest(SAMPLE_BODIES[::-1]),
+                   make_flat_forest(SAMPLE_BODIES[:4])]
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': forests})
+        coalition = batch_scoring._feature_module('coalition')
+        original = coalition.get_coalition_scores
+        batches = []
+        monkeypatch.setattr(coalition, 'get_coalition_scores',
+                            lambda forests, **kwargs: batches.append(len(forests)) or original(forests, **kwargs))
+        cache = str(tmp_path / 'embeddings')
+        output = batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'out.csv'),
+                                                             ['coalition', 'onesidedness'], workers=1,
+                                                             chunksize=2, embedding_cache=cache)
+
+        scores = pd.read_csv(output).sort_values('post_id')
+        assert sorted(batches) == [1, 2]
+        np.testing.assert_allclose(scores['coalition'], [coalition.get_coalition_score(forest) for forest in forests],
+                                   equal_nan=True)
+        assert len(EmbeddingStore(cache)) == len(SAMPLE_BODIES)
+        with pytest.raises(ValueError):
+            batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'parallel.csv'), ['coalition'],
+                                                        workers=2, embedding_cache=cache)
+
+    def test_worker_initialisation_error_stops_the_run(self, tmp_path, monkeypatch):
+        """
+        A worker that cannot load its models stops a parallel run with its error instead of hanging it
+        """
+        def fail(*args):
+            raise LookupError('vader_lexicon not found')
+
+        monkeypatch.setattr(batch_scoring, '_init_worker', fail)
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION]})
+        with pytest.raises(RuntimeError, match='vader_lexicon not found'):
+            batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'out.csv'), BATCH_FEATURES, workers=2)
+
+    @pytest.mark.parametrize('features, builds', [
+        (['credibility'], True), (['credibility_subfeatures'], True), (BATCH_FEATURES, False)])
+    def test_parallel_run_builds_vocabulary_artifact(self, tmp_path, monkeypatch, features, builds):
+        """
+        A process pool computing either credibility feature shares one vocabulary artifact
+        """
+        built = []
+        monkeypatch.setattr(batch_scoring, '_build_vocabulary_artifact', lambda: built.append(True))
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION]})
+        output = batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'out.csv'), features,
+                                                             workers=2, readability_backend='local')
+        assert len(pd.read_csv(output)) == 1
+        assert built == ([True] if builds else [])
+
+    @pytest.mark.parametrize('features, preloads', [
+        (('credibility',), True), (('credibility_subfeatures',), True), (tuple(BATCH_FEATURES), False)])
+    def test_worker_preloads_credibility(self, monkeypatch, features, preloads):
+        """
+        Workers computing either credibility feature load its word lists and readability backend up front
+        """
+        credibility = batch_scoring._feature_module('credibility')
+        preloaded = []
+        monkeypatch.setattr(credibility, 'preload', preloaded.append)
+        # _init_worker sets this process's readability settings; restore them afterwards
+        monkeypatch.setattr(batch_scoring, '_readability_backend', batch_scoring._readability_backend)
+        monkeypatch.setattr(batch_scoring, '_readability_cache', batch_scoring._readability_cache)
+        batch_scoring._init_worker(features, 1, 'local')
+        assert preloaded == (['local'] if preloads else [])
+
+
+class TestResumableRuns:
+    def test_resume_only_scores_new_or_changed_files(self, tmp_path):
+        """
+        Re-running with resume skips files recorded in the manifest
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION, make_deep_forest(5)]})
+        output = str(tmp_path / 'out.csv')
+        batch_scoring.mass_calculate_feature_scores(corpus, output, BATCH_FEATURES, workers=1, resume=True)
+        assert len(pd.read_csv(output)) == 2
+
+        batch_scoring.mass_calculate_feature_scores(corpus, output, BATCH_FEATURES, workers=1, resume=True)
+        assert len(pd.read_csv(output)) == 2, "Nothing changed, so nothing is rescored"
+
+        date_dir = tmp_path / 'corpus' / 'AskReddit' / 'date_03-18-2025_time_12-37'
+        (date_dir / 'post2.json').write_text(json.dumps(make_flat_forest(SAMPLE_BODIES)))
+        (date_dir / 'post0.json').write_text(json.dumps(make_deep_forest(7)))
+        batch_scoring.mass_calculate_feature_scores(corpus, output, BATCH_FEATURES, workers=1, resume=True)
+        rows = pd.read_csv(output)
+        assert rows['post_id'].tolist()[2:] == ['post0', 'post2']
+        assert rows.drop_duplicates('path', keep='last')['onesidedness'].notna().all()
+
+    def test_manifest_tracks_features_per_file(self, tmp_path):
+        """
+        Features already done for a file are not recomputed when more are requested
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION]})
+        manifest_path = str(tmp_path / 'run.manifest.jsonl')
+        batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'first.csv'), ['onesidedness'],
+                                                    workers=1, resume=True, manifest_path=manifest_path)
+        second = batch_scoring.mass_calculate_feature_scores(corpus, str(tmp_path / 'second.csv'), BATCH_FEATURES,
+                                                             workers=1, resume=True, manifest_path=manifest_path)
+        row = pd.read_csv(second).iloc[0]
+        assert pd.isna(row['onesidedness'])
+        assert not pd.isna(row['defection'])
+        assert RunManifest(manifest_path).pending_features(row['path'], BATCH_FEATURES) == []
+
+    def test_touched_but_unchanged_file_is_skipped_with_hash(self, tmp_path):
+        """
+        With content hashing a new mtime alone does not trigger rescoring
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {'AskReddit': [NESTED_CONVERSATION]})
+        output = str(tmp_path / 'out.csv')
+        batch_scoring.mass_calculate_feature_scores(corpus, output, BATCH_FEATURES, workers=1,
+                                                    resume=True, use_hash=True)
+        path = tmp_path / 'corpus' / 'AskReddit' / 'date_03-18-2025_time_12-37' / 'post0.json'
+        os.utime(path, ns=(1, 1))
+        manifest = RunManifest(output + '.manifest.jsonl')
+        assert manifest.pending_features(str(path), BATCH_FEATURES) == BATCH_FEATURES
+        assert manifest.pending_features(str(path), BATCH_FEATURES, use_hash=True) == []
+
+
+class TestParquetOutput:
+    def test_partitioned_parquet_matches_csv(self, tmp_path):
+        """
+        Parquet output holds the same scores as CSV, typed and partitioned
+        """
+        pytest.importorskip('pyarrow')
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, make_deep_forest(6)],
+            'Conservative': [make_flat_forest(SAMPLE_BODIES)],
+        })
+        csv_path = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'out.csv'), BATCH_FEATURES, workers=1)
+        parquet_path = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'out.parquet'), BATCH_FEATURES, workers=1, output_format='parquet')
+
+        assert sorted(os.listdir(parquet_path)) == ['subreddit=AskReddit', 'subreddit=Conservative']
+        from_parquet = read_feature_scores(parquet_path).sort_values('path').reset_index(drop=True)
+        from_csv = pd.read_csv(csv_path, parse_dates=['download_date']).sort_values('path').reset_index(drop=True)
+        for column in BATCH_FEATURES:
+            assert from_parquet[column].dtype == np.float64
+            np.testing.assert_allclose(from_parquet[column], from_csv[column], equal_nan=True)
+        assert (from_parquet['download_date'] == from_csv['download_date']).all()
+
+        pruned = read_feature_scores(parquet_path, columns=['post_id', 'defection'],
+                                     filters=[('subreddit', '=', 'Conservative')])
+        assert list(pruned.columns) == ['post_id', 'defection']
+        assert len(pruned) == 1
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import pandas as pd
 import nltk, nltk.sentiment 
 from collections import defaultdict
@@ -8,7 +9,9 @@ import os
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition
 from feature_scripts.coalition import get_coalition_score, CoalitionAnalyzer
+from helpers import make_flat_forest, SAMPLE_BODIES
 
 def test_coalition_score_diverse_conversation():
         """
@@ -610,4 +613,176 @@ def test_coalition_score_too_few_comments():
     assert pd.isna(coalition_score), f"Too few comments should return a score of NaN. Got: {coalition_score}"
 
 
+class TestCoalitionModelRegistry:
+    def test_model_loaded_once_per_process(self, fake_model):
+        """
+        Analyzers and scores share one model per (model_name, device)
+        """
+        first = coalition.CoalitionAnalyzer()
+        second = coalition.CoalitionAnalyzer()
+        assert first.model is second.model
+        assert fake_model.instances == 1
+
+        coalition.get_model(device='cpu')
+        assert fake_model.instances == 2, "A different device should get its own model"
+
+    def test_warm_up_and_release(self, fake_model):
+        """
+        warm_up_model loads eagerly, release_model drops the cached copy
+        """
+        warm = coalition.warm_up_model()
+        assert coalition.get_model() is warm
+        assert coalition.release_model() == 1
+        assert coalition.get_model() is not warm
+
+
+class TestCoalitionBatching:
+    def test_batch_embeddings_split_per_thread(self, fake_model):
+        """
+        Pooled embeddings come back per thread in the original comment order
+        """
+        analyzer = coalition.CoalitionAnalyzer()
+        threads = [SAMPLE_BODIES[:3], [], SAMPLE_BODIES[3:]]
+        batched = analyzer.get_embeddings_batch(threads, batch_size=4)
+        assert len(batched) == 3
+        assert len(batched[1]) == 0
+        for texts, embeddings in zip(threads, batched):
+            if texts:
+                np.testing.assert_array_equal(embeddings, analyzer.get_embeddings(texts))
+
+    def test_batch_scores_match_single_thread_scores(self, fake_model):
+        """
+        get_coalition_scores gives the same values as get_coalition_score
+        """
+        forests = [
+            make_flat_forest(SAMPLE_BODIES),
+            make_flat_forest(SAMPLE_BODIES[:4]),
+            make_flat_forest(SAMPLE_BODIES[::-1]),
+        ]
+        expected = [get_coalition_score(forest) for forest in forests]
+        batched = coalition.get_coalition_scores(forests, threads_per_pass=2)
+        np.testing.assert_allclose(batched, expected, equal_nan=True)
+
+
+class TestVectorisedCoalitionScores:
+    @pytest.mark.parametrize('dtype', [np.float32, np.float64])
+    @pytest.mark.parametrize('n_clusters', [1, 2, 5])
+    def test_matches_per_comment_scores(self, dtype, n_clusters):
+        """
+        calculate_comment_scores gives the same values as calculate_comment_score for every comment
+        """
+        analyzer = coalition.CoalitionAnalyzer.__new__(coalition.CoalitionAnalyzer)
+        rng = np.random.default_rng(n_clusters)
+        embeddings = rng.normal(size=(60, 24)).astype(dtype)
+        embeddings[0] = 0  # a zero vector has similarity 0 with everything
+        cluster_labels = rng.permutation(np.arange(60) % n_clusters)
+        centroids = analyzer.calculate_coalition_centroids(embeddings, cluster_labels)
+
+        expected = [analyzer.calculate_comment_score(embedding, centroids, label)
+                    for embedding, label in zip(embeddings, cluster_labels)]
+        scores = analyzer.calculate_comment_scores(embeddings, centroids, cluster_labels)
+        assert scores.shape == (60,)
+        np.testing.assert_allclose(scores, expected, rtol=1e-6, atol=1e-6, equal_nan=True)
+
+    @pytest.mark.parametrize('method', ['sum', 'blocked'])
+    def test_mean_pairwise_similarity_matches_full_matrix(self, method):
+        """
+        The O(n*d) and blocked means equal the mean of the full cosine similarity matrix
+        """
+        from sklearn.metrics.pairwise import cosine_similarity
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(loc=0.2, size=(257, 32)).astype(np.float32)
+        embeddings[3] = 0
+        # A tiny ceiling forces many one-row blocks
+        mean = coalition.mean_pairwise_similarity(embeddings, method, max_block_bytes=100)
+        assert mean == pytest.approx(float(np.mean(cosine_similarity(embeddings))), abs=1e-6)
+
+    def test_single_coalition_is_logged_not_printed(self, caplog, capsys):
+        """
+        Comment scores that are NaN (one coalition) give zero diversity and a logged warning, not printed output
+        """
+        analyzer = coalition.CoalitionAnalyzer.__new__(coalition.CoalitionAnalyzer)
+        embeddings = np.random.default_rng(0).normal(size=(12, 8)).astype(np.float32)
+        with caplog.at_level('WARNING', logger=coalition.__name__):
+            results = analyzer.score_coalitions(embeddings, np.zeros(12, dtype=int))
+        assert results['overall_coalition_diversity'] == 0.0
+        assert 'NaN in comment scores' in caplog.text
+        assert capsys.readouterr().out == ''
+
+
+def make_blobs(n_per_cluster, n_clusters=3, dim=16, seed=0):
+    """
+    Well separated clusters of embeddings, with their true labels
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)) * 3
+    embeddings = np.concatenate([center + rng.normal(size=(n_per_cluster, dim)) for center in centers])
+    return embeddings.astype(np.float32), np.repeat(np.arange(n_clusters), n_per_cluster)
+
+
+class TestClusteringBackends:
+    def test_auto_selects_by_thread_size(self):
+        """
+        Small threads keep full KMeans; large ones get the bounded-time backends
+        """
+        assert coalition.select_clustering_backend(10) == 'kmeans'
+        assert coalition.select_clustering_backend(coalition.MINIBATCH_MIN_COMMENTS) == 'minibatch'
+        assert coalition.select_clustering_backend(coalition.SPHERICAL_MIN_COMMENTS) == 'spherical'
+        assert coalition.select_clustering_backend(10, 'spherical') == 'spherical'
+        with pytest.raises(ValueError):
+            coalition.select_clustering_backend(10, 'dbscan')
+
+    def test_small_threads_keep_kmeans_labels(self):
+        """
+        'auto' clusters a small thread exactly like KMeans(random_state=42)
+        """
+        from sklearn.cluster import KMeans
+        embeddings, _ = make_blobs(20)
+        analyzer = coalition.CoalitionAnalyzer.__new__(coalition.CoalitionAnalyzer)
+        analyzer.clustering = 'auto'
+        expected = KMeans(n_clusters=3, random_state=42).fit_predict(embeddings)
+        np.testing.assert_array_equal(analyzer.cluster_comments(embeddings, 3), expected)
+
+    @pytest.mark.parametrize('backend', ['minibatch', 'spherical'])
+    def test_fast_backends_recover_clusters(self, backend):
+        """
+        MiniBatchKMeans and spherical k-means find well separated coalitions
+        """
+        from sklearn.metrics import adjusted_rand_score
+        embeddings, truth = make_blobs(200)
+        analyzer = coalition.CoalitionAnalyzer.__new__(coalition.CoalitionAnalyzer)
+        analyzer.clustering = backend
+        labels = analyzer.cluster_comments(embeddings, 3)
+        assert sorted(np.unique(labels)) == [0, 1, 2]
+        assert adjusted_rand_score(truth, labels) > 0.95
+
+
+class TestClusterSweep:
+    @pytest.mark.parametrize('n_clusters', [2, 3, 5])
+    def test_sweep_finds_number_of_coalitions(self, n_clusters):
+        """
+        The sweep picks the true number of well separated coalitions, and its first k
+        scores the same as analyze_thread
+        """
+        embeddings, _ = make_blobs(40, n_clusters=n_clusters, seed=n_clusters)
+        analyzer = coalition.CoalitionAnalyzer.__new__(coalition.CoalitionAnalyzer)
+        analyzer.clustering = 'auto'
+        comments = ['comment'] * len(embeddings)
+        results = analyzer.sweep_clusters(comments, range(2, 8), embeddings=embeddings)
+        assert results['chosen_k'] == n_clusters
+        assert sorted(results['diversity_by_k']) == list(range(2, 8))
+        single = analyzer.analyze_thread(comments, 2, embeddings=embeddings)
+        assert results['diversity_by_k'][2] == pytest.approx(float(single['overall_coalition_diversity']))
+
+    def test_sweep_feature_columns(self, fake_model):
+        """
+        get_coalition_sweep returns one row entry per k, and NaNs for short threads
+        """
+        row = coalition.get_coalition_sweep(make_flat_forest(SAMPLE_BODIES), k_values=[2, 3, 4])
+        assert set(row) == {'coalition_best_k', 'coalition_best_diversity',
+                            'coalition_diversity_k2', 'coalition_diversity_k3', 'coalition_diversity_k4'}
+        if row['coalition_best_k'] is not None:
+            assert row['coalition_best_diversity'] == row[f"coalition_diversity_k{row['coalition_best_k']}"]
 
+        short = coalition.get_coalition_sweep(make_flat_forest(SAMPLE_BODIES[:3]), k_values=[2, 3])
+        assert short['coalition_best_k'] is None and np.isnan(short['coalition_diversity_k3'])
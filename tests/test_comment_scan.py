@@ -0,0 +1,69 @@
+import re
+
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility, spelling
+from feature_scripts.spelling import Vocabulary, count_misspellings
+from feature_scripts.comment_scan import scan_comments
+from helpers import FLESCH_KINCAID_COMPARISON
+
+
+SCAN_BODIES = [
+    'See https://www.example.com/page, thanks u/someone!',
+    'u/ alone, u/.dot and U/Upper are no references; hey u/\nnewline is',
+    'Visit WWW.EXAMPLE.COM or http://x.org... awww. cute',
+    "I can't BELIEVE it's İstanbul, not Constantinople. Gonna say CANNOT",
+    '',
+    '   spaced\tout\u00a0words\u2003here\x1c  ',
+    'ends with u/',
+    'nul\x00inside u/\x00name',
+]
+
+
+def reference_text_subfeatures(body):
+    """
+    Per-comment word count, link and reference flags and alphabetic tokens, as credibility computed them one by one
+    """
+    return (len(body.split()), any(token in body for token in ['www.', '.com', 'http://', 'https://']),
+            re.search(r'u/([^/,.!? ]+)', body) is not None, spelling.alpha_tokens(body.lower()))
+
+
+class TestCommentScan:
+    @pytest.mark.parametrize('bodies', [
+        SCAN_BODIES,
+        [body for body in pd.read_csv(FLESCH_KINCAID_COMPARISON)['body']],
+        [],
+    ])
+    def test_matches_per_comment_subfeatures(self, bodies):
+        """
+        The bulk scan gives every comment the same word count, link and reference flags and tokens as the per-comment checks
+        """
+        scan = scan_comments(bodies)
+        expected = [reference_text_subfeatures(body) for body in bodies]
+        assert len(scan) == len(bodies)
+        assert list(zip(scan.word_counts.tolist(), scan.has_links.tolist(), scan.has_references.tolist(),
+                        scan.alpha_tokens)) == expected
+        vocabulary = Vocabulary.from_words(['the', 'it', 'is', 'not', 'can', 'say', 'see', 'thanks'])
+        assert scan.misspellings(vocabulary).tolist() == \
+            count_misspellings([body.lower() for body in bodies], vocabulary).tolist()
+
+    def test_credibility_subfeatures_unchanged(self):
+        """
+        Credibility's reference, length, link and misspelling subfeatures match the per-comment computation
+        """
+        thread = [{'body': body, 'author': f'user{i % 3}', 'score': i, 'replies': []}
+                  for i, body in enumerate(SCAN_BODIES + ['[deleted]'])]
+        valid_words = {'the', 'it', 'is', 'not', 'can', 'say'}
+        subfeatures = credibility.get_credibility_subfeatures(thread, valid_words, readability_backend='local')
+        rows = [reference_text_subfeatures(body) for body in SCAN_BODIES]
+        words = sum(row[0] for row in rows)
+        assert subfeatures['comment_has_author_references_proportion'] == sum(row[2] for row in rows) / len(rows)
+        assert subfeatures['comment_length_mean'] == words / len(rows)
+        assert subfeatures['comment_has_links_proportion'] == sum(row[1] for row in rows) / len(rows)
+        assert subfeatures['misspelled_words_proportion'] == \
+            sum(token not in valid_words for row in rows for token in row[3]) / words
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition
+from feature_scripts.comment_thread import FlatThread, flatten_thread
+from feature_scripts.defection import get_defection_score
+from feature_scripts.onesidedness import get_onesidedness_score
+from feature_scripts.resilience import get_resilience_score
+from helpers import NESTED_CONVERSATION, make_deep_forest
+
+
+class TestCommentThread:
+    def test_flatten_is_depth_first(self):
+        """
+        Comments are flattened in depth-first order with parent indices and depths
+        """
+        thread = flatten_thread(NESTED_CONVERSATION)
+        assert thread.selftext == 'Initial positive post'
+        assert thread.authors == ['user1', 'user2', 'user1', 'user3', 'user4']
+        assert thread.parents.tolist() == [-1, 0, 1, 0, -1]
+        assert thread.depths.tolist() == [0, 1, 2, 1, 0]
+        assert thread.scores.tolist() == [3, -1, 2, 5, 0]
+        assert thread.child_counts.tolist() == [2, 1, 0, 0, 0]
+        assert thread.branch_slices() == [slice(0, 4), slice(4, 5)]
+
+    def test_features_accept_flat_thread(self):
+        """
+        Every feature gives the same result for the nested JSON and the flattened thread
+        """
+        thread = flatten_thread(NESTED_CONVERSATION)
+        assert isinstance(thread, FlatThread)
+        assert get_defection_score(thread) == get_defection_score(NESTED_CONVERSATION)
+        assert get_onesidedness_score(thread) == get_onesidedness_score(NESTED_CONVERSATION)
+        assert get_resilience_score(thread) == get_resilience_score(NESTED_CONVERSATION)
+        assert coalition.extract_comments_from_forest(thread) == [
+            'Great point, I agree', 'I strongly disagree with this', 'Why are you so negative?',
+            'Me too, very insightful', 'Terrible idea, awful and wrong']
+
+    def test_very_deep_thread_does_not_hit_recursion_limit(self):
+        """
+        Reply chains deeper than the recursion limit can be flattened and scored
+        """
+        forest = make_deep_forest(5000)
+        thread = flatten_thread(forest)
+        assert len(thread) == 5000
+        assert thread.depths[-1] == 4999
+        assert get_onesidedness_score(thread) == get_onesidedness_score(forest)
+        assert 0 <= get_defection_score(thread) <= 1
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import batch_scoring
+from feature_scripts.comment_thread import flatten_thread
+from feature_scripts.corpus_store import CorpusStore, build_corpus_store, is_corpus_store
+from helpers import make_flat_forest, SAMPLE_BODIES, NESTED_CONVERSATION, make_deep_forest, write_corpus, BATCH_FEATURES
+
+
+class TestCorpusStore:
+    def test_threads_roundtrip_through_store(self, tmp_path):
+        """
+        Threads read back from the store equal the flattened JSONs, including missing fields
+        """
+        odd_conversation = {
+            'title': 'Unicode and gaps',
+            'comments': [
+                {'body': 'caf\u00e9 \U0001F600 na\u00efve', 'author': 'ren\u00e9', 'score': 7,
+                 'replies': [{'author': 'ghost', 'replies': [{'body': '', 'score': -3}]}]},
+                {'body': 'lone surrogate \ud83d here', 'author': 'ren\u00e9'},
+            ]
+        }
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, odd_conversation],
+            'Conservative': [{'selftext': 'nobody replied', 'comments': []}],
+        })
+        store_path = str(tmp_path / 'store')
+        assert build_corpus_store(corpus, store_path) == 3
+        assert is_corpus_store(store_path) and not is_corpus_store(corpus)
+
+        store = CorpusStore(store_path)
+        metas = batch_scoring.gather_meta_data(corpus)
+        assert [meta for meta, _ in store] == metas
+        for meta, thread in store:
+            with open(meta['path']) as file:
+                expected = flatten_thread(json.load(file))
+            assert thread.selftext == expected.selftext
+            assert thread.bodies == expected.bodies
+            assert thread.authors == expected.authors
+            for column in ('scores', 'parents', 'depths'):
+                np.testing.assert_array_equal(getattr(thread, column), getattr(expected, column))
+
+    def test_batch_scoring_reads_store(self, tmp_path):
+        """
+        Scoring a corpus store gives the same rows as scoring the JSON tree
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, make_deep_forest(8)],
+            'Conservative': [make_flat_forest(SAMPLE_BODIES)],
+        })
+        store_path = str(tmp_path / 'store')
+        build_corpus_store(corpus, store_path)
+        from_json = batch_scoring.mass_calculate_feature_scores(
+            corpus, str(tmp_path / 'json.csv'), BATCH_FEATURES, workers=1)
+        from_store = batch_scoring.mass_calculate_feature_scores(
+            store_path, str(tmp_path / 'store.csv'), BATCH_FEATURES, workers=2)
+        pd.testing.assert_frame_equal(
+            pd.read_csv(from_json).sort_values('path').reset_index(drop=True),
+            pd.read_csv(from_store).sort_values('path').reset_index(drop=True))
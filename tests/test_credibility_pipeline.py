@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility
+from feature_scripts.comment_thread import as_flat_thread
+from feature_scripts.score_tables import read_feature_scores
+from feature_scripts.credibility_pipeline import CREDIBILITY_WEIGHTS, CredibilityNormalizer, mass_calculate_credibility_scores, normalize_credibility_table
+from helpers import make_flat_forest, SAMPLE_BODIES, NESTED_CONVERSATION, make_deep_forest, write_corpus
+
+
+class TestCredibilityPipeline:
+    @staticmethod
+    def fake_subfeatures(comment_forest, **kwargs):
+        """ Cheap stand-in for get_credibility_subfeatures (no tokenizer or LLM calls). """
+        thread = as_flat_thread(comment_forest)
+        bodies = [body for body in thread.bodies if body is not None]
+        words = sum(len(body.split()) for body in bodies)
+        return {
+            'comment_has_author_references_proportion': np.mean(['u/' in body for body in bodies]) if bodies else pd.NA,
+            'vote_score_mean': float(np.mean(thread.scores)) if len(thread) else pd.NA,
+            'comments_per_author': len(bodies) / max(1, len(set(thread.authors))),
+            'comment_length_mean': words / len(bodies) if bodies else pd.NA,
+            'comment_has_links_proportion': np.mean(['http' in body for body in bodies]) if bodies else pd.NA,
+            'misspelled_words_proportion': 0.1,
+            'readability_mean': pd.NA,  # as when no comment could be scored
+            'total_word_count': words,
+            'total_comments': len(bodies),
+            'total_coments_readability_scorable': 0,
+        }
+
+    @pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+    def test_two_phase_scores_are_standardised(self, tmp_path, monkeypatch, output_format):
+        """
+        Streaming statistics from the first phase give the same scores as statistics of the
+        whole stored table, and equal the signed sum of pandas z-scores
+        """
+        monkeypatch.setattr(credibility, 'get_credibility_subfeatures', self.fake_subfeatures)
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, make_deep_forest(5), make_flat_forest(SAMPLE_BODIES)],
+            'Conservative': [make_flat_forest(SAMPLE_BODIES[:4]), {'selftext': 'empty', 'comments': []}],
+        })
+        subfeatures = str(tmp_path / f'subfeatures.{output_format}')
+        streamed = mass_calculate_credibility_scores(corpus, subfeatures, str(tmp_path / f'streamed.{output_format}'),
+                                                     workers=1, output_format=output_format,
+                                                     readability_backend='local')
+        from_table = normalize_credibility_table(subfeatures, str(tmp_path / f'from_table.{output_format}'),
+                                                 output_format, chunksize=2)
+
+        def load(path):
+            df = pd.read_csv(path) if output_format == 'csv' else read_feature_scores(path)
+            return df.sort_values('path').reset_index(drop=True)
+
+        streamed, from_table, table = load(streamed), load(from_table), load(subfeatures)
+        np.testing.assert_allclose(streamed['credibility'], from_table['credibility'], equal_nan=True)
+
+        expected = sum(weight * ((table[name] - table[name].mean()) / table[name].std(ddof=0)).fillna(0)
+                       for name, weight in CREDIBILITY_WEIGHTS.items() if table[name].notna().any())
+        expected[table[list(CREDIBILITY_WEIGHTS)].isna().all(axis=1)] = np.nan
+        np.testing.assert_allclose(streamed['credibility'], expected, atol=1e-9, equal_nan=True)
+
+    def test_normalizers_merge(self):
+        """
+        Normalizers filled from separate parts of a table merge into the whole-table statistics
+        """
+        rng = np.random.default_rng(0)
+        rows = pd.DataFrame({name: rng.normal(size=40) for name in CREDIBILITY_WEIGHTS})
+        whole = CredibilityNormalizer().update(rows)
+        merged = CredibilityNormalizer().update(rows[:15]).merge(CredibilityNormalizer().update(rows[15:]))
+        np.testing.assert_allclose(merged.score(rows), whole.score(rows))
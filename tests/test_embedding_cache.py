@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition
+from feature_scripts.embedding_cache import EmbeddingStore, embedding_key
+from helpers import SAMPLE_BODIES
+
+
+class TestEmbeddingStore:
+    def test_roundtrip_and_persistence(self, tmp_path):
+        """
+        Stored embeddings are found again, also after reopening the store
+        """
+        vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+        with EmbeddingStore(str(tmp_path), capacity=10) as store:
+            store.put_many('model', ['a', 'b', 'c'], vectors)
+        reopened = EmbeddingStore(str(tmp_path))
+        embeddings, found = reopened.get_many('model', ['c', 'missing', 'a'])
+        assert found.tolist() == [True, False, True]
+        np.testing.assert_array_equal(embeddings[[0, 2]], vectors[[2, 0]])
+        assert reopened.stats()['hit_rate'] == pytest.approx(2 / 3)
+
+        _, found = reopened.get_many('other-model', ['a'])
+        assert not found.any(), "Keys must include the model name"
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        """
+        A full store evicts the entries that were used longest ago
+        """
+        store = EmbeddingStore(str(tmp_path), capacity=3, evict_fraction=0.0)
+        store.put_many('model', ['a', 'b', 'c'], np.eye(3, dtype=np.float32))
+        store.get_many('model', ['a'])
+        store.put_many('model', ['d'], np.ones((1, 3), dtype=np.float32))
+        _, found = store.get_many('model', ['a', 'b', 'c', 'd'])
+        assert found.tolist() == [True, False, True, True]
+        assert len(store) == 3
+        assert store.stats()['evictions'] == 1
+
+    def test_keys_ending_in_nul_bytes(self, tmp_path):
+        """
+        Digests ending in a NUL byte survive reopening the store and can be evicted
+        """
+        texts = ['t413', 't474', 'a']
+        assert [embedding_key('model', text).endswith(b'\0') for text in texts] == [True, True, False]
+        vectors = np.eye(3, dtype=np.float32)
+        with EmbeddingStore(str(tmp_path), capacity=3, evict_fraction=0.0) as store:
+            store.put_many('model', texts, vectors)
+        reopened = EmbeddingStore(str(tmp_path))
+        embeddings, found = reopened.get_many('model', texts)
+        assert found.all()
+        np.testing.assert_array_equal(embeddings, vectors)
+
+        reopened.get_many('model', ['a'])
+        reopened.put_many('model', ['d', 'e'], np.ones((2, 3), dtype=np.float32))
+        _, found = reopened.get_many('model', texts + ['d', 'e'])
+        assert found.tolist() == [False, False, True, True, True]
+
+    def test_reads_keys_saved_as_strings(self, tmp_path):
+        """
+        Stores whose keys.npy was written as 'S20' strings keep their NUL-terminated keys
+        """
+        texts = ['t413', 'a']
+        with EmbeddingStore(str(tmp_path), capacity=4) as store:
+            store.put_many('model', texts, np.eye(2, dtype=np.float32))
+        keys = np.load(tmp_path / 'keys.npy')
+        np.save(tmp_path / 'keys.npy', keys.view('S20').ravel())
+        _, found = EmbeddingStore(str(tmp_path)).get_many('model', texts)
+        assert found.all()
+
+    def test_analyzer_only_encodes_cache_misses(self, fake_model, tmp_path, monkeypatch):
+        """
+        CoalitionAnalyzer reuses cached embeddings and gives the same result
+        """
+        store = EmbeddingStore(str(tmp_path))
+        analyzer = coalition.CoalitionAnalyzer(embedding_cache=store)
+        first = analyzer.get_embeddings(SAMPLE_BODIES[:6])
+
+        encoded = []
+        original_encode = analyzer.model.encode
+        monkeypatch.setattr(analyzer.model, 'encode',
+                            lambda texts, **kwargs: encoded.extend(texts) or original_encode(texts, **kwargs))
+        second = analyzer.get_embeddings(SAMPLE_BODIES[3:9])
+        assert encoded == SAMPLE_BODIES[6:9]
+        np.testing.assert_array_equal(second[:3], first[3:6])
+        np.testing.assert_array_equal(second, original_encode(SAMPLE_BODIES[3:9]))
@@ -0,0 +1,43 @@
+import subprocess
+
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility
+
+
+class TestLazyImports:
+    def test_import_loads_no_heavy_dependencies(self):
+        """
+        Importing the feature modules loads no model library, NLTK, OpenAI client or word list, and is quick
+        """
+        heavy = ['sentence_transformers', 'torch', 'sklearn', 'openai', 'nltk', 'matplotlib', 'dotenv']
+        code = ('import sys, time; start = time.perf_counter(); '
+                'from feature_scripts import credibility, coalition, sentiment, defection, resilience, batch_scoring; '
+                'elapsed = time.perf_counter() - start; '
+                f'print(elapsed, [name for name in {heavy!r} if name in sys.modules], '
+                'credibility._client is None and credibility._valid_words is None)')
+        env = {key: value for key, value in os.environ.items() if key != 'OPENAI_API_KEY'}
+        output = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                                env=env, capture_output=True, text=True, check=True).stdout.split(' ', 1)
+        assert output[1].strip() == '[] True'
+        assert float(output[0]) < 2.0
+
+    def test_valid_words_loaded_on_first_use(self, monkeypatch):
+        """
+        VALID_WORDS is read on first access, tolerating missing files, and then shared
+        """
+        monkeypatch.setattr(credibility, '_valid_words', None)
+        monkeypatch.setattr(credibility, '_valid_vocabulary', None)
+        monkeypatch.setattr(credibility, 'VALID_WORD_FILES', [os.path.join('no', 'such', 'words.txt')])
+        with pytest.warns(UserWarning):
+            assert credibility.VALID_WORDS == set()
+        assert credibility.VALID_WORDS is credibility.get_valid_words()
+        loaded = []
+        monkeypatch.setattr(credibility, 'load_punkt', lambda: loaded.append(True))
+        credibility.preload('local')
+        assert len(credibility.get_valid_vocabulary()) == 0
+        assert loaded == [True], "preload loads the word tokenizer's punkt data too"
@@ -0,0 +1,196 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition, credibility, sentiment, batch_scoring
+from feature_scripts.coalition import get_coalition_score
+from feature_scripts.comment_thread import flatten_thread
+from feature_scripts.resilience import get_resilience_score
+from feature_scripts.live_scoring import LiveThread
+from helpers import FakeSentenceTransformer, SAMPLE_BODIES, CountingBackend, NESTED_CONVERSATION
+
+
+LIVE_BODIES = ['Great point, I agree', 'I strongly disagree with this', 'Terrible idea, awful and wrong',
+               'Why are you so negative?', 'Me too, very insightful', 'ok', 'I love this, wonderful',
+               'This is horrible and stupid', 'Thanks u/user1, see www.example.com', None, '[deleted]'] + SAMPLE_BODIES
+
+
+def make_arrivals(count, seed=0):
+    """
+    Comments in the order they arrive, each with the arrival index of its parent (-1 for top-level)
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = []
+    for i in range(count):
+        parent = -1 if i == 0 or rng.random() < 0.25 else int(rng.integers(i))
+        body = LIVE_BODIES[int(rng.integers(len(LIVE_BODIES)))]
+        arrivals.append((parent, {'body': body, 'author': f'user{int(rng.integers(6))}',
+                                  'score': int(rng.integers(-3, 10))}))
+    return arrivals
+
+
+def nest_arrivals(arrivals, selftext=None):
+    """
+    Comment forest of arrived comments, replies in the order they arrived
+    """
+    nodes = [dict(comment, replies=[]) for _, comment in arrivals]
+    top_level = []
+    for (parent, _), node in zip(arrivals, nodes):
+        (top_level if parent < 0 else nodes[parent]['replies']).append(node)
+    return top_level if selftext is None else {'selftext': selftext, 'comments': top_level}
+
+
+def grow_live_thread(arrivals, initial, batch_size, **kwargs):
+    """
+    Start a LiveThread from the first arrivals and add the rest in batches, yielding it and the forest after each step
+    """
+    # The initial forest is flattened in pre-order; later comments are appended in arrival order
+    children = defaultdict(list)
+    for arrival, (parent, _) in enumerate(arrivals[:initial]):
+        children[parent].append(arrival)
+    index, stack = {}, children[-1][::-1]
+    while stack:
+        arrival = stack.pop()
+        index[arrival] = len(index)
+        stack.extend(children[arrival][::-1])
+
+    selftext = kwargs.pop('selftext', None)
+    live = LiveThread(nest_arrivals(arrivals[:initial], selftext), **kwargs)
+    yield live, nest_arrivals(arrivals[:initial], selftext)
+    for start in range(initial, len(arrivals), batch_size):
+        batch = []
+        for arrival in range(start, min(start + batch_size, len(arrivals))):
+            parent, comment = arrivals[arrival]
+            index[arrival] = len(live) + len(batch)
+            batch.append(dict(comment, parent=index[parent] if parent >= 0 else -1))
+        live.add_comments(batch)
+        yield live, nest_arrivals(arrivals[:start + len(batch)], selftext)
+
+
+def assert_scores_match(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name, value in expected.items():
+        if pd.isna(value):
+            assert pd.isna(actual[name]), name
+        else:
+            assert actual[name] == pytest.approx(value), name
+
+
+class TestLiveScoring:
+    @pytest.mark.parametrize('selftext', [None, 'What a wonderful post'])
+    def test_scores_match_from_scratch(self, selftext):
+        """
+        After every batch of new comments, the live scores equal scoring the grown forest from scratch
+        """
+        valid_words = {'i', 'agree', 'this', 'is', 'and', 'the', 'great', 'point', 'ok'}
+        arrivals = make_arrivals(120, seed=1)
+        features = ['onesidedness', 'defection', 'resilience', 'credibility', 'credibility_subfeatures']
+        resilience_scores = []
+        for live, forest in grow_live_thread(arrivals, 30, 13, selftext=selftext, features=features,
+                                             readability_backend='local', valid_words=valid_words):
+            expected = batch_scoring.calculate_feature_scores(forest, ['onesidedness', 'defection', 'resilience'])
+            subfeatures = credibility.get_credibility_subfeatures(forest, valid_words, readability_backend='local')
+            expected['credibility'] = credibility.combine_credibility_subfeatures(subfeatures)
+            expected.update(subfeatures)
+            assert_scores_match(live.scores(), expected)
+            resilience_scores.append(expected['resilience'])
+        assert not all(pd.isna(score) for score in resilience_scores)
+
+    def test_only_new_comments_are_processed(self, monkeypatch):
+        """
+        Adding comments runs sentiment and readability only for the new comments
+        """
+        analyzer = sentiment.get_sentiment_analyzer()
+        scored = []
+        original = analyzer.polarity_scores
+        monkeypatch.setattr(analyzer, 'polarity_scores', lambda text: scored.append(text) or original(text))
+        backend = CountingBackend()
+        live = LiveThread(NESTED_CONVERSATION, features=['defection', 'resilience', 'credibility'],
+                          readability_backend=backend)
+        scored.clear()
+        backend.scored.clear()
+
+        new = [{'body': 'Fair enough, thanks', 'author': 'user5', 'score': 1, 'parent': 2},
+               {'body': 'Still a dreadful plan', 'author': 'user4', 'score': 0, 'parent': 4},
+               {'body': 'Agreed with both of you', 'author': 'user1', 'score': 2, 'parent': 5}]
+        live.add_comments(new)
+        assert sorted(scored) == sorted(comment['body'] for comment in new)
+        assert backend.scored == [comment['body'] for comment in new]
+
+    def test_append_comments(self):
+        """
+        Appended replies get the next indices; in_preorder gives the flattening of the grown forest
+        """
+        thread = flatten_thread(NESTED_CONVERSATION)
+        thread.append_comments([{'body': 'Why not?', 'author': 'user5', 'score': 1, 'parent': 4},
+                                {'body': 'Because', 'author': 'user4', 'parent': 5}])
+        assert thread.is_preorder and thread.branch_slices() == [slice(0, 4), slice(4, 7)]
+
+        indices = thread.append_comments([{'body': 'Late reply', 'author': 'user2', 'score': 4, 'parent': 0},
+                                          {'body': 'New thread', 'author': 'user6', 'score': 0}])
+        assert indices.tolist() == [7, 8]
+        assert thread.parents.tolist() == [-1, 0, 1, 0, -1, 4, 5, 0, -1]
+        assert thread.depths.tolist() == [0, 1, 2, 1, 0, 1, 2, 1, 0]
+        assert not thread.is_preorder
+        with pytest.raises(ValueError):
+            thread.branch_slices()
+
+        grown = flatten_thread({'selftext': NESTED_CONVERSATION['selftext'], 'comments': [
+            dict(NESTED_CONVERSATION['comments'][0], replies=NESTED_CONVERSATION['comments'][0]['replies'] + [
+                {'body': 'Late reply', 'author': 'user2', 'score': 4}]),
+            dict(NESTED_CONVERSATION['comments'][1], replies=[
+                {'body': 'Why not?', 'author': 'user5', 'score': 1,
+                 'replies': [{'body': 'Because', 'author': 'user4'}]}]),
+            {'body': 'New thread', 'author': 'user6', 'score': 0}]})
+        in_preorder = thread.in_preorder()
+        assert in_preorder.bodies == grown.bodies
+        assert in_preorder.authors == grown.authors
+        assert in_preorder.scores.tolist() == grown.scores.tolist()
+        assert in_preorder.parents.tolist() == grown.parents.tolist()
+        assert in_preorder.depths.tolist() == grown.depths.tolist()
+        assert get_resilience_score(thread) == get_resilience_score(grown)
+
+        with pytest.raises(ValueError):
+            thread.append_comments([{'body': 'Orphan', 'author': 'user7', 'parent': 9}])
+
+    def test_coalition_reclustered_matches_from_scratch(self, fake_model):
+        """
+        Reclustering on every score gives get_coalition_score of the grown forest
+        """
+        arrivals = make_arrivals(80, seed=2)
+        for live, forest in grow_live_thread(arrivals, 8, 9, features=['coalition'], recluster_growth=1):
+            expected = get_coalition_score(forest)
+            if pd.isna(expected):
+                assert pd.isna(live.scores()['coalition'])
+            else:
+                assert live.scores()['coalition'] == pytest.approx(expected, abs=1e-5)
+
+    def test_coalition_assigns_new_comments_between_reclusterings(self, fake_model, monkeypatch):
+        """
+        Between reclusterings new comments join the nearest coalition and only they are embedded
+        """
+        encoded = []
+        original = FakeSentenceTransformer.encode
+        monkeypatch.setattr(FakeSentenceTransformer, 'encode',
+                            lambda self, texts, **kwargs: encoded.extend(texts) or original(self, texts, **kwargs))
+        arrivals = make_arrivals(60, seed=3)
+        steps = grow_live_thread(arrivals, 30, 10, features=['coalition'], recluster_growth=10)
+        live, _ = next(steps)
+        live.scores()
+        state = live.coalition
+        clustered = list(state.labels)
+        encoded.clear()
+        for live, forest in steps:
+            score = live.scores()['coalition']
+            assert state.labels[:len(clustered)] == clustered
+            assert len(state.labels) == len(state.comments) == len(state.embeddings)
+            expected = coalition.CoalitionAnalyzer().score_coalitions(state.embeddings, np.array(state.labels))
+            assert score == pytest.approx(float(expected['overall_coalition_diversity']), abs=1e-5)
+        new_bodies = [comment['body'] for _, comment in arrivals[30:] if comment['body'] is not None]
+        assert encoded == new_bodies
@@ -0,0 +1,63 @@
+import json
+import re
+from datetime import datetime
+
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts.metadata_index import MetadataIndex, iter_meta_data
+from helpers import make_flat_forest, SAMPLE_BODIES, NESTED_CONVERSATION, make_deep_forest, write_corpus
+
+
+class TestMetadataIndex:
+    def test_matches_regex_walk(self, tmp_path):
+        """
+        The index yields the same metadata as the original os.walk + regex scan
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION, make_deep_forest(3)],
+            'Conservative': [make_flat_forest(SAMPLE_BODIES)],
+        })
+        (tmp_path / 'corpus' / 'AskReddit' / 'date_03-18-2025_time_12-37' / 'notes.txt').write_text('skip me')
+        expected = []
+        for root, _, files in os.walk(corpus):
+            for file in files:
+                if file.endswith('.json'):
+                    subreddit, date_string = re.match(re.escape(corpus) + '/(.+)/(.+)', root).groups()
+                    expected.append({'path': os.path.join(root, file), 'subreddit': subreddit,
+                                     'download_date': datetime.strptime(date_string, 'date_%m-%d-%Y_time_%H-%M'),
+                                     'post_id': file[:-len('.json')]})
+        key = lambda meta: meta['path']
+        assert sorted(iter_meta_data(corpus), key=key) == sorted(expected, key=key)
+
+    def test_incremental_updates(self, tmp_path):
+        """
+        A persisted index only relists changed date directories and drops deleted ones
+        """
+        corpus = write_corpus(tmp_path / 'corpus', {
+            'AskReddit': [NESTED_CONVERSATION],
+            'Conservative': [NESTED_CONVERSATION, NESTED_CONVERSATION],
+        })
+        index_path = str(tmp_path / 'index.json')
+        index = MetadataIndex(corpus, index_path)
+        assert len(list(index.entries())) == 3 and index.rescanned_dirs == 2
+
+        index = MetadataIndex(corpus, index_path)
+        entries = list(index.entries())
+        assert len(entries) == 3 and index.rescanned_dirs == 0
+        assert {entry['size'] for entry in entries} == {len(json.dumps(NESTED_CONVERSATION))}
+
+        new_dir = tmp_path / 'corpus' / 'AskReddit' / 'date_03-19-2025_time_08-00'
+        new_dir.mkdir()
+        (new_dir / 'late.json').write_text(json.dumps(NESTED_CONVERSATION))
+        for path in (tmp_path / 'corpus' / 'Conservative').rglob('*.json'):
+            path.unlink()
+        (tmp_path / 'corpus' / 'Conservative' / 'date_03-18-2025_time_12-37').rmdir()
+
+        index = MetadataIndex(corpus, index_path)
+        entries = list(index.entries())
+        assert index.rescanned_dirs == 1
+        assert sorted(entry['post_id'] for entry in entries) == ['late', 'post0']
+        assert len(MetadataIndex(corpus, index_path).date_dirs) == 2
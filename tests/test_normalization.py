@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import coalition
+from feature_scripts.coalition import get_coalition_score
+from feature_scripts.normalization import make_reducer, merge_reducers, normalize_scores
+from helpers import make_flat_forest, SAMPLE_BODIES
+
+
+class TestNormalization:
+    @pytest.mark.parametrize('method', ['minmax', 'quantile'])
+    def test_split_runs_match_serial_run(self, method):
+        """
+        Reducers filled per chunk and merged normalise exactly like one reducer over all scores
+        """
+        rng = np.random.default_rng(0)
+        scores = rng.normal(size=500)
+        scores[::17] = np.nan
+        serial = normalize_scores(scores, method)
+
+        chunks = np.array_split(rng.permutation(scores), 7)
+        merged = merge_reducers(make_reducer(method).update(chunk) for chunk in chunks)
+        np.testing.assert_array_equal(merged.normalize(scores), serial)
+        assert np.isnan(serial[::17]).all()
+        assert np.nanmin(serial) >= 0 and np.nanmax(serial) <= 1
+
+    def test_running_moments_merge(self):
+        """
+        Merged running moments agree with the mean and standard deviation of all scores
+        """
+        rng = np.random.default_rng(1)
+        scores = rng.normal(loc=3, scale=2, size=1000)
+        merged = merge_reducers(make_reducer('zscore').update(chunk) for chunk in np.array_split(scores, 9))
+        assert merged.count == 1000
+        assert merged.mean == pytest.approx(scores.mean())
+        assert merged.std == pytest.approx(scores.std())
+
+    def test_constant_scores(self):
+        """
+        Identical scores normalise to 0 instead of dividing by zero
+        """
+        assert normalize_scores([2.0, 2.0, np.nan]).tolist()[:2] == [0.0, 0.0]
+        with pytest.raises(ValueError):
+            make_reducer('median')
+
+    def test_coalition_scoring_keeps_no_global_state(self, fake_model):
+        """
+        Scoring a thread no longer mutates class-level min/max scores
+        """
+        get_coalition_score(make_flat_forest(SAMPLE_BODIES))
+        assert not hasattr(coalition.CoalitionAnalyzer, 'min_score')
+        forests = [make_flat_forest(SAMPLE_BODIES), make_flat_forest(SAMPLE_BODIES[::-1])]
+        raw = coalition.get_coalition_scores(forests)
+        normalized = coalition.get_coalition_scores(forests, normalization='minmax')
+        np.testing.assert_array_equal(normalized, normalize_scores(raw))
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import readability
+from helpers import FLESCH_KINCAID_COMPARISON
+
+
+class TestLocalReadability:
+    @pytest.mark.parametrize('word, syllables', [
+        ('the', 1), ('make', 1), ('there', 1), ('research', 2), ('being', 2), ('people', 2), ('little', 2),
+        ('tables', 2), ('files', 1), ('wanted', 2), ('question', 2), ('video', 3), ('community', 4),
+        ('ADHD', 4), ('', 0),
+    ])
+    def test_syllable_counter(self, word, syllables):
+        """
+        The rule-based counter gets common words (and spelled-out acronyms) right
+        """
+        assert readability.count_syllables(word) == syllables
+
+    def test_agrees_with_textstat_scores(self):
+        """
+        Flesch scores track the textstat scores stored in flesch_kincaid_comparison_results.csv
+        """
+        df = pd.read_csv(FLESCH_KINCAID_COMPARISON)
+        ease = np.array([readability.flesch_reading_ease(body) for body in df['body']])
+        grade = np.array([readability.flesch_kincaid_grade(body) for body in df['body']])
+        assert np.corrcoef(ease, df['textstat_FK_ease_score'])[0, 1] > 0.95
+        assert np.median(np.abs(ease - df['textstat_FK_ease_score'])) < 5
+        assert np.corrcoef(grade, df['textstat_FK_grade_score'])[0, 1] > 0.95
+        assert np.mean(np.abs(grade - df['textstat_FK_grade_score'])) < 1.5
+
+    def test_local_scores_use_the_llm_scale(self):
+        """
+        local_readability clips to the prompt's 1-100 scale and gives NaN without words
+        """
+        assert readability.local_readability('Thank you!') == 100.0
+        assert 1.0 <= readability.local_readability(
+            'Notwithstanding considerable methodological heterogeneity, epidemiological investigations '
+            'consistently demonstrate comorbidity.') <= 20
+        assert np.isnan(readability.local_readability('...'))
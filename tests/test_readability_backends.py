@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility, readability
+from feature_scripts.readability_backends import CachedReadabilityBackend, LLMReadabilityBackend, get_readability_backend
+from feature_scripts.mock_llm_server import MockChatCompletionsServer
+from helpers import CountingBackend
+
+
+class TestReadabilityBackends:
+    TEXTS = ['The cat sat on the mat. It was happy there.',
+             'Notwithstanding considerable methodological heterogeneity, investigations demonstrate comorbidity.',
+             '...']
+
+    def test_llm_backend_against_mock_server(self):
+        """
+        The LLM backend talks to the stand-in server like to OpenAI and gets its scores back in order
+        """
+        with MockChatCompletionsServer() as server:
+            backend = LLMReadabilityBackend(base_url=server.url, api_key='test')
+            scores = backend.score_many(self.TEXTS)
+        expected = [round(readability.local_readability(text), 1) for text in self.TEXTS[:2]]
+        assert scores[:2] == expected
+        assert np.isnan(scores[2])  # the server replies 'N/A' for a text without words
+        assert server.request_count == 3
+        assert all(f'<<{text}>>' in prompt for text, prompt in zip(self.TEXTS, server.prompts))
+
+    def test_llm_backend_retries_injected_failures(self):
+        """
+        Failed requests are retried, and give NaN once the retries run out
+        """
+        with MockChatCompletionsServer(fail_every=2) as server:
+            backend = LLMReadabilityBackend(base_url=server.url, api_key='test', max_retries=1)
+            assert not any(np.isnan(backend.score_many(self.TEXTS[:2])))
+            assert server.failure_count == 1 and server.request_count == 3
+        with MockChatCompletionsServer(fail_every=1, fail_status=429) as server:
+            backend = LLMReadabilityBackend(base_url=server.url, api_key='test', max_retries=1)
+            assert np.isnan(backend.score(self.TEXTS[0]))
+            assert server.request_count == 2
+
+    def test_cached_backend_scores_each_text_once(self):
+        """
+        The cached backend only asks its backend for texts it has not scored, and not again for repeats
+        """
+        inner = CountingBackend()
+        backend = CachedReadabilityBackend(inner)
+        assert backend.score_many(['a', 'bb', 'a']) == [1.0, 2.0, 1.0]
+        assert backend.score_many(['bb', 'ccc']) == [2.0, 3.0]
+        assert inner.scored == ['a', 'bb', 'ccc']
+
+    def test_credibility_accepts_backend_instances(self, monkeypatch):
+        """
+        Credibility with a backend instance matches the named local backend
+        """
+        thread = [{'body': self.TEXTS[0], 'author': 'a', 'score': 3,
+                   'replies': [{'body': self.TEXTS[1], 'author': 'b', 'score': 1}]}]
+        by_name = credibility.get_credibility_subfeatures(thread, readability_backend='local')
+        by_instance = credibility.get_credibility_subfeatures(
+            thread, readability_backend=CachedReadabilityBackend(get_readability_backend('local')))
+        assert by_name == by_instance
+        assert isinstance(get_readability_backend('llm'), LLMReadabilityBackend)
+        with pytest.raises(ValueError):
+            credibility.get_credibility_subfeatures(thread, readability_backend='gpt')
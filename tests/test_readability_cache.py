@@ -0,0 +1,66 @@
+import pickle
+
+import numpy as np
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility
+from feature_scripts.readability_cache import ReadabilityCache, normalize_text
+from helpers import CountingBackend
+
+
+class TestReadabilityCache:
+    def test_bulk_roundtrip_and_persistence(self, tmp_path):
+        """
+        Scores are found again in bulk (past SQLite's parameter limit), per namespace, after reopening
+        """
+        path = str(tmp_path / 'readability.sqlite')
+        texts = [f'comment {i}' for i in range(2000)]
+        with ReadabilityCache(path) as cache:
+            cache.put_many('local:v0', {text: float(i) for i, text in enumerate(texts)})
+            assert cache.get_many('llm:gpt-4-turbo:v1', texts[:10]) == {}
+        with ReadabilityCache(path) as cache:
+            found = cache.get_many('local:v0', texts + ['never stored'])
+            assert found == {text: float(i) for i, text in enumerate(texts)}
+            assert cache.hits == 2000 and cache.misses == 1
+            assert len(cache) == 2000 and cache.namespaces() == ['local:v0']
+
+    def test_keys_use_normalised_text(self, tmp_path):
+        """
+        Bodies differing only in whitespace share a cached score; pickled caches reopen their connection
+        """
+        assert normalize_text('  This.\n\n  Is  it? ') == 'This. Is it?'
+        cache = ReadabilityCache(str(tmp_path / 'readability.sqlite'))
+        cache.put_many('local:v0', {'NTA  ': 90.0})
+        assert pickle.loads(pickle.dumps(cache)).get_many('local:v0', ['NTA', ' NTA']) == {'NTA': 90.0, ' NTA': 90.0}
+        cache.close()
+
+    def test_credibility_scores_only_uncached_bodies(self, tmp_path, monkeypatch):
+        """
+        Readability is requested only for bodies missing from the cache, once per normalised body;
+        failed scores are not cached
+        """
+        inner = CountingBackend()
+        cache = ReadabilityCache(str(tmp_path / 'readability.sqlite'))
+        assert credibility.get_readability_scores(['This.', 'NTA', 'This. ', 'NTA'], inner, cache) == [5.0, 3.0, 5.0, 3.0]
+        assert credibility.get_readability_scores(['NTA', 'New one'], inner, cache) == [3.0, 7.0]
+        assert inner.scored == ['This.', 'NTA', 'New one']
+        failing = CountingBackend()
+        monkeypatch.setattr(failing, 'score_many', lambda texts: [np.nan] * len(texts))
+        failing.name = 'failing'
+        assert np.isnan(credibility.get_readability_scores(['Retry me'], failing, cache)[0])
+        assert 'failing:v0' not in cache.namespaces()
+
+    def test_credibility_with_cache_path(self, tmp_path, monkeypatch):
+        """
+        Credibility subfeatures are the same with a readability cache, before and after it is filled
+        """
+        thread = [{'body': 'This is a comment. It is fine.', 'author': 'a', 'score': 3,
+                   'replies': [{'body': 'This is a comment.  It is fine.', 'author': 'b', 'score': 1}]}]
+        path = str(tmp_path / 'readability.sqlite')
+        uncached = credibility.get_credibility_subfeatures(thread, readability_backend='local')
+        assert credibility.get_credibility_subfeatures(thread, readability_backend='local', readability_cache=path) == uncached
+        assert credibility.get_credibility_subfeatures(thread, readability_backend='local', readability_cache=path) == uncached
+        assert len(credibility.get_readability_cache(path)) == 1
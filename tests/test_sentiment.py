@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import sentiment
+from feature_scripts.comment_thread import flatten_thread
+from feature_scripts.defection import get_defection_score
+from feature_scripts.resilience import get_resilience_score
+from feature_scripts.sentiment import SentimentMemo, get_thread_sentiments
+from helpers import NESTED_CONVERSATION
+
+
+class TestSharedSentiment:
+    def test_each_comment_is_scored_once(self, monkeypatch):
+        """
+        Defection and resilience share one sentiment pass over a thread
+        """
+        analyzer = sentiment.get_sentiment_analyzer()
+        assert sentiment.get_sentiment_analyzer() is analyzer
+        scored = []
+        original = analyzer.polarity_scores
+        monkeypatch.setattr(analyzer, 'polarity_scores', lambda text: scored.append(text) or original(text))
+
+        thread = flatten_thread(NESTED_CONVERSATION)
+        get_defection_score(thread)
+        get_resilience_score(thread)
+        assert sorted(scored) == sorted([NESTED_CONVERSATION['selftext']] + thread.bodies)
+
+    @pytest.mark.parametrize('file_name', ['sentiment_memo.npz', 'sentiment_memo'])
+    def test_memo_persists_between_runs(self, tmp_path, file_name):
+        """
+        A saved memo returns the same scores without re-running VADER, with or without the .npz suffix
+        """
+        path = str(tmp_path / file_name)
+        memo = SentimentMemo(path)
+        root, scores = get_thread_sentiments(flatten_thread(NESTED_CONVERSATION), memo)
+        memo.save()
+
+        reloaded = SentimentMemo(path)
+        assert len(reloaded) == len(memo)
+        root_again, scores_again = get_thread_sentiments(flatten_thread(NESTED_CONVERSATION), reloaded)
+        assert root_again == root
+        np.testing.assert_array_equal(scores_again, scores)
+        assert reloaded.misses == 0
+
+    def test_memo_keeps_keys_ending_in_nul_bytes(self, tmp_path):
+        """
+        Texts whose key ends in a NUL byte are still found after a reload, also from memos saved as 'S20' strings
+        """
+        texts = ['comment 146', 'comment 186', 'a fine comment']
+        assert [SentimentMemo.key(text).endswith(b'\0') for text in texts] == [True, True, False]
+        path = str(tmp_path / 'sentiment_memo.npz')
+        memo = SentimentMemo(path)
+        scores = [memo.compound(text) for text in texts]
+        memo.save()
+
+        reloaded = SentimentMemo(path)
+        assert [reloaded.compound(text) for text in texts] == scores
+        assert reloaded.misses == 0
+
+        np.savez(path, keys=np.array(list(memo.scores), dtype='S20'), scores=np.array(scores))
+        legacy = SentimentMemo(path)
+        assert [legacy.compound(text) for text in texts] == scores
+        assert legacy.misses == 0
@@ -0,0 +1,181 @@
+import glob
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import nltk
+import pytest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from feature_scripts import credibility, spelling
+from feature_scripts.comment_thread import flatten_thread
+from feature_scripts.spelling import Vocabulary, count_misspellings
+from helpers import FLESCH_KINCAID_COMPARISON
+
+
+MOVIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraping',
+                      'representative_subreddits_for_varied_percentiles', 'movies')
+
+
+def nltk_alpha_tokens(text):
+    """
+    Alphabetic tokens of nltk.word_tokenize, as credibility checked them comment by comment
+    """
+    return [token for token in nltk.word_tokenize(text) if token.isalpha()]
+
+
+class TestSpelling:
+    @pytest.mark.parametrize('text', [
+        "i don't think it's 'fine', isn't it? they'll see.",
+        'well-known e.g. u.s. and/or abc123 ½ x_y the end.',
+        'see https://www.example.com/page or email me@site.org: ok...fine--done',
+        'you cannot, gonna wanna go; gimme-a-break (maybe) "quoted" [yes] {no} <tag>',
+        '“curly” ‘single’ don’t naïve café — dash *stars* #tag $5 100% rock\'n\'roll',
+        "end of quote.\" next sentence.) another 'sentence.' the dogs' bowls more'n ever",
+        'after *years.* it was perfect.](https://example.com) he went nuts.(my words) as it comes.”😂 yes',
+        "samuel l. jackson, v. r. troopers!” a. 5 x. b.) ok tw..x. to",
+        "more---feeling but less--feeling or ----feeling ::sorts ,,,which froggie''s pad",
+        "wanna\n\nwanna.\n'tis\n\"hi\" \x00nul\x00 x\r\ny a,\n5 b:\n\"c end'\nx can\nnot",
+        '.',
+        '',
+    ])
+    def test_tokens_match_nltk(self, text):
+        """
+        The joined treebank pass finds the same alphabetic tokens as nltk.word_tokenize
+        """
+        assert spelling.alpha_tokens(text) == nltk_alpha_tokens(text)
+
+    def test_tokens_match_nltk_on_scraped_comments(self):
+        """
+        Each thread's scan gives every scraped r/movies comment the tokens of word_tokenize, and is faster
+        than tokenizing comment by comment
+        """
+        threads = []
+        for path in sorted(glob.glob(os.path.join(MOVIES, '*', '*.json'))):
+            with open(path) as file:
+                threads.append([body.lower() for body in flatten_thread(json.load(file)).bodies if body])
+        assert sum(map(len, threads)) > 10_000
+        spelling.alpha_tokens('warm up.')
+
+        start = time.perf_counter()
+        expected = [nltk_alpha_tokens(body) for bodies in threads for body in bodies]
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        scans = [spelling.scan_alpha_tokens(bodies) for bodies in threads]
+        scan_time = time.perf_counter() - start
+
+        tokens = []
+        for bodies, (text_of_token, codes, distinct) in zip(threads, scans):
+            thread_tokens = [[] for _ in bodies]
+            for text, code in zip(text_of_token, codes):
+                thread_tokens[text].append(distinct[code])
+            tokens.extend(thread_tokens)
+        assert tokens == expected
+        assert scan_time < loop_time
+
+    def test_scan_numbers_tokens_per_text(self):
+        """
+        Every text's tokens come back in order, coded against the distinct tokens of all texts
+        """
+        texts = ["i don't think it's 'fine', isn't it? they'll see.", '', 'you cannot, gonna wanna go; see']
+        text_of_token, codes, distinct = spelling.scan_alpha_tokens(texts)
+        tokens = [[] for _ in texts]
+        for text, code in zip(text_of_token, codes):
+            tokens[text].append(distinct[code])
+        assert tokens == [nltk_alpha_tokens(text) for text in texts]
+        assert len(distinct) == len(set(token for text in texts for token in nltk_alpha_tokens(text)))
+
+    def test_punkt_is_downloaded_once_when_missing(self, tmp_path, monkeypatch):
+        """
+        With no NLTK data installed, the punkt tables are downloaded on first use, once per process
+        """
+        downloaded = []
+        monkeypatch.setattr(nltk.data, 'path', [str(tmp_path)])
+        monkeypatch.setattr(nltk, 'download', lambda name, quiet=False: downloaded.append(name))
+        monkeypatch.setattr(spelling, '_punkt_ready', False)
+        spelling.load_punkt()
+        spelling.load_punkt()
+        assert downloaded == ['punkt_tab']
+
+    def test_counts_match_per_comment_loop(self):
+        """
+        Batch counts equal the per-comment tokenize-and-lookup loop on real comments
+        """
+        bodies = [body.lower() for body in pd.read_csv(FLESCH_KINCAID_COMPARISON)['body']]
+        words = ['the', 'a', 'and', 'is', 'to', 'of', 'i', 'it', 'you', 'that', 'not', 'can', 'this']
+        valid = set(words)
+        expected = [sum(token not in valid for token in nltk_alpha_tokens(body)) for body in bodies]
+        assert count_misspellings(bodies, Vocabulary.from_words(words)).tolist() == expected
+        assert count_misspellings([], valid).tolist() == []
+        assert count_misspellings(['', 'the\x00end'], valid).tolist() == [0, 0]
+
+    def test_vocabulary_lookup(self):
+        """
+        The sorted array finds exactly its words, including non-ASCII ones, and rejects longer tokens
+        """
+        vocabulary = Vocabulary.from_words(['café', 'apple', 'zebra', 'app'])
+        assert vocabulary.contains(['apple', 'app', 'appl', 'café', 'cafe', 'zebras', 'aaa', 'zzzz']).tolist() == \
+            [True, True, False, True, False, False, False, False]
+        assert len(vocabulary) == 4 and 'zebra' in vocabulary
+        assert not Vocabulary.from_words([]).contains(['a']).any()
+
+
+class TestVocabularyArtifact:
+    def test_save_and_memory_map(self, tmp_path):
+        """
+        A saved vocabulary maps back read-only with the same words, and is rejected once its word lists change
+        """
+        word_file = tmp_path / 'words.txt'
+        word_file.write_text('zebra\napple\n\ncafé\napple\n')
+        vocabulary = Vocabulary.from_files([str(word_file)])
+        path = str(tmp_path / 'words.vocab')
+        vocabulary.save(path, sources=[str(word_file)])
+
+        mapped = Vocabulary.load(path, sources=[str(word_file)])
+        assert isinstance(mapped.words.base, np.memmap) and not mapped.words.flags.writeable
+        assert mapped.words.tolist() == vocabulary.words.tolist() == [b'apple', 'café'.encode(), b'zebra']
+        assert mapped.contains(['café', 'zebra', 'cafe']).tolist() == [True, True, False]
+        assert Vocabulary.load(path, mmap=False).words.tolist() == vocabulary.words.tolist()
+
+        word_file.write_text('zebra\n')
+        with pytest.raises(ValueError):
+            Vocabulary.load(path, sources=[str(word_file)])
+        assert len(Vocabulary.load(path)) == 3
+
+    def test_rejects_other_files_and_versions(self, tmp_path, monkeypatch):
+        """
+        Files that are not vocabulary artifacts, or of another format version, are refused; empty ones load
+        """
+        path = str(tmp_path / 'empty.vocab')
+        Vocabulary.from_words([]).save(path)
+        assert len(Vocabulary.load(path)) == 0
+        monkeypatch.setattr(spelling, 'VOCABULARY_FORMAT_VERSION', spelling.VOCABULARY_FORMAT_VERSION + 1)
+        with pytest.raises(ValueError):
+            Vocabulary.load(path)
+        (tmp_path / 'words.txt').write_text('apple\n')
+        with pytest.raises(ValueError):
+            Vocabulary.load(str(tmp_path / 'words.txt'))
+
+    def test_credibility_uses_current_artifact(self, tmp_path, monkeypatch):
+        """
+        Credibility maps an up-to-date artifact instead of reading the word lists, and rebuilds a stale one
+        """
+        word_file = tmp_path / 'words.txt'
+        word_file.write_text('apple\nzebra\n')
+        monkeypatch.setattr(credibility, 'VALID_WORD_FILES', [str(word_file), str(tmp_path / 'missing.txt')])
+        monkeypatch.setattr(credibility, 'VOCABULARY_ARTIFACT', str(tmp_path / 'valid_words.vocab'))
+        monkeypatch.setattr(credibility, '_valid_words', None)
+        monkeypatch.setattr(credibility, '_valid_vocabulary', None)
+        assert credibility.load_vocabulary_artifact() is None
+        credibility.build_vocabulary_artifact()
+        assert credibility.get_valid_vocabulary().words.tolist() == [b'apple', b'zebra']
+        assert credibility._valid_words is None
+
+        word_file.write_text('apple\nmango\n')
+        assert credibility.load_vocabulary_artifact() is None
+        credibility.build_vocabulary_artifact()
+        assert credibility.load_vocabulary_artifact().words.tolist() == [b'apple', b'mango']